@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+命令发送基准测试（使用 FakePanes 模拟运行 HummingBot 客户端的 tmux 窗口，不需要 tmux）
+模拟一台主机上的机器人（每个机器人回显命令的时间不同，个别客户端卡住、容器未运行或没有窗口），
+比较逐个发送并等待确认（估算）和 command_fanout.py 并行发送并确认的耗时，并检查：
+- 正常的机器人都确认，卡住的机器人超时（输入框中未提交的命令不算确认）
+- 容器未运行或没有窗口的机器人不发送
+- 每个机器人只发送一次，总耗时不超过最慢的机器人加超时
+- 再次发送同一个命令时，之前的回显滚出屏幕（屏幕上匹配的行数不变）仍能确认
+
+运行：python benchmarks/bench_command.py [--bots 100] [--timeout 3]
+检查不通过时返回非零退出码
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from command_fanout import CommandFanout, FakePanes, echo_pattern, match_lines  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令发送基准测试（模拟 tmux 窗口）")
+    parser.add_argument('--bots', type=int, default=100, help="机器人数（默认 100）")
+    parser.add_argument('--timeout', type=float, default=3.0, help="每个机器人等待确认的最长时间（秒，默认 3）")
+    parser.add_argument('--max-delay', type=float, default=1.5, help="客户端回显命令的最长时间（秒，默认 1.5）")
+    options = parser.parse_args()
+
+    rng = random.Random(1)
+    names = [f"bot{i + 1}" for i in range(options.bots)]
+    delays = {name: rng.uniform(0.05, options.max_delay) for name in names}
+    hung = set(names[5:8])
+    stopped = set(names[10:15])
+    no_window = set(names[20:22])
+    panes = FakePanes([name for name in names if name not in no_window], delays, hung)
+    running = set(names) - stopped
+
+    fanout = CommandFanout(panes, parallel=32, poll_seconds=0.1)
+    started = time.perf_counter()
+    results = fanout.run(names, 'stop', timeout=options.timeout, running=running)
+    fanout_seconds = time.perf_counter() - started
+
+    by_status = {}
+    for result in results:
+        by_status.setdefault(result.status, set()).add(result.name)
+    # 逐个发送并等待确认：每个机器人的确认时间（或超时）依次累加
+    serial_seconds = sum(result.seconds for result in results if result.seconds is not None)
+    sent = [name for name, _ in panes.sent]
+    responsive = set(names) - hung - stopped - no_window
+
+    # 小窗口、只读取屏幕：第二次发送 stop 后，第一次的回显滚出屏幕，屏幕上只剩一行回显
+    small = FakePanes(names[:10], height=4, scrollback=0, reply_lines=2)
+    small_fanout = CommandFanout(small, poll_seconds=0.01)
+    small_fanout.run(names[:10], 'stop', timeout=1.0)
+    repeat = small_fanout.run(names[:10], 'stop', timeout=1.0)
+    on_screen = [len(match_lines(small.capture(name)[0], echo_pattern('stop'))) for name in names[:10]]
+
+    print("=" * 50)
+    print(f"机器人 {options.bots} 个，回显时间 0.05~{options.max_delay:g}s，超时 {options.timeout:g}s")
+    print(f"逐个发送并确认（估算）: {serial_seconds:7.2f}s")
+    print(f"并行发送并确认:         {fanout_seconds:7.2f}s（{serial_seconds / fanout_seconds:.0f}x）")
+    print("结果: " + "，".join(f"{status} {len(members)} 个" for status, members in sorted(by_status.items())))
+
+    checks = [
+        ("正常的机器人都确认", by_status.get('ok') == responsive),
+        ("卡住的机器人超时（输入框中的命令不算确认）", by_status.get('timeout') == hung),
+        ("容器未运行或没有窗口的机器人不发送",
+         by_status.get('not_running') == stopped and by_status.get('no_window') == no_window
+         and not (set(sent) & (stopped | no_window))),
+        ("每个机器人只发送一次", len(sent) == len(set(sent)) == len(responsive | hung)),
+        ("之前的回显滚出屏幕时仍能确认", all(result.ok for result in repeat) and set(on_screen) == {1}),
+        ("总耗时不超过超时加 1 秒", fanout_seconds < options.timeout + 1.0),
+        ("并行比逐个快", fanout_seconds < serial_seconds),
+    ]
+    failed = False
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+批量管理基准测试（使用 FakeDockerServer 在 unix socket 上模拟 Docker Engine API，不需要 docker）
+比较 bot-manager.sh 原来逐个机器人查询状态（每个机器人一次 docker ps）和 fleet_controller.py 一次批量查询的耗时，
+并检查 status / stop-all / start-all / restart-all 的结果和请求数：
+- status 只发送一次请求
+- stop-all 停止所有运行中的机器人，start-all 启动所有未运行的机器人（包括还没有创建容器的）
+- 停止请求并行发送
+- start-all 按 LaunchScheduler 调度：同时启动中的机器人不超过上限，共用代理或 API key 的机器人不会同时处于启动中
+
+运行：python benchmarks/bench_controller.py [--bots 200] [--latency 0.01]
+检查不通过时返回非零退出码
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from fleet_controller import DockerClient, FakeDockerServer, FleetController  # noqa: E402
+from launch_scheduler import HostSample, LaunchBot, LaunchPolicy  # noqa: E402
+
+
+class IdleHost:
+    """负载和内存都不会限制启动的主机"""
+
+    def sample(self) -> HostSample:
+        return HostSample(0.1, 5.0, 16384.0)
+
+
+def launch_conflicts(lines, bots, max_starting):
+    """
+    按 run_schedule 的输出重放启动过程，返回 (违反规则的次数, 同时启动中的最大数)
+    每次启动时，启动中的机器人（包括同一批）不能共用代理或 API key
+    """
+    by_name = {bot.name: bot for bot in bots}
+    starting = set()
+    conflicts = 0
+    peak = 0
+    for line in lines:
+        if '启动: ' in line:
+            for name in line.split('启动: ', 1)[1].split('（', 1)[0].split():
+                bot = by_name[name]
+                conflicts += any(by_name[other].proxy_id == bot.proxy_id or by_name[other].key_id == bot.key_id
+                                 for other in starting)
+                starting.add(name)
+            peak = max(peak, len(starting))
+        elif '已稳定: ' in line or '失败: ' in line:
+            starting.discard(line.split(': ', 1)[1].split('（', 1)[0].strip())
+    return conflicts + (peak > max_starting), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量管理基准测试（模拟 Docker Engine API）")
+    parser.add_argument('--bots', type=int, default=200, help="机器人数（默认 200）")
+    parser.add_argument('--latency', type=float, default=0.01, help="每个 API 请求的模拟延迟（秒，默认 0.01）")
+    options = parser.parse_args()
+
+    # 每 25 个机器人共用一个代理，每 40 个共用一个 API key
+    bots = [LaunchBot(f"bot{i + 1}", proxy_id=f"proxy{i % 25}", key_id=f"key{i % 40}") for i in range(options.bots)]
+    policy = LaunchPolicy(batch_size=4, max_starting=8, settle_seconds=0.05, max_wait_seconds=10,
+                          min_interval_seconds=0)
+    # 一半运行中，四分之一已停止，其余还没有创建容器；另有一个不属于服务列表的容器
+    containers = {bot.name: index % 2 == 0 for index, bot in enumerate(bots[:options.bots * 3 // 4])}
+    containers['other'] = True
+
+    with tempfile.TemporaryDirectory(prefix='bench_controller_') as root:
+        server = FakeDockerServer(os.path.join(root, 'docker.sock'), containers, options.latency).start()
+        try:
+            docker = DockerClient(server.socket_path)
+            lines = []
+            controller = FleetController(bots, docker, server.launch, sleep=lambda _: time.sleep(0.01),
+                                         log=lines.append)
+
+            # 原来的方式：每个机器人查询一次容器列表
+            started = time.perf_counter()
+            per_bot_running = 0
+            for bot in bots:
+                names = {name.lstrip('/') for container in docker.containers() if container['State'] == 'running'
+                         for name in container['Names']}
+                per_bot_running += bot.name in names
+            per_bot_seconds = time.perf_counter() - started
+
+            requests_before = len(server.requests)
+            started = time.perf_counter()
+            rows = controller.status()
+            bulk_seconds = time.perf_counter() - started
+            status_requests = len(server.requests) - requests_before
+            bulk_running = sum(1 for row in rows if row['running'])
+
+            started = time.perf_counter()
+            stop_result = controller.stop_all(timeout=10)
+            stop_seconds = time.perf_counter() - started
+            all_stopped = not controller.running(refresh=True) and server.containers['other']
+
+            started = time.perf_counter()
+            start_result = controller.start_all(policy, IdleHost(), poll_seconds=0.01)
+            start_seconds = time.perf_counter() - started
+            all_running = not controller.stopped(refresh=True)
+
+            restart_stop = controller.stop_all(timeout=10)
+            restart_start = controller.start_all(policy, IdleHost(), poll_seconds=0.01)
+        finally:
+            server.close()
+
+    print("=" * 50)
+    print(f"机器人 {options.bots} 个，每个请求延迟 {options.latency * 1000:.0f}ms")
+    print(f"逐个查询状态:   {per_bot_seconds:7.3f}s（{options.bots} 次请求）")
+    print(f"批量查询状态:   {bulk_seconds:7.3f}s（{status_requests} 次请求，{per_bot_seconds / bulk_seconds:.0f}x）")
+    print(f"stop-all:       {stop_seconds:7.3f}s（停止 {len(stop_result['stopped'])} 个）")
+    print(f"start-all:      {start_seconds:7.3f}s（启动 {len(start_result['started'])} 个）")
+
+    conflicts, peak = launch_conflicts(lines, bots, policy.max_starting)
+    print(f"同时启动中最多 {peak} 个（上限 {policy.max_starting}）")
+
+    expected_running = sum(1 for running in containers.values() if running) - 1
+    checks = [
+        ("status 只发送一次请求", status_requests == 1),
+        ("批量查询与逐个查询结果一致", bulk_running == per_bot_running == expected_running),
+        ("stop-all 停止所有运行中的机器人（不影响其他容器）",
+         all_stopped and len(stop_result['stopped']) == expected_running and not stop_result['failed']),
+        ("start-all 启动所有未运行的机器人", all_running and len(start_result['started']) == options.bots),
+        ("restart-all 先停止再启动全部机器人",
+         len(restart_stop['stopped']) == options.bots and len(restart_start['started']) == options.bots),
+        ("start-all 不同时启动共用代理或 API key 的机器人，启动中的数量不超过上限", conflicts == 0 and peak > 1),
+        ("批量查询比逐个查询快", bulk_seconds < per_bot_seconds),
+    ]
+    failed = False
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+批量部署基准测试（使用模拟网络的 FakeTransport，不需要真实服务器）
+合成若干个配置文件夹，分别以串行和并行方式运行 deploy.py 的批量部署，比较总耗时，
+并检查失败重试和超时的行为：
+- 一台主机前一次连接失败，重试后应当成功
+- 一台主机的模拟延迟超过 --timeout，应当在所有尝试后失败，且不影响其他主机
+- 第二次部署没有变化时不应发送任何数据
+- 空目录（例如 conf/<机器人>/environment）在服务器上创建，删除目录中最后一个文件后目录仍然保留
+
+运行：python benchmarks/bench_deploy.py [--hosts 12] [--latency 0.2] [--parallel 6] [--timeout 3]
+检查不通过时返回非零退出码
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import deploy  # noqa: E402
+from transport_utils import FakeTransport, LocalTransport  # noqa: E402
+
+FILES_PER_BOT = ('controllers/conf_v2_ads_1_apt.yml', 'scripts/conf_v2_ads_1_apt.yml',
+                 'connectors/backpack_perpetual.yml')
+
+
+def create_config_folders(root, host_count, bots_per_host):
+    """合成配置文件夹：conf/<机器人>/ 下的几个文件、一个空目录和 compose 文件"""
+    folders = []
+    for host_index in range(host_count):
+        folder = os.path.join(root, f"ads_{host_index + 1}")
+        for bot_index in range(bots_per_host):
+            for rel in FILES_PER_BOT:
+                path = os.path.join(folder, 'conf', f"bot{bot_index + 1}", rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(f"# {host_index} {bot_index} {rel}\n" * 20)
+            os.makedirs(os.path.join(folder, 'conf', f"bot{bot_index + 1}", 'environment'))
+        with open(os.path.join(folder, 'docker-compose.override.yml'), 'w', encoding='utf-8') as f:
+            f.write("services: {}\n")
+        folders.append(folder)
+    return folders
+
+
+def run_fleet_quietly(folders, args, create_transport):
+    """运行批量部署并丢弃逐行输出，返回 (结果列表, 耗时)"""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = deploy.run_fleet(folders, args, create_transport)
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量部署基准测试（模拟网络）")
+    parser.add_argument('--hosts', type=int, default=12, help="主机数（默认 12）")
+    parser.add_argument('--bots', type=int, default=20, help="每台主机的机器人数（默认 20）")
+    parser.add_argument('--latency', type=float, default=0.2, help="每次远端操作的模拟延迟（秒，默认 0.2）")
+    parser.add_argument('--parallel', type=int, default=6, help="并行部署的主机数（默认 6）")
+    parser.add_argument('--timeout', type=float, default=3.0,
+                        help="每次尝试的超时时间（秒，默认 3；需要大于两次模拟延迟加上解包时间）")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_deploy_') as root:
+        folders = create_config_folders(os.path.join(root, 'src'), options.hosts, options.bots)
+        slow_host = deploy.folder_host(folders[-1])
+        flaky_host = deploy.folder_host(folders[0])
+        timeout = options.timeout
+
+        def factory(target_dir, failures):
+            def create(config_folder):
+                host = deploy.folder_host(config_folder)
+                # 慢主机的延迟超过超时时间
+                latency = timeout * 2 if host == slow_host else options.latency
+                return FakeTransport(os.path.join(target_dir, host), host, latency, failures, timeout)
+            return create
+
+        def fleet_args(parallel):
+            return deploy.parse_args(['placeholder', '--parallel', str(parallel), '--timeout', str(timeout),
+                                      '--retries', '1', '--retry-delay', '0'])
+
+        serial, serial_seconds = run_fleet_quietly(
+            folders, fleet_args(1), factory(os.path.join(root, 'serial'), {flaky_host: 1}))
+        parallel, parallel_seconds = run_fleet_quietly(
+            folders, fleet_args(options.parallel), factory(os.path.join(root, 'parallel'), {flaky_host: 1}))
+        # 第二次部署：除慢主机外都已是最新
+        repeat, repeat_seconds = run_fleet_quietly(
+            folders, fleet_args(options.parallel), factory(os.path.join(root, 'parallel'), {}))
+
+        # 删除一个机器人的最后一个连接器配置后再部署到本地目录
+        target = os.path.join(root, 'local')
+        deploy.deploy_folder(folders[1], LocalTransport(target), log=lambda _: None)
+        empty_created = os.path.isdir(os.path.join(target, 'ex-bot', 'conf', 'bot1', 'environment'))
+        os.remove(os.path.join(folders[1], 'conf', 'bot1', FILES_PER_BOT[2]))
+        removal = deploy.deploy_folder(folders[1], LocalTransport(target), log=lambda _: None)
+        connectors_kept = removal['deleted'] == 1 and os.path.isdir(
+            os.path.join(target, 'ex-bot', 'conf', 'bot1', 'connectors'))
+
+    deploy.print_fleet_table(parallel)
+    print("=" * 50)
+    print(f"串行部署 {options.hosts} 台主机:   {serial_seconds:.2f}s")
+    print(f"并行部署（{options.parallel} 台）:      {parallel_seconds:.2f}s（{serial_seconds / parallel_seconds:.1f}x）")
+    print(f"无变化的重复部署:       {repeat_seconds:.2f}s")
+
+    by_host = {result['host']: result for result in parallel}
+    repeat_bytes = sum(result['bytes'] for result in repeat if result['host'] != slow_host)
+    checks = [
+        ("重试后成功的主机", by_host[flaky_host]['ok'] and by_host[flaky_host]['attempts'] == 2),
+        ("超时主机失败且尝试了 2 次", not by_host[slow_host]['ok'] and by_host[slow_host]['attempts'] == 2),
+        ("其他主机全部成功", all(result['ok'] for result in parallel if result['host'] != slow_host)),
+        ("串行与并行结果一致", [r['ok'] for r in serial] == [r['ok'] for r in parallel]),
+        ("无变化时不发送数据", repeat_bytes == 0),
+        ("空目录在服务器上创建", empty_created),
+        ("删除最后一个文件后目录保留", connectors_kept),
+        ("并行部署更快", parallel_seconds < serial_seconds),
+    ]
+    failed = False
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
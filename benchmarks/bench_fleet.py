@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+合成机器人集群的生成流程基准测试
+按指定规模合成 bots.csv、strategy.csv、strategies-v1.csv，在临时配置文件夹中运行真实的 prepare.py 流程，
+统计各阶段耗时、写入的文件数和字节数以及峰值内存，可输出JSON并与保存的基准结果比较
+
+运行：
+    python benchmarks/bench_fleet.py                                  # 默认规模 10x5,100x50
+    python benchmarks/bench_fleet.py --scales 10x5,100x50,1000x500    # 机器人数x策略数
+    python benchmarks/bench_fleet.py --output result.json             # 保存结果
+    python benchmarks/bench_fleet.py --baseline result.json --threshold 0.2
+
+每个规模在独立子进程中运行（峰值内存互不影响），默认使用降低的PBKDF2迭代次数（--kdf-work-factor）；
+与基准比较时，任一阶段耗时超过基准 (1 + threshold) 倍时返回非零退出码
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# 阶段名 -> prepare.py 中对应的函数
+STAGE_FUNCTIONS = {
+    'hash_check': 'check_files_changed',
+    'csv_read': 'read_csv_rows',
+    'placeholder_check': 'check_placeholder_coverage',
+    'compose': 'generate_docker_compose',
+    'directories': 'create_directories',
+    'v2_render': 'generate_v2_strategy_files',
+    'v1_render': 'generate_v1_strategy_files',
+    'crypto_import': 'get_crypto_manager_class',
+    'connectors': 'generate_connector_configs',
+    'write_flush': 'flush_writes',
+    'cleanup': 'remove_unproduced_outputs',
+    'hash_cache': 'save_hash_cache',
+    'state_save': 'save_generation_state',
+    'store_cleanup': 'remove_content_store',
+}
+
+# 低于此值的耗时差异视为噪声，不判定为回退
+NOISE_FLOOR_SECONDS = 0.02
+
+DEFAULT_KDF_WORK_FACTOR = 1000
+
+V2_STRATEGY_FIELDS = {
+    'amount': '500', 'buy_spreads': '"""1.8,2.5,3.4"""', 'sell_spreads': '"""1.8,2.5,3.4"""',
+    'buy_amounts_pct': '"""0.13,0.27,0.6"""', 'sell_amounts_pct': '"""0.13,0.27,0.6"""',
+    'executor_refresh_time': '600', 'cooldown_time': '600', 'stop_loss': '0.004',
+    'take_profit': '0.004', 'activation_price': '0.0032', 'trailing_delta': '0.0003',
+    'candles_connector': 'binance_perpetual', 'candles_trading_pair': 'APT-USDT',
+    'interval': '3m', 'macd_fast': '21', 'macd_slow': '42', 'macd_signal': '9',
+    'natr_length': '14', 'position_rebalance_threshold_pct': '0.01',
+}
+
+V1_STRATEGY_FIELDS = {
+    'order_amount': '60', 'leverage': '10', 'bid_spread': '0.08', 'ask_spread': '0.08',
+    'long_profit_taking_spread': '0.2', 'short_profit_taking_spread': '0.2',
+    'stop_loss_spread': '0.4', 'time_between_stop_loss_orders': '15', 'order_levels': '3',
+    'order_level_spread': '0.001', 'order_levels_amount': '-10',
+}
+
+
+def parse_scales(value):
+    """解析 '10x5,100x50' 形式的规模列表"""
+    scales = []
+    for item in value.split(','):
+        bots, strategies = item.lower().split('x')
+        scales.append((int(bots), int(strategies)))
+    return scales
+
+
+def write_csv(path, header, rows):
+    """写入CSV文件（值中已包含需要的引号）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(','.join(header) + '\n')
+        for row in rows:
+            f.write(','.join(row.get(field, '') for field in header) + '\n')
+
+
+def synthesize_fleet(config_folder, bot_count, strategy_count, with_credentials):
+    """在配置文件夹中合成三个CSV文件，v1 策略数为 v2 策略数的五分之一（至少1个）"""
+    v1_count = max(1, strategy_count // 5)
+    v2_rows = [dict(V2_STRATEGY_FIELDS, version=f"ads_{i}", market=f"M{i}-USDC") for i in range(strategy_count)]
+    v1_rows = [dict(V1_STRATEGY_FIELDS, version=f"ads_v1_{i}", market=f"N{i}-USDC") for i in range(v1_count)]
+
+    bots = []
+    for i in range(bot_count):
+        bot = {'name': f"bot{i}", 'proxy': f"http://proxy{i % 10}:8080", 'connector': 'backpack_perpetual'}
+        # 大约每五个机器人中有一个运行 v1 策略
+        if i % 5 == 4:
+            strategy = v1_rows[i % v1_count]
+            bot['config_file_name'] = f"conf_v1_{strategy['version']}_{strategy['market'].split('-')[0].lower()}.yml"
+        else:
+            strategy = v2_rows[i % strategy_count]
+            bot['config_file_name'] = 'v2_with_controllers.py'
+            bot['script_config'] = f"conf_v2_{strategy['version']}_{strategy['market'].split('-')[0].lower()}.yml"
+        if with_credentials:
+            bot.update(api_key=f"key{i}", secret_key=f"secret{i}", password=f"pw{i}")
+        bots.append(bot)
+
+    write_csv(os.path.join(config_folder, 'bots.csv'),
+              ['name', 'config_file_name', 'script_config', 'proxy', 'connector', 'api_key', 'secret_key', 'password'],
+              bots)
+    write_csv(os.path.join(config_folder, 'strategy.csv'),
+              ['version', 'market'] + list(V2_STRATEGY_FIELDS), v2_rows)
+    write_csv(os.path.join(config_folder, 'strategies-v1.csv'),
+              ['version', 'market'] + list(V1_STRATEGY_FIELDS), v1_rows)
+
+
+def count_output(config_folder):
+    """统计生成的文件数和字节数（硬链接按 inode 只计一次）"""
+    seen = set()
+    files = 0
+    total_bytes = 0
+    paths = [os.path.join(config_folder, 'docker-compose.override.yml')]
+    for dirpath, _, filenames in os.walk(os.path.join(config_folder, 'conf')):
+        paths.extend(os.path.join(dirpath, name) for name in filenames)
+
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files += 1
+        if (stat.st_dev, stat.st_ino) not in seen:
+            seen.add((stat.st_dev, stat.st_ino))
+            total_bytes += stat.st_size
+    return files, total_bytes
+
+
+def peak_rss_kb():
+    """本进程和已结束子进程（加密工作进程）的峰值内存（KB）"""
+    import resource
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':
+        # macOS 上 ru_maxrss 的单位是字节
+        self_rss //= 1024
+        children_rss //= 1024
+    return {'self': self_rss, 'children': children_rss}
+
+
+def run_worker(config_folder, kdf_work_factor, jobs):
+    """在当前进程中运行一次完整的 prepare.py 流程，返回各阶段耗时等指标"""
+    import prepare
+
+    timings = {stage: 0.0 for stage in STAGE_FUNCTIONS}
+
+    def timed(stage, func):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[stage] += time.perf_counter() - started
+        return wrapper
+
+    # run_prepare 通过模块全局名调用各阶段函数，替换后即可计时
+    for stage, name in STAGE_FUNCTIONS.items():
+        setattr(prepare, name, timed(stage, getattr(prepare, name)))
+
+    argv = [config_folder]
+    if kdf_work_factor:
+        argv += ['--kdf-work-factor', str(kdf_work_factor)]
+    if jobs:
+        argv += ['--jobs', str(jobs)]
+    args = prepare.parse_args(argv)
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctx = prepare.run_prepare(config_folder, args)
+    total = time.perf_counter() - started
+
+    files, total_bytes = count_output(config_folder)
+    return {
+        'total': total,
+        'stages': timings,
+        'files_written': ctx.manifest.written,
+        'output_files': files,
+        'output_bytes': total_bytes,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def run_case(bot_count, strategy_count, with_credentials, kdf_work_factor, jobs):
+    """在临时配置文件夹和独立子进程中运行一个规模"""
+    with tempfile.TemporaryDirectory(prefix='bench_fleet_') as config_folder:
+        synthesize_fleet(config_folder, bot_count, strategy_count, with_credentials)
+        command = [sys.executable, os.path.abspath(__file__), '--worker', config_folder,
+                   '--kdf-work-factor', str(kdf_work_factor)]
+        if jobs:
+            command += ['--jobs', str(jobs)]
+        # 模板目录相对于仓库根目录
+        completed = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    result.update(bots=bot_count, strategies=strategy_count, credentials=with_credentials)
+    return result
+
+
+def case_key(result):
+    credentials = 'creds' if result['credentials'] else 'nocreds'
+    return f"{result['bots']}x{result['strategies']}/{credentials}"
+
+
+def print_results(results):
+    """输出各规模的阶段耗时表格"""
+    stages = list(STAGE_FUNCTIONS)
+    header = f"{'规模':<20}" + ''.join(f"{stage:>14}" for stage in stages) + f"{'总计':>10}{'文件数':>10}{'字节':>12}{'RSS(MB)':>9}"
+    print(header)
+    for result in results:
+        rss = max(result['peak_rss_kb'].values()) / 1024
+        print(f"{case_key(result):<20}"
+              + ''.join(f"{result['stages'][stage] * 1000:>12.1f}ms" for stage in stages)
+              + f"{result['total']:>9.2f}s{result['output_files']:>10}{result['output_bytes']:>12}{rss:>9.1f}")
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """与基准结果比较，返回回退项列表"""
+    baseline_cases = {case_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = baseline_cases.get(case_key(result))
+        if base is None:
+            continue
+        metrics = [('total', result['total'], base['total'])]
+        metrics += [(stage, result['stages'][stage], base['stages'].get(stage, 0.0)) for stage in STAGE_FUNCTIONS]
+        for name, current, previous in metrics:
+            if current - previous > NOISE_FLOOR_SECONDS and current > previous * (1 + threshold):
+                regressions.append(f"{case_key(result)} {name}: {previous * 1000:.1f} ms -> {current * 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成机器人集群的生成流程基准测试")
+    parser.add_argument('--scales', type=parse_scales, default=parse_scales('10x5,100x50'),
+                        help="机器人数x策略数，逗号分隔（默认 10x5,100x50）")
+    parser.add_argument('--credentials', choices=['with', 'without', 'both'], default='both',
+                        help="是否为机器人生成API凭证（默认两种都测）")
+    parser.add_argument('--kdf-work-factor', type=int, default=DEFAULT_KDF_WORK_FACTOR,
+                        help=f"PBKDF2迭代次数（默认 {DEFAULT_KDF_WORK_FACTOR}，远低于HummingBot默认值）")
+    parser.add_argument('--jobs', type=int, default=None, help="凭证加密进程数（默认等于CPU核数）")
+    parser.add_argument('--output', help="将结果保存为JSON文件")
+    parser.add_argument('--baseline', help="用于比较的基准JSON文件")
+    parser.add_argument('--threshold', type=float, default=0.2, help="回退阈值（默认 0.2，即慢 20%%）")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.kdf_work_factor, args.jobs)))
+        return
+
+    credential_modes = {'with': [True], 'without': [False], 'both': [False, True]}[args.credentials]
+    results = []
+    for bot_count, strategy_count in args.scales:
+        for with_credentials in credential_modes:
+            results.append(run_case(bot_count, strategy_count, with_credentials, args.kdf_work_factor, args.jobs))
+
+    print_results(results)
+
+    report = {
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'kdf_work_factor': args.kdf_work_factor,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ 相比基准 {args.baseline} 出现性能回退（阈值 {args.threshold:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✅ 与基准 {args.baseline} 相比没有超过 {args.threshold:.0%} 的回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+延迟启动任务登记基准测试（使用临时的 SQLite 数据库和模拟时钟，不需要 tmux 和 at）
+测量任务数较多时添加、列出和按机器人取消的耗时，并检查调度进程：
+- 按到期时间依次启动，每个任务在到期后一个检查间隔内启动
+- 已取消的任务不启动，按机器人取消使用索引查找而不是扫描全部任务
+- 已有调度进程时新的调度进程直接退出
+- 调度进程停止一段时间后（例如服务器重启）再运行，过期的任务整体顺延，保持原来的启动间隔
+
+运行：python benchmarks/bench_jobs.py [--jobs 1000]
+检查不通过时返回非零退出码
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from launch_jobs import JobRegistry, LaunchJob, SchedulerLock, run_jobs  # noqa: E402
+from launch_scheduler import FakeClock  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="延迟启动任务登记基准测试（模拟时钟）")
+    parser.add_argument('--jobs', type=int, default=1000, help="任务数（默认 1000）")
+    parser.add_argument('--interval', type=float, default=180.0, help="任务之间的间隔（秒，默认 180）")
+    parser.add_argument('--poll', type=float, default=5.0, help="调度进程的检查间隔（秒，默认 5）")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_jobs_') as root:
+        db_path = os.path.join(root, 'launch_jobs.db')
+        clock = FakeClock()
+        registry = JobRegistry(db_path, clock)
+        names = [f"bot{i + 1}" for i in range(options.jobs)]
+
+        started = time.perf_counter()
+        registry.add([LaunchJob(name, clock() + index * options.interval, session='bot')
+                      for index, name in enumerate(names)])
+        add_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        listed = registry.pending()
+        list_ms = (time.perf_counter() - started) * 1000
+
+        cancelled = set(names[1::7])
+        started = time.perf_counter()
+        cancel_ok = all(registry.cancel(name) for name in cancelled)
+        cancel_ms = (time.perf_counter() - started) * 1000 / len(cancelled)
+        plans = [' '.join(str(part) for part in row) for sql in
+                 ("DELETE FROM jobs WHERE bot = 'bot1'", "SELECT * FROM jobs WHERE bot = 'bot1'")
+                 for row in registry._conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+        # 已有调度进程时新的调度进程直接退出
+        holder = SchedulerLock(db_path + '.lock')
+        holder.acquire()
+        blocked = run_jobs(JobRegistry(db_path, clock), lambda job: None, SchedulerLock(db_path + '.lock'),
+                           clock, clock.sleep, options.poll, log=lambda _: None)
+        holder.release()
+
+        # 先运行到一半，再模拟服务器重启：时钟前进 2 小时后运行新的调度进程
+        launches = []
+        half = options.jobs // 2
+
+        def launch(job):
+            launches.append((job.bot, job.due, clock()))
+            if len(launches) == half - len(cancelled & set(names[:half])):
+                raise KeyboardInterrupt
+
+        try:
+            run_jobs(registry, launch, SchedulerLock(db_path + '.lock'), clock, clock.sleep, options.poll,
+                     log=lambda _: None)
+        except KeyboardInterrupt:
+            pass
+        before_reboot = len(launches)
+        remaining = registry.pending()
+        clock.sleep(2 * 3600)
+        reboot_at = clock()
+        run_jobs(JobRegistry(db_path, clock), launch, SchedulerLock(db_path + '.lock'), clock, clock.sleep,
+                 options.poll, log=lambda _: None)
+        after_reboot = launches[before_reboot:]
+        registry.close()
+
+    launched_names = [name for name, _, _ in launches]
+    on_time = all(0 <= at - due <= options.poll for _, due, at in launches)
+    gaps_before = [b.due - a.due for a, b in zip(remaining, remaining[1:])]
+    gaps_after = [b[2] - a[2] for a, b in zip(after_reboot, after_reboot[1:])]
+
+    print("=" * 50)
+    print(f"任务 {options.jobs} 个，间隔 {options.interval:g}s，检查间隔 {options.poll:g}s")
+    print(f"添加全部任务:       {add_ms:8.2f} ms")
+    print(f"列出全部任务:       {list_ms:8.2f} ms")
+    print(f"按机器人取消一个:   {cancel_ms:8.3f} ms")
+    print(f"重启前启动 {before_reboot} 个，重启后启动 {len(after_reboot)} 个"
+          f"（第一个在重启后 {after_reboot[0][2] - reboot_at:.0f}s）" if after_reboot else "")
+
+    expected = [name for name in names if name not in cancelled]
+    checks = [
+        ("列出的任务按到期时间排序", [job.bot for job in listed] == names),
+        ("按机器人取消使用索引", cancel_ok and plans and all('SCAN' not in plan for plan in plans)),
+        ("已有调度进程时直接退出", blocked == 0),
+        ("按到期时间依次启动，已取消的任务不启动", launched_names == expected),
+        ("重启前的任务在到期后一个检查间隔内启动", on_time),
+        ("重启后过期的任务整体顺延，保持原来的间隔",
+         bool(after_reboot) and after_reboot[0][2] - reboot_at <= options.poll
+         and all(abs(after - before) <= options.poll for before, after in zip(gaps_before, gaps_after))),
+    ]
+    failed = False
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
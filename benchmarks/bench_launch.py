@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+启动调度基准测试（使用 FakeDocker / FakeHost 和模拟时钟，不需要 docker，几秒内完成）
+模拟一台主机上的机器人（若干机器人共用代理或 API key，个别容器启动后退出或一直无法启动），
+比较 start-bot.sh 固定间隔启动和 launch_scheduler.py 自适应启动让所有机器人稳定所需的时间，
+并在每次启动时检查调度约束：
+- 同时处于启动中的机器人不超过上限
+- 启动中的机器人不共用代理或 API key
+- 启动时主机的负载、CPU 和可用内存都在上限以内
+- 失败的容器不阻塞其他机器人，所有机器人最终都稳定或记为失败
+
+运行：python benchmarks/bench_launch.py [--bots 60] [--proxies 20] [--cpus 8] [--interval 180]
+检查不通过时返回非零退出码
+"""
+
+import argparse
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from launch_scheduler import (  # noqa: E402
+    FakeClock,
+    FakeDocker,
+    FakeHost,
+    LaunchBot,
+    LaunchPolicy,
+    LaunchScheduler,
+    run_schedule,
+)
+
+
+def create_bots(count, proxies, keys):
+    """机器人 i 使用代理 i % proxies、API key i % keys"""
+    return [LaunchBot(f"bot{i + 1}", proxy_id=f"p{i % proxies}" if proxies else '',
+                      key_id=f"k{i % keys}" if keys else '') for i in range(count)]
+
+
+class RecordingHost(FakeHost):
+    """记录调度器最近一次读取的主机指标，启动时检查的是做出决策时的指标"""
+
+    last = None
+
+    def sample(self):
+        self.last = super().sample()
+        return self.last
+
+
+def simulate(options, policy, crashing, hanging):
+    """运行一次模拟，返回 (调度器, 耗时秒数, 违反约束的描述列表)"""
+    clock = FakeClock()
+    docker = FakeDocker(clock, boot_seconds=options.boot, crashing=crashing, hanging=hanging)
+    host = RecordingHost(docker, cpus=options.cpus, memory_mb=options.memory)
+    bots = create_bots(options.bots, options.proxies, options.keys)
+    scheduler = LaunchScheduler(bots, policy, docker, host)
+    violations = []
+
+    def launch(bot):
+        # 启动命令执行前检查：mark_launched 之后 starting 已包含本批机器人
+        starting = [member for member, _ in scheduler.starting.values()]
+        if len(starting) > policy.max_starting:
+            violations.append(f"{bot.name}: 启动中 {len(starting)} 个，超过上限 {policy.max_starting}")
+        for attr in ('proxy_id', 'key_id'):
+            values = [getattr(member, attr) for member in starting if getattr(member, attr)]
+            if len(values) != len(set(values)):
+                violations.append(f"{bot.name}: 启动中的机器人共用 {attr}")
+        sample = host.last
+        if sample.load_per_cpu > policy.max_load_per_cpu or sample.cpu_percent > policy.max_cpu_percent:
+            violations.append(f"{bot.name}: 每核负载 {sample.load_per_cpu:.2f} / CPU {sample.cpu_percent:.0f}% "
+                              f"超过上限时启动")
+        if sample.memory_available_mb < policy.min_memory_mb + policy.memory_per_bot_mb:
+            violations.append(f"{bot.name}: 可用内存 {sample.memory_available_mb:.0f}MB 不足时启动")
+        docker.launch(bot)
+
+    started = clock()
+    run_schedule(scheduler, launch, clock=clock, sleep=clock.sleep, poll_seconds=options.poll, log=lambda _: None)
+    return scheduler, clock() - started, violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动调度基准测试（模拟 docker 和主机指标）")
+    parser.add_argument('--bots', type=int, default=60, help="机器人数（默认 60）")
+    parser.add_argument('--proxies', type=int, default=20, help="代理数，机器人轮流使用（默认 20）")
+    parser.add_argument('--keys', type=int, default=30, help="API key 数，机器人轮流使用（默认 30）")
+    parser.add_argument('--cpus', type=int, default=8, help="模拟主机的 CPU 核数（默认 8）")
+    parser.add_argument('--memory', type=float, default=32768.0, help="模拟主机的内存（MB，默认 32768）")
+    parser.add_argument('--boot', type=float, default=10.0, help="容器从启动命令到运行的时间（秒，默认 10）")
+    parser.add_argument('--interval', type=float, default=180.0, help="固定间隔启动的间隔（秒，默认 180）")
+    parser.add_argument('--poll', type=float, default=5.0, help="调度器检查间隔（秒，默认 5）")
+    options = parser.parse_args()
+
+    policy = LaunchPolicy()
+    crashing = {'bot7'}
+    hanging = {'bot13'}
+    scheduler, adaptive_seconds, violations = simulate(options, policy, crashing, hanging)
+    # 固定间隔：每批一个机器人，最后一个机器人在 (n-1)*间隔 后启动，再经过启动和稳定时间
+    fixed_seconds = (options.bots - 1) * options.interval + options.boot + policy.settle_seconds
+
+    # 内存紧张的主机：可用内存只够全部机器人再多一点，调度器需要逐步减小每批的数量
+    tight = argparse.Namespace(**vars(options))
+    tight.memory = policy.min_memory_mb + (options.bots + 1) * policy.memory_per_bot_mb
+    tight_scheduler, tight_seconds, tight_violations = simulate(tight, policy, (), ())
+
+    # 2 核主机：两个容器启动中时负载就超过上限，调度器需要等负载降下来
+    small = argparse.Namespace(**vars(options))
+    small.cpus = 2
+    small_scheduler, small_seconds, small_violations = simulate(small, policy, (), ())
+    violations += tight_violations + small_violations
+
+    print("=" * 50)
+    print(f"机器人 {options.bots} 个，代理 {options.proxies} 个，API key {options.keys} 个，{options.cpus} 核")
+    print(f"固定间隔启动（{options.interval:g}s）: {fixed_seconds / 60:7.1f} 分钟")
+    print(f"自适应启动:               {adaptive_seconds / 60:7.1f} 分钟"
+          f"（{fixed_seconds / adaptive_seconds:.1f}x）")
+    print(f"自适应启动（内存紧张）:   {tight_seconds / 60:7.1f} 分钟")
+    print(f"自适应启动（2 核）:       {small_seconds / 60:7.1f} 分钟")
+    print(f"稳定 {len(scheduler.settled)} 个，失败 {len(scheduler.failed)} 个: "
+          f"{', '.join(f'{name}（{reason}）' for name, reason in scheduler.failed)}")
+    for violation in violations[:10]:
+        print(f"  违反约束: {violation}")
+
+    failed_names = {name for name, _ in scheduler.failed}
+    checks = [
+        ("没有违反调度约束", not violations),
+        ("失败的容器不阻塞其他机器人",
+         failed_names == crashing | hanging and len(scheduler.settled) == options.bots - len(failed_names)),
+        ("内存紧张时全部机器人仍然启动", len(tight_scheduler.settled) == options.bots),
+        ("负载高时放慢启动", len(small_scheduler.settled) == options.bots and small_seconds > adaptive_seconds),
+        ("自适应启动比固定间隔快", adaptive_seconds < fixed_seconds),
+    ]
+    failed = False
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
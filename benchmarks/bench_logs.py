@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+日志扫描基准测试（在临时目录中生成 HummingBot 格式的日志，不需要 docker）
+比较逐行读取全部日志和 log_scanner.py 的耗时，并检查增量扫描：
+- 首次扫描（并行和单进程）的统计与生成的日志一致，大文件按行切分的分段不会重复或遗漏
+- 没有变化时再次扫描不读取任何内容
+- 追加的日志只读取新增的部分，不完整的最后一行在写完后才统计
+- 日志轮转（改名后新建文件）不重复统计，文件被截断（copytruncate）后从头统计
+
+运行：python benchmarks/bench_logs.py [--bots 200] [--size-kb 128]
+检查不通过时返回非零退出码
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import log_scanner  # noqa: E402
+from log_scanner import DEFAULT_PATTERNS, LogScanner  # noqa: E402
+
+PREFIX = '2024-05-01 12:00:00,000 - 1 - hummingbot.strategy.script_strategy_base'
+# 每 20 行：错误 1、警告 2（其中 1 行同时是断线）、成交 2、断线 1
+BLOCK_LINES = (
+    [f"{PREFIX} - INFO - Tick: mid price 64000.{i} spread 0.1%" for i in range(15)]
+    + [f"{PREFIX} - INFO - The BUY order 1 amounting to 0.01/0.01 BTC has been completely filled.",
+       f"{PREFIX} - INFO - The SELL order 2 amounting to 0.01/0.01 BTC has been completely filled.",
+       f"{PREFIX} - ERROR - Unexpected error while fetching account balances.",
+       f"{PREFIX} - WARNING - Order book is too thin, skipping this tick.",
+       f"{PREFIX} - WARNING - WebSocket connection closed. Reconnecting..."]
+)
+BLOCK = ('\n'.join(BLOCK_LINES) + '\n').encode('utf-8')
+BLOCK_COUNTS = {'error': 1, 'warning': 2, 'fill': 2, 'disconnect': 1}
+
+
+def write_blocks(path: str, blocks: int, mode: str = 'ab'):
+    with open(path, mode) as f:
+        f.write(BLOCK * blocks)
+
+
+def naive_counts(logs_dir: str) -> dict:
+    """原来的方式：逐行读取所有日志，每行依次匹配"""
+    patterns = [(name, [re.compile(regex) for regex in regexes]) for name, (_, regexes) in DEFAULT_PATTERNS.items()]
+    totals = dict.fromkeys(DEFAULT_PATTERNS, 0)
+    for bot in os.listdir(logs_dir):
+        bot_dir = os.path.join(logs_dir, bot)
+        if not os.path.isdir(bot_dir):
+            continue
+        for name in os.listdir(bot_dir):
+            with open(os.path.join(bot_dir, name), 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    for key, regexes in patterns:
+                        if any(regex.search(line) for regex in regexes):
+                            totals[key] += 1
+    return totals
+
+
+def totals_of(scanner: LogScanner) -> dict:
+    totals = dict.fromkeys(DEFAULT_PATTERNS, 0)
+    for counts in scanner.bots.values():
+        for name in totals:
+            totals[name] += counts.get(name, 0)
+    return totals
+
+
+def expected(blocks: int) -> dict:
+    return {name: count * blocks for name, count in BLOCK_COUNTS.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志扫描基准测试（生成 HummingBot 格式的日志）")
+    parser.add_argument('--bots', type=int, default=200, help="机器人数（默认 200）")
+    parser.add_argument('--size-kb', type=int, default=128, help="每个日志文件的大小（KB，默认 128）")
+    parser.add_argument('--chunk-kb', type=int, default=256,
+                        help="大文件的分段大小（KB，默认 256，用较小的值检查按行切分）")
+    options = parser.parse_args()
+    log_scanner.CHUNK_BYTES = options.chunk_kb * 1024
+    log_scanner.PARALLEL_MIN_BYTES = 1024 * 1024
+
+    blocks = max(1, options.size_kb * 1024 // len(BLOCK))
+    with tempfile.TemporaryDirectory(prefix='bench_logs_') as logs_dir:
+        names = [f"bot{i + 1}" for i in range(options.bots)]
+        for name in names:
+            os.makedirs(os.path.join(logs_dir, name))
+            # 一个已轮转的旧文件和一个当前文件
+            write_blocks(os.path.join(logs_dir, name, f"logs_{name}.log.2024-04-30"), blocks)
+            write_blocks(os.path.join(logs_dir, name, f"logs_{name}.log"), blocks)
+        # 一个较大的文件，按 --chunk-kb 切分成多个分段
+        big_blocks = blocks * 20
+        write_blocks(os.path.join(logs_dir, names[0], f"logs_{names[0]}.log"), big_blocks)
+        total_blocks = options.bots * blocks * 2 + big_blocks
+
+        started = time.perf_counter()
+        naive = naive_counts(logs_dir)
+        naive_seconds = time.perf_counter() - started
+
+        scanner = LogScanner(logs_dir)
+        started = time.perf_counter()
+        first = scanner.scan()
+        first_seconds = time.perf_counter() - started
+
+        first_totals = totals_of(scanner)
+        serial = LogScanner(logs_dir, jobs=1)
+        serial.scan()
+
+        started = time.perf_counter()
+        rerun = scanner.scan()
+        rerun_seconds = time.perf_counter() - started
+
+        # 追加：前 20 个机器人各追加 3 个块，再加半行
+        appended = names[:20]
+        for name in appended:
+            path = os.path.join(logs_dir, name, f"logs_{name}.log")
+            write_blocks(path, 3)
+            with open(path, 'ab') as f:
+                f.write(BLOCK_LINES[18].encode('utf-8')[:40])
+        append = scanner.scan()
+        for name in appended:
+            with open(os.path.join(logs_dir, name, f"logs_{name}.log"), 'ab') as f:
+                f.write(BLOCK_LINES[18].encode('utf-8')[40:] + b'\n')
+        completed = scanner.scan()
+
+        # 轮转：当前文件改名，新建的文件写入 2 个块
+        rotated = names[20:30]
+        for name in rotated:
+            path = os.path.join(logs_dir, name, f"logs_{name}.log")
+            os.rename(path, f"{path}.2024-05-01")
+            write_blocks(path, 2, 'wb')
+        rotate = scanner.scan()
+
+        # copytruncate：截断后写入 1 个块
+        truncated = names[30:35]
+        for name in truncated:
+            write_blocks(os.path.join(logs_dir, name, f"logs_{name}.log"), 1, 'wb')
+        truncate = scanner.scan()
+
+        final_naive = naive_counts(logs_dir)
+
+    def new_totals(result):
+        totals = dict.fromkeys(DEFAULT_PATTERNS, 0)
+        for counts in result['bots'].values():
+            for name in totals:
+                totals[name] += counts.get(name, 0)
+        return totals
+
+    size_mb = total_blocks * len(BLOCK) / 1024 / 1024
+    print("=" * 50)
+    print(f"机器人 {options.bots} 个，日志共 {size_mb:.1f}MB")
+    print(f"逐行读取全部日志:   {naive_seconds:7.3f}s")
+    print(f"首次扫描:           {first_seconds:7.3f}s（{naive_seconds / first_seconds:.1f}x）")
+    print(f"没有变化时再次扫描: {rerun_seconds:7.3f}s（读取 {rerun['bytes']} 字节）")
+
+    checks = [
+        ("首次扫描的统计正确", new_totals(first) == naive == expected(total_blocks)),
+        ("并行和单进程的统计一致", totals_of(serial) == first_totals),
+        ("没有变化时不读取", rerun['bytes'] == 0 and rerun['files'] == 0),
+        ("追加时只统计新增的完整行",
+         new_totals(append) == expected(3 * len(appended)) and append['bytes'] < 4 * len(BLOCK) * len(appended)),
+        ("不完整的行写完后统计", new_totals(completed) == {'error': 0, 'warning': len(appended),
+                                                    'fill': 0, 'disconnect': 0}),
+        ("日志轮转不重复统计", new_totals(rotate) == expected(2 * len(rotated))),
+        ("截断后从头统计", new_totals(truncate) == expected(len(truncated))),
+        # 截断前的内容已经统计过，不在当前的日志中
+        ("累计统计与日志内容一致", totals_of(scanner) == {name: final_naive[name] + count * blocks * len(truncated)
+                                                 for name, count in BLOCK_COUNTS.items()}),
+        ("首次扫描比逐行读取快", first_seconds < naive_seconds),
+    ]
+    failed = False
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        failed = failed or not passed
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+prepare.py 无变化（no-op）运行的启动耗时基准测试
+在临时配置文件夹中生成一次配置，然后重复运行 prepare.py，统计中位数耗时，
+并检查 no-op 运行没有导入加密模块（eth_keyfile/eth_account）等重量级依赖
+
+运行：python benchmarks/bench_startup.py [--repeat 10] [--max-ms 100]
+超过阈值或导入了不该导入的模块时返回非零退出码，可用于防止启动耗时回退
+仓库没有测试套件，也没有自动运行的检查：修改 prepare.py 或它导入的模块后需要手动运行
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREPARE_SCRIPT = os.path.join(ROOT_DIR, 'prepare.py')
+
+# no-op 运行不应该导入的模块
+HEAVY_MODULES = ('crypto_utils', 'eth_keyfile', 'eth_account', 'yaml', 'concurrent.futures.process')
+
+BOTS_CSV = "name,config_file_name,script_config,proxy,connector\n" + "".join(
+    f"bot{i},v2_with_controllers.py,conf_ads_1_APT.yml,,backpack_perpetual\n" for i in range(1, 21)
+)
+STRATEGY_CSV = "version,market,amount\nads_1,APT,500\n"
+
+# 在子进程中以 __main__ 方式运行 prepare.py，结束后输出已导入的重量级模块
+MODULE_CHECK_CODE = """
+import json, runpy, sys
+sys.argv = ['prepare.py', sys.argv[1]]
+try:
+    runpy.run_path({script!r}, run_name='__main__')
+except SystemExit:
+    pass
+print(json.dumps([name for name in {modules!r} if name in sys.modules]))
+"""
+
+
+def time_command(command, repeat):
+    """重复运行命令，返回每次的耗时（秒）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prepare.py no-op 启动耗时基准测试")
+    parser.add_argument('--repeat', type=int, default=10, help="重复运行次数（取中位数）")
+    parser.add_argument('--max-ms', type=float, default=100.0,
+                        help="no-op 运行相对空解释器启动的额外耗时上限（毫秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as config_folder:
+        for name, content in (('bots.csv', BOTS_CSV), ('strategy.csv', STRATEGY_CSV)):
+            path = os.path.join(config_folder, name)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            # 修改时间设为较早的时间，使哈希缓存能够记录 (size, mtime_ns)
+            old = time.time() - 60
+            os.utime(path, (old, old))
+
+        # 首次运行生成配置并写入哈希缓存，第二次运行确认 stat 记录已保存
+        for _ in range(2):
+            subprocess.run([sys.executable, PREPARE_SCRIPT, config_folder], cwd=ROOT_DIR,
+                           stdout=subprocess.DEVNULL, check=True)
+
+        baseline = statistics.median(time_command([sys.executable, '-c', 'pass'], args.repeat))
+        noop = statistics.median(time_command([sys.executable, PREPARE_SCRIPT, config_folder], args.repeat))
+
+        check = subprocess.run(
+            [sys.executable, '-c', MODULE_CHECK_CODE.format(script=PREPARE_SCRIPT, modules=HEAVY_MODULES),
+             config_folder],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        )
+        loaded = json.loads(check.stdout.strip().splitlines()[-1])
+
+    overhead_ms = (noop - baseline) * 1000
+    print(f"空解释器启动:        {baseline * 1000:.1f} ms")
+    print(f"prepare.py no-op:    {noop * 1000:.1f} ms")
+    print(f"额外耗时:            {overhead_ms:.1f} ms（上限 {args.max_ms:.0f} ms）")
+    print(f"已导入的重量级模块:  {', '.join(loaded) if loaded else '无'}")
+
+    failed = False
+    if overhead_ms > args.max_ms:
+        print("❌ no-op 运行耗时超过上限")
+        failed = True
+    if loaded:
+        print("❌ no-op 运行导入了重量级模块")
+        failed = True
+    if not failed:
+        print("✅ 通过")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
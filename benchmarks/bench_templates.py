@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+模板渲染微基准测试
+对比原始 render_template（每次加载文件 + 正则回调替换）与已编译模板的渲染耗时
+
+运行：python benchmarks/bench_templates.py [--bots 100] [--repeat 5]
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from template_utils import convert_to_yaml_array, load_compiled_template  # noqa: E402
+
+TEMPLATES_DIR = os.path.join(ROOT_DIR, 'templates')
+
+SAMPLE_STRATEGY = {
+    'version': 'ads_1', 'market': 'APT-USDC', 'amount': '500',
+    'buy_spreads': '"""1.8,2.5,3.4"""', 'sell_spreads': '"""1.8,2.5,3.4"""',
+    'buy_amounts_pct': '"""0.13,0.27,0.6"""', 'sell_amounts_pct': '"""0.13,0.27,0.6"""',
+    'executor_refresh_time': '600', 'cooldown_time': '600', 'stop_loss': '0.004',
+    'take_profit': '0.004', 'activation_price': '0.0032', 'trailing_delta': '0.0003',
+    'candles_connector': 'binance_perpetual', 'candles_trading_pair': 'APT-USDT',
+    'interval': '3m', 'macd_fast': '21', 'macd_slow': '42', 'macd_signal': '9',
+    'natr_length': '14', 'position_rebalance_threshold_pct': '0.01',
+}
+
+
+def legacy_load_template(template_path):
+    """原始实现：每次调用都从磁盘读取模板"""
+    with open(template_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def legacy_render_template(template_content, variables):
+    """原始实现：对整个模板执行未编译的 re.sub 回调替换"""
+    def replace_match(match):
+        var_name = match.group(1)
+        value = variables.get(var_name, match.group(0))
+
+        if value == match.group(0):
+            return value
+
+        value_str = str(value)
+        if (value_str.startswith('"""') or
+                any(separator in value_str for separator in [',', ';', '|'])):
+            return convert_to_yaml_array(value_str)
+
+        return value_str
+
+    return re.sub(r'\$\{([^}]+)\}', replace_match, template_content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模板渲染微基准测试")
+    parser.add_argument('--bots', type=int, default=100, help="每轮模拟的机器人数量")
+    parser.add_argument('--repeat', type=int, default=5, help="重复轮数（取最小值）")
+    args = parser.parse_args()
+
+    template_path = os.path.join(TEMPLATES_DIR, 'pmm_dynamic.yml')
+
+    # 先确认两种实现的输出完全一致
+    expected = legacy_render_template(legacy_load_template(template_path), SAMPLE_STRATEGY)
+    actual = load_compiled_template(template_path).render(SAMPLE_STRATEGY)
+    if expected != actual:
+        print("❌ 已编译模板的渲染结果与原始实现不一致")
+        sys.exit(1)
+
+    def run_legacy():
+        for _ in range(args.bots):
+            legacy_render_template(legacy_load_template(template_path), SAMPLE_STRATEGY)
+
+    def run_compiled():
+        for _ in range(args.bots):
+            load_compiled_template(template_path).render(SAMPLE_STRATEGY)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    compiled = min(timeit.repeat(run_compiled, number=1, repeat=args.repeat))
+
+    print(f"模板: {template_path}，每轮渲染 {args.bots} 次")
+    print(f"原始 load_template + render_template: {legacy * 1000:.2f} ms")
+    print(f"已编译模板（缓存）:                    {compiled * 1000:.2f} ms")
+    print(f"加速比: {legacy / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
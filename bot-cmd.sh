@@ -5,16 +5,21 @@ set -e
 show_help() {
     echo "HummingBot 机器人命令执行脚本"
     echo ""
-    echo "用法: $0 <命令>"
+    echo "用法: $0 [--running-only] <命令>"
     echo ""
     echo "功能:"
     echo "  - 读取 ~/ex-bot/docker-compose.override.yml 中的 services"
     echo "  - 向所有机器人的tmux窗口发送指定命令"
+    echo "  - -r, --running-only: 只发送给容器运行中的机器人（容器未运行时窗口中是普通 shell）"
     echo ""
     echo "示例:"
     echo "  $0 stop        # 停止所有机器人"
     echo "  $0 restart     # 重启所有机器人"
     echo "  $0 logs        # 查看所有机器人日志"
+    echo "  $0 -r stop     # 只向运行中的机器人发送 stop"
+    echo ""
+    echo "有 python3 和 ~/command_fanout.py 时并行发送，"
+    echo "并从窗口输出确认每个机器人已执行命令（BOT_CMD_TIMEOUT 秒内未确认记为超时，默认 10）"
     echo ""
     echo "注意: 确保 ~/ex-bot/docker-compose.override.yml 文件存在"
 }
@@ -31,8 +36,20 @@ if [ "$1" = "-h" ] || [ "$1" = "--help" ]; then
     exit 0
 fi
 
+RUNNING_ONLY=false
+if [ "$1" = "-r" ] || [ "$1" = "--running-only" ]; then
+    RUNNING_ONLY=true
+    shift
+    if [ $# -eq 0 ]; then
+        show_help
+        exit 1
+    fi
+fi
+
 # 读取输入参数，比如 up / stop / restart 等
 CMD="$1"
+# 每个机器人等待确认的最长时间（秒），可以通过环境变量修改
+CMD_TIMEOUT="${BOT_CMD_TIMEOUT:-10}"
 
 # 检查是否在正确的目录
 if [ ! -f ~/ex-bot/docker-compose.override.yml ]; then
@@ -46,36 +63,42 @@ echo "读取 ~/ex-bot/docker-compose.override.yml 中的 services..."
 # 切换到ex-bot目录
 cd ~/ex-bot
 
-# 从docker-compose.override.yml读取services
+# 读取机器人名称：优先使用 prepare.py 生成的服务索引 services.tsv（第一行为列名），没有时解析 docker-compose.override.yml
 BOT_NAMES=()
-in_services=false
-while IFS= read -r line; do
-    # 检测services段落开始
-    if [[ "$line" =~ ^[[:space:]]*services:[[:space:]]*$ ]]; then
-        in_services=true
-        continue
-    fi
+if [ -f services.tsv ]; then
+    while IFS=$'\t' read -r service_name _; do
+        [ -n "$service_name" ] && BOT_NAMES+=("$service_name")
+    done < <(tail -n +2 services.tsv)
+else
+    in_services=false
+    while IFS= read -r line; do
+        # 检测services段落开始
+        if [[ "$line" =~ ^[[:space:]]*services:[[:space:]]*$ ]]; then
+            in_services=true
+            continue
+        fi
 
-    # 如果不在services段落中，跳过
-    if [ "$in_services" = false ]; then
-        continue
-    fi
+        # 如果不在services段落中，跳过
+        if [ "$in_services" = false ]; then
+            continue
+        fi
 
-    # 检测到新的顶级段落，退出services
-    if [[ "$line" =~ ^[a-zA-Z] ]] && [[ ! "$line" =~ ^[[:space:]] ]]; then
-        in_services=false
-        continue
-    fi
+        # 检测到新的顶级段落，退出services
+        if [[ "$line" =~ ^[a-zA-Z] ]] && [[ ! "$line" =~ ^[[:space:]] ]]; then
+            in_services=false
+            continue
+        fi
 
-    # 在services段落中，匹配服务名
-    if [[ "$line" =~ ^[[:space:]]+([a-zA-Z0-9_-]+):[[:space:]]*$ ]]; then
-        service_name="${BASH_REMATCH[1]}"
-        # 跳过配置项（如 build, logging, environment, volumes 等）
-        if [[ "$service_name" != "build" && "$service_name" != "logging" && "$service_name" != "environment" && "$service_name" != "volumes" && "$service_name" != "options" && "$service_name" != "container_name" ]]; then
-            BOT_NAMES+=("$service_name")
+        # 在services段落中，匹配服务名
+        if [[ "$line" =~ ^[[:space:]]+([a-zA-Z0-9_-]+):[[:space:]]*$ ]]; then
+            service_name="${BASH_REMATCH[1]}"
+            # 跳过配置项（如 build, logging, environment, volumes 等）
+            if [[ "$service_name" != "build" && "$service_name" != "logging" && "$service_name" != "environment" && "$service_name" != "volumes" && "$service_name" != "options" && "$service_name" != "container_name" ]]; then
+                BOT_NAMES+=("$service_name")
+            fi
         fi
-    fi
-done < docker-compose.override.yml
+    done < docker-compose.override.yml
+fi
 
 # 检查是否读取到机器人名称
 if [ ${#BOT_NAMES[@]} -eq 0 ]; then
@@ -96,12 +119,33 @@ if ! tmux has-session -t "$SESSION" 2>/dev/null; then
     exit 1
 fi
 
+# 有 python3 时交给 ~/command_fanout.py：并行发送，从窗口输出确认命令已执行，输出每个机器人的结果
+if command -v python3 >/dev/null 2>&1 && [ -f ~/command_fanout.py ] && [ -f ~/fleet_controller.py ] \
+    && [ -f ~/launch_scheduler.py ]; then
+    FANOUT_OPTIONS=()
+    if [ "$RUNNING_ONLY" = true ]; then
+        FANOUT_OPTIONS+=(--running-only)
+    fi
+    rc=0
+    python3 ~/command_fanout.py "$CMD" --session "$SESSION" --timeout "$CMD_TIMEOUT" "${FANOUT_OPTIONS[@]}" \
+        --bots "${BOT_NAMES[@]}" || rc=$?
+    if [ "$rc" -ne 2 ]; then
+        exit "$rc"
+    fi
+fi
+
 # 获取现有窗口列表
 WINDOW_LIST=$(tmux list-windows -t "$SESSION" -F "#{window_name}")
+RUNNING_LIST=""
+if [ "$RUNNING_ONLY" = true ]; then
+    RUNNING_LIST=$(docker ps --format "{{.Names}}")
+fi
 
 echo "向所有机器人发送命令: $CMD"
 for BOT_NAME in "${BOT_NAMES[@]}"; do
-    if echo "$WINDOW_LIST" | grep -Fxq "$BOT_NAME"; then
+    if [ "$RUNNING_ONLY" = true ] && ! echo "$RUNNING_LIST" | grep -Fxq "$BOT_NAME"; then
+        echo "⏭️  机器人 $BOT_NAME 未运行，跳过发送命令"
+    elif echo "$WINDOW_LIST" | grep -Fxq "$BOT_NAME"; then
         echo "向机器人 $BOT_NAME 发送命令: $CMD"
         tmux send-keys -t "$SESSION:$BOT_NAME" "$CMD" C-m
     else
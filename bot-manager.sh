@@ -36,6 +36,9 @@ show_help() {
     echo "  tmux select-window -t bot1  # 切换到bot1窗口"
     echo ""
     echo "注意: 确保 ~/ex-bot/docker-compose.override.yml 文件存在"
+    echo "      status、start-all、stop-all 和 restart-all 在有 python3 和 ~/ex-bot/services.tsv 时"
+    echo "      由 ~/fleet_controller.py 一次查询所有容器状态执行，启动按 launch_scheduler.py 的调度分批进行"
+    echo "      cmd 在有 python3 时由 ~/command_fanout.py 并行发送，并确认每个机器人已执行命令"
 }
 
 # 检查docker-compose文件是否存在
@@ -47,13 +50,19 @@ check_docker_compose_file() {
     fi
 }
 
-# 从docker-compose.override.yml读取services
+# 读取机器人名称：优先使用 prepare.py 生成的服务索引 services.tsv，没有时解析 docker-compose.override.yml
 read_bot_names() {
     local bot_names=()
     local in_services=false
 
     cd ~/ex-bot
 
+    # services.tsv：第一行为列名（name, compose_file, group, proxy_id, key_id），之后每行一个服务
+    if [ -f services.tsv ]; then
+        tail -n +2 services.tsv | cut -f1 | grep -v '^$' || true
+        return
+    fi
+
     while IFS= read -r line; do
         # 检测services段落开始
         if [[ "$line" =~ ^[[:space:]]*services:[[:space:]]*$ ]]; then
@@ -86,6 +95,61 @@ read_bot_names() {
     printf '%s\n' "${bot_names[@]}"
 }
 
+# 机器人所在的 compose 文件（services.tsv 的第二列）不是默认文件时（prepare.py --shard-compose），
+# 返回带 -f 参数的 docker compose 命令
+compose_cmd() {
+    local bot_name="$1"
+    local compose_file=""
+    if [ -f ~/ex-bot/services.tsv ]; then
+        compose_file=$(awk -F'\t' -v name="$bot_name" 'NR > 1 && $1 == name { print $2; exit }' ~/ex-bot/services.tsv)
+    fi
+    if [ -n "$compose_file" ] && [ "$compose_file" != "docker-compose.override.yml" ]; then
+        echo "docker compose -f $compose_file"
+    else
+        echo "docker compose"
+    fi
+}
+
+# 批量操作（status / start-all / stop-all / restart-all）交给 ~/fleet_controller.py：
+# 只读取一次 services.tsv，通过 Docker Engine API 一次查询所有容器的状态
+# 返回 2 表示不可用（没有 python3、脚本或 services.tsv，或无法访问 docker socket），调用方改用下面的 bash 实现
+run_fleet_controller() {
+    if ! command -v python3 >/dev/null 2>&1 || [ ! -f ~/fleet_controller.py ] || [ ! -f ~/launch_scheduler.py ] \
+        || [ ! -f ~/ex-bot/services.tsv ]; then
+        return 2
+    fi
+    local session
+    session=$(tmux display-message -p '#S' 2>/dev/null || echo "bot")
+    python3 ~/fleet_controller.py "$@" --session "$session"
+}
+
+# 执行批量操作：fleet_controller.py 可用时以它的退出码退出，否则执行给定的 bash 函数
+run_bulk() {
+    local action="$1"
+    shift
+    local rc=0
+    run_fleet_controller "$action" || rc=$?
+    if [ "$rc" -ne 2 ]; then
+        exit "$rc"
+    fi
+    "$@"
+}
+
+# 命令发送交给 ~/command_fanout.py：并行发送到各机器人的 tmux 窗口，并从窗口输出确认命令已执行
+# 返回 2 表示不可用（没有 python3 或脚本），调用方改用逐个 send-keys
+run_command_fanout() {
+    if ! command -v python3 >/dev/null 2>&1 || [ ! -f ~/command_fanout.py ] || [ ! -f ~/fleet_controller.py ] \
+        || [ ! -f ~/launch_scheduler.py ]; then
+        return 2
+    fi
+    python3 ~/command_fanout.py "$@"
+}
+
+# 所有运行中的容器名（一次 docker ps），用于逐个检查多个机器人时复用
+running_container_names() {
+    docker ps --format "{{.Names}}"
+}
+
 # 检查机器人是否存在
 bot_exists() {
     local bot_name="$1"
@@ -146,7 +210,7 @@ start_bot() {
 
     # 在对应窗口里执行启动命令
     tmux send-keys -t "$session:$bot_name" \
-        "cd ~/ex-bot && docker compose up $bot_name -d && docker attach $bot_name" C-m
+        "cd ~/ex-bot && $(compose_cmd "$bot_name") up $bot_name -d && docker attach $bot_name" C-m
 
     if is_bot_running "$bot_name"; then
         echo "✅ 机器人 '$bot_name' 启动成功"
@@ -172,7 +236,7 @@ stop_bot() {
 
     echo "停止机器人: $bot_name"
     cd ~/ex-bot
-    docker compose stop "$bot_name"
+    $(compose_cmd "$bot_name") stop "$bot_name"
 
     if ! is_bot_running "$bot_name"; then
         echo "✅ 机器人 '$bot_name' 停止成功"
@@ -214,12 +278,12 @@ start_all_stopped() {
 
             # 在对应窗口里执行启动命令
             tmux send-keys -t "$session:$bot_name" \
-                "cd ~/ex-bot && docker compose up $bot_name -d && docker attach $bot_name" C-m
+                "cd ~/ex-bot && $(compose_cmd "$bot_name") up $bot_name -d && docker attach $bot_name" C-m
 
             sleep 2
             if is_bot_running "$bot_name"; then
                 echo "✅ $bot_name 启动成功"
-                ((started_count++))
+                started_count=$((started_count + 1))
             else
                 echo "❌ $bot_name 启动失败"
             fi
@@ -245,10 +309,10 @@ stop_all_running() {
         if is_bot_running "$bot_name"; then
             echo "停止机器人: $bot_name"
             cd ~/ex-bot
-            docker compose stop "$bot_name"
+            $(compose_cmd "$bot_name") stop "$bot_name"
             if ! is_bot_running "$bot_name"; then
                 echo "✅ $bot_name 停止成功"
-                ((stopped_count++))
+                stopped_count=$((stopped_count + 1))
             else
                 echo "❌ $bot_name 停止失败"
             fi
@@ -316,11 +380,13 @@ show_status() {
         echo "========================================"
         local running_count=0
         local total_count=${#bot_names[@]}
+        local running_names
+        running_names=$(running_container_names)
 
         for bot_name in "${bot_names[@]}"; do
-            if is_bot_running "$bot_name"; then
+            if grep -Fxq "$bot_name" <<< "$running_names"; then
                 echo "✅ $bot_name - 运行中"
-                ((running_count++))
+                running_count=$((running_count + 1))
             else
                 echo "❌ $bot_name - 未运行"
             fi
@@ -353,7 +419,20 @@ send_command() {
             echo "错误: 机器人 '$target_bot' 未运行，无法发送命令"
             return 1
         fi
+    fi
 
+    # 并行发送并输出每个机器人的确认结果（发送给所有机器人时与原来相同，只发送给运行中的机器人）
+    local rc=0
+    if [ -n "$target_bot" ]; then
+        run_command_fanout "$command" --session "$session" --bots "$target_bot" || rc=$?
+    else
+        run_command_fanout "$command" --session "$session" --running-only --bots "${bot_names[@]}" || rc=$?
+    fi
+    if [ "$rc" -ne 2 ]; then
+        return "$rc"
+    fi
+
+    if [ -n "$target_bot" ]; then
         echo "向机器人 '$target_bot' 发送命令: $command"
         tmux send-keys -t "$session:$target_bot" "$command" C-m
         echo "✅ 命令已发送"
@@ -366,7 +445,7 @@ send_command() {
             if is_bot_running "$bot_name"; then
                 echo "向机器人 '$bot_name' 发送命令: $command"
                 tmux send-keys -t "$session:$bot_name" "$command" C-m
-                ((sent_count++))
+                sent_count=$((sent_count + 1))
             fi
         done
 
@@ -379,11 +458,14 @@ list_bots() {
     local bot_names
     bot_names=($(read_bot_names))
 
+    local running_names
+    running_names=$(running_container_names)
+
     echo "所有机器人列表:"
     echo "========================================"
 
     for bot_name in "${bot_names[@]}"; do
-        if is_bot_running "$bot_name"; then
+        if grep -Fxq "$bot_name" <<< "$running_names"; then
             echo "✅ $bot_name - 运行中"
         else
             echo "❌ $bot_name - 未运行"
@@ -421,10 +503,10 @@ main() {
             stop_bot "$arg1"
             ;;
         "start-all")
-            start_all_stopped
+            run_bulk start-all start_all_stopped
             ;;
         "stop-all")
-            stop_all_running
+            run_bulk stop-all stop_all_running
             ;;
         "restart")
             if [ -z "$arg1" ]; then
@@ -435,10 +517,14 @@ main() {
             restart_bot "$arg1"
             ;;
         "restart-all")
-            restart_all
+            run_bulk restart-all restart_all
             ;;
         "status")
-            show_status "$arg1"
+            if [ -z "$arg1" ]; then
+                run_bulk status show_status
+            else
+                show_status "$arg1"
+            fi
             ;;
         "cmd")
             if [ -z "$arg1" ]; then
@@ -0,0 +1,221 @@
+"""
+部署文件集合与部署包
+- collect_local_files：一个配置文件夹需要部署到服务器的文件（conf/、compose 文件、服务索引、宿主机脚本），
+  deploy.py 的增量部署和部署包共用
+- write_bundle：把这些文件打成一个自描述的部署包（tar + xz/gz，只用标准库），内容相同的文件只保存一份，
+  按 sha256 引用；服务器上用 unpack-bundle.sh 解包，重复的文件解包为硬链接
+
+部署包内容：
+    bundle.json            格式、版本、来源文件夹、文件数、对象数、索引哈希
+    index.tsv              每行一个文件：sha256<TAB>权限<TAB>服务器相对路径（相对 home 目录）
+    dirs.txt               conf/ 下的所有目录（包括 prepare.py 创建的空目录），每行一个
+    SHA256SUMS             每个对象的校验和（sha256sum -c 格式）
+    deploy_manifest.json   与 deploy.py 相同的部署清单，解包后之后的增量部署可以直接比较
+    objects/<sha256>       去重后的文件内容
+"""
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from compose_utils import DEFAULT_COMPOSE_FILE, SERVICES_INDEX_FILE
+from manifest_utils import OutputManifest, file_sha256
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+REMOTE_DIR = 'ex-bot'
+REMOTE_MANIFEST = f'{REMOTE_DIR}/.deploy_manifest.json'
+DEPLOY_MANIFEST_VERSION = 1
+
+# 上传到服务器 home 目录的宿主机脚本
+FLEET_SCRIPTS = ('start-bot.sh', 'stop-pending.sh', 'bot-cmd.sh', 'bot-manager.sh', 'unpack-bundle.sh',
+                 'launch_scheduler.py', 'fleet_controller.py', 'command_fanout.py', 'launch_jobs.py',
+                 'log_scanner.py')
+
+BUNDLE_FORMAT = 'ex-bot-bundle'
+BUNDLE_VERSION = 1
+# 压缩方式 -> 部署包文件名；xz 压缩率更高，gz 兼容没有安装 xz 的服务器
+BUNDLE_CODECS = {'xz': 'bundle.tar.xz', 'gz': 'bundle.tar.gz'}
+DEFAULT_BUNDLE_CODEC = 'xz'
+
+
+def compose_files(config_folder):
+    """配置文件夹中需要部署的 compose 文件（按服务索引包含 --shard-compose 拆分出的文件）"""
+    names = [DEFAULT_COMPOSE_FILE]
+    index_path = os.path.join(config_folder, SERVICES_INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            next(f, None)  # 列名
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) > 1 and fields[1] and fields[1] not in names:
+                    names.append(fields[1])
+        names.append(SERVICES_INDEX_FILE)
+    return names
+
+
+def collect_local_files(config_folder, verify=False):
+    """
+    收集需要部署的本地文件，返回 {服务器相对路径: (本地路径, sha256)}
+    prepare.py 生成清单中大小一致的文件直接使用清单中的哈希，verify 时全部重新计算
+    """
+    manifest = OutputManifest.load(config_folder, os.path.join(config_folder, '.manifest.json'))
+    files = {}
+
+    def add(remote_rel, local_path, manifest_rel=None):
+        digest = None
+        entry = manifest.entries.get(manifest_rel) if manifest_rel and not verify else None
+        if entry and entry.get('size') == os.path.getsize(local_path):
+            digest = entry.get('sha256')
+        files[remote_rel] = (local_path, digest or file_sha256(local_path))
+
+    conf_dir = os.path.join(config_folder, 'conf')
+    for dirpath, dirnames, filenames in os.walk(conf_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            local_path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(local_path, config_folder).replace(os.sep, '/')
+            add(f"{REMOTE_DIR}/{rel}", local_path, rel)
+
+    for name in compose_files(config_folder):
+        add(f"{REMOTE_DIR}/{name}", os.path.join(config_folder, name), name)
+
+    for name in FLEET_SCRIPTS:
+        add(name, os.path.join(ROOT_DIR, name))
+    return files
+
+
+def deploy_manifest(local_files, dirs=()) -> dict:
+    """部署清单内容：{'version', 'files': {服务器相对路径: sha256}, 'dirs': [conf/ 下的目录]}"""
+    return {'version': DEPLOY_MANIFEST_VERSION,
+            'files': {rel: digest for rel, (_, digest) in local_files.items()},
+            'dirs': sorted(dirs)}
+
+
+# ========== 部署包 ==========
+
+def bundle_path(config_folder, codec=DEFAULT_BUNDLE_CODEC) -> str:
+    return os.path.join(config_folder, BUNDLE_CODECS[codec])
+
+
+def build_bundle_index(local_files) -> List[Tuple[str, str, str]]:
+    """部署包索引：按路径排序的 (sha256, 权限, 服务器相对路径)，可执行文件的权限为 755"""
+    index = []
+    for rel in sorted(local_files):
+        local_path, digest = local_files[rel]
+        mode = '755' if os.access(local_path, os.X_OK) else '644'
+        index.append((digest, mode, rel))
+    return index
+
+
+def collect_conf_dirs(config_folder) -> List[str]:
+    """conf/ 下的所有目录（服务器相对路径，已排序），空目录也需要在服务器上创建"""
+    dirs = []
+    conf_dir = os.path.join(config_folder, 'conf')
+    for dirpath, dirnames, _ in os.walk(conf_dir):
+        dirnames.sort()
+        rel = os.path.relpath(dirpath, config_folder).replace(os.sep, '/')
+        dirs.append(f"{REMOTE_DIR}/{rel}")
+    return dirs
+
+
+def render_bundle_index(index) -> bytes:
+    return ''.join(f"{digest}\t{mode}\t{rel}\n" for digest, mode, rel in index).encode('utf-8')
+
+
+def read_bundle_header(path: str) -> Optional[dict]:
+    """读取部署包的 bundle.json（第一个成员，不解压其余内容），不存在或格式不符时返回 None"""
+    try:
+        with tarfile.open(path, 'r:*') as tar:
+            member = tar.next()
+            if member is None or member.name != 'bundle.json':
+                return None
+            header = json.loads(tar.extractfile(member).read().decode('utf-8'))
+    except (OSError, tarfile.TarError, ValueError):
+        return None
+    return header if header.get('format') == BUNDLE_FORMAT else None
+
+
+def add_member(tar, name, data, mode=0o644, mtime=None):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = int(time.time()) if mtime is None else mtime
+    tar.addfile(info, io.BytesIO(data))
+
+
+def write_bundle(config_folder, codec=DEFAULT_BUNDLE_CODEC, verify=False, force=False) -> Optional[Dict]:
+    """
+    把配置文件夹需要部署的文件写成部署包（先写临时文件再替换）
+    索引与现有部署包相同时不重写（force 时总是重写），返回 None；否则返回统计信息：
+    {'path', 'files', 'objects', 'raw_bytes': 所有文件大小之和, 'object_bytes': 去重后大小, 'bytes': 部署包大小}
+    """
+    local_files = collect_local_files(config_folder, verify)
+    index = build_bundle_index(local_files)
+    index_data = render_bundle_index(index)
+    conf_dirs = collect_conf_dirs(config_folder)
+    dirs_data = ''.join(f"{rel}\n" for rel in conf_dirs).encode('utf-8')
+    index_sha256 = hashlib.sha256(index_data + dirs_data).hexdigest()
+
+    path = bundle_path(config_folder, codec)
+    if not force:
+        header = read_bundle_header(path)
+        if header and header.get('version') == BUNDLE_VERSION and header.get('index_sha256') == index_sha256:
+            return None
+
+    # 每个对象取第一个出现的本地文件，任一路径可执行时对象权限为 755
+    objects = {}
+    raw_bytes = 0
+    for digest, mode, rel in index:
+        local_path = local_files[rel][0]
+        raw_bytes += os.path.getsize(local_path)
+        if digest not in objects:
+            objects[digest] = (local_path, mode)
+        elif mode == '755':
+            objects[digest] = (objects[digest][0], mode)
+
+    header = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'folder': os.path.basename(os.path.abspath(config_folder)),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'files': len(index),
+        'objects': len(objects),
+        'index_sha256': index_sha256,  # index.tsv 和 dirs.txt 的哈希，相同时不重写部署包
+    }
+    checksums = ''.join(f"{digest}  objects/{digest}\n" for digest in sorted(objects)).encode('utf-8')
+    manifest_data = json.dumps(deploy_manifest(local_files, conf_dirs), indent=2, sort_keys=True).encode('utf-8')
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    object_bytes = 0
+    try:
+        with tarfile.open(temp_path, f'w:{codec}') as tar:
+            add_member(tar, 'bundle.json', json.dumps(header, indent=2, ensure_ascii=False).encode('utf-8'))
+            add_member(tar, 'index.tsv', index_data)
+            add_member(tar, 'dirs.txt', dirs_data)
+            add_member(tar, 'SHA256SUMS', checksums)
+            add_member(tar, 'deploy_manifest.json', manifest_data)
+            for digest in sorted(objects):
+                local_path, mode = objects[digest]
+                with open(local_path, 'rb') as f:
+                    data = f.read()
+                object_bytes += len(data)
+                add_member(tar, f"objects/{digest}", data, 0o755 if mode == '755' else 0o644,
+                           int(os.path.getmtime(local_path)))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # 切换压缩方式后删除另一种格式的旧部署包，避免上传过期的文件
+    for other_codec in BUNDLE_CODECS:
+        other_path = bundle_path(config_folder, other_codec)
+        if other_codec != codec and os.path.exists(other_path):
+            os.remove(other_path)
+
+    return {'path': path, 'files': len(index), 'objects': len(objects), 'raw_bytes': raw_bytes,
+            'object_bytes': object_bytes, 'bytes': os.path.getsize(path)}
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+向机器人并行发送命令并确认（在服务器上运行，只依赖标准库），供 bot-cmd.sh 和 bot-manager.sh cmd 调用
+- 先并行向所有目标机器人的 tmux 窗口发送命令，再一起轮询各窗口的输出，总耗时约等于最慢的机器人，而不是逐个累加
+- 发送前记录光标所在行（输入框）在窗口历史中的绝对位置（history_size 加光标行号），
+  发送后这个位置及之后出现与确认规则匹配的行即确认；读取窗口时包括最近 SCROLLBACK_LINES 行历史，
+  之前的回显滚出屏幕不影响确认。默认规则为 HummingBot 回显的命令行（如 ">>>  stop"），
+  --expect 可以指定命令执行后应出现的输出
+- 全屏的客户端（输入框固定在屏幕底部，输出出现在输入框上方）没有窗口历史，此时仍按匹配的行数增加确认
+- 光标所在行（客户端的输入框）不参与匹配，客户端卡住时输入框中未提交的命令不会被误认为已执行
+- 超时未确认或没有 tmux 窗口的机器人在结果表中分别标出；
+  --running-only 时不向容器未运行的机器人发送（避免命令进入普通 shell），在结果表中标为未运行
+
+用法：
+   python3 ~/command_fanout.py stop                     # 向 services.tsv 中所有机器人的窗口发送 stop
+   python3 ~/command_fanout.py stop --running-only      # 只发送给容器运行中的机器人
+   python3 ~/command_fanout.py stop --bots bot1 bot2    # 只发送给指定的机器人
+   python3 ~/command_fanout.py status --timeout 5       # 每个机器人最多等待 5 秒确认
+   python3 ~/command_fanout.py stop --expect 'stopped'  # 输出中出现 stopped 才算确认
+   python3 ~/command_fanout.py stop --json              # JSON 格式输出结果
+
+窗口的读取和发送通过 TmuxPanes 完成，可以用 FakePanes 模拟（见 benchmarks/bench_command.py）
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from fleet_controller import DockerAPIError, DockerClient
+from launch_scheduler import EX_BOT_DIR, SERVICES_INDEX_FILE, read_services_index
+
+# 读取窗口时包括的历史行数：命令执行后的输出超过这个行数时回显会移出读取范围
+SCROLLBACK_LINES = 1000
+
+# 结果状态 -> 结果表中的显示
+RESULT_LABELS = {
+    'ok': '✅ 已确认',
+    'timeout': '❌ 超时未确认',
+    'error': '❌ 发送失败',
+    'not_running': '⏭️  未运行',
+    'no_window': '⚠️  没有窗口',
+}
+
+
+class CommandResult:
+    """一个机器人的发送结果：status 为 RESULT_LABELS 中的状态，seconds 为发送到确认的时间，detail 为匹配的输出行或错误"""
+
+    __slots__ = ('name', 'status', 'seconds', 'detail')
+
+    def __init__(self, name: str, status: str, seconds: Optional[float] = None, detail: str = ''):
+        self.name = name
+        self.status = status
+        self.seconds = seconds
+        self.detail = detail
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 'ok'
+
+    def to_dict(self) -> dict:
+        seconds = round(self.seconds, 3) if self.seconds is not None else None
+        return {'name': self.name, 'status': self.status, 'seconds': seconds, 'detail': self.detail}
+
+
+def echo_pattern(command: str) -> Pattern:
+    """
+    HummingBot 在输出区域回显的命令行：">>>  <命令>"
+    不匹配单独一行的命令：终端回显的输入不能说明客户端执行了命令
+    """
+    return re.compile(r'>>>\s*' + re.escape(command.strip()) + r'\s*$')
+
+
+def visible_lines(lines: List[str], cursor_y: Optional[int]) -> List[str]:
+    """去掉光标所在行（输入框），其中可能是尚未提交的命令"""
+    if cursor_y is None or not 0 <= cursor_y < len(lines):
+        return lines
+    return lines[:cursor_y] + lines[cursor_y + 1:]
+
+
+def match_lines(lines: List[str], pattern: Pattern) -> List[str]:
+    return [line.strip() for line in lines if pattern.search(line)]
+
+
+def lines_from(lines: List[str], cursor_y: Optional[int], first_row: int, mark: int) -> List[str]:
+    """绝对位置在 mark 及之后的行（不包括光标所在行），first_row 为 lines[0] 的绝对位置"""
+    return [line for index, line in enumerate(lines)
+            if first_row + index >= mark and index != cursor_y]
+
+
+class TmuxPanes:
+    """机器人所在的 tmux 窗口：每个机器人一个与机器人同名的窗口（start-bot.sh / bot-manager.sh 创建）"""
+
+    def __init__(self, session: str, scrollback: int = SCROLLBACK_LINES):
+        self.session = session
+        self.scrollback = scrollback
+
+    def windows(self) -> List[str]:
+        result = subprocess.run(['tmux', 'list-windows', '-t', self.session, '-F', '#{window_name}'],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"tmux 会话 '{self.session}' 不存在")
+        return result.stdout.split()
+
+    def capture(self, name: str) -> Tuple[List[str], Optional[int], int]:
+        """
+        返回 (最近 scrollback 行历史和当前屏幕的行, 光标所在行在其中的下标, 第一行在窗口历史中的绝对位置)
+        不使用 -J：合并折行后行数与位置对不上
+        """
+        target = f"{self.session}:{name}"
+        info = subprocess.run(['tmux', 'display-message', '-p', '-t', target, '#{history_size} #{cursor_y}'],
+                              capture_output=True, text=True, check=True).stdout.split()
+        screen = subprocess.run(['tmux', 'capture-pane', '-p', '-t', target, '-S', f"-{self.scrollback}"],
+                                capture_output=True, text=True, check=True).stdout
+        history_size = int(info[0]) if info and info[0].isdigit() else 0
+        captured = min(self.scrollback, history_size)
+        cursor = captured + int(info[1]) if len(info) > 1 and info[1].isdigit() else None
+        # capture-pane 的输出以换行结尾
+        return screen.split('\n')[:-1], cursor, history_size - captured
+
+    def send(self, name: str, command: str):
+        # -l 按字面发送命令文本（不解析为按键名），再单独发送回车
+        target = f"{self.session}:{name}"
+        subprocess.run(['tmux', 'send-keys', '-t', target, '-l', command], check=True)
+        subprocess.run(['tmux', 'send-keys', '-t', target, 'Enter'], check=True)
+
+
+class CommandFanout:
+    """
+    向多个机器人发送同一个命令并确认
+    panes 需要提供 windows()、capture(name) -> (行, 光标下标, 第一行的绝对位置) 和 send(name, command)
+    """
+
+    def __init__(self, panes, parallel: int = 32, poll_seconds: float = 0.2, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.panes = panes
+        self.parallel = max(1, parallel)
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self.sleep = sleep
+
+    def _map(self, func, items):
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.parallel, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def run(self, names: List[str], command: str, timeout: float = 10.0, expect: Optional[Pattern] = None,
+            running=None) -> List[CommandResult]:
+        """
+        返回与 names 顺序相同的结果列表
+        running: 运行中的容器名集合，为 None 时不检查（无法访问 docker 时）
+        """
+        pattern = expect or echo_pattern(command)
+        windows = set(self.panes.windows())
+        results: Dict[str, CommandResult] = {}
+        targets = []
+        for name in names:
+            if name not in windows:
+                results[name] = CommandResult(name, 'no_window')
+            elif running is not None and name not in running:
+                results[name] = CommandResult(name, 'not_running')
+            else:
+                targets.append(name)
+
+        # 第一阶段：记录输入框的绝对位置和匹配的行数后发送
+        def dispatch(name):
+            try:
+                lines, cursor_y, first_row = self.panes.capture(name)
+                mark = first_row + (cursor_y if cursor_y is not None else len(lines))
+                baseline = len(match_lines(visible_lines(lines, cursor_y), pattern))
+                self.panes.send(name, command)
+                return name, (mark, baseline), self.clock(), None
+            except (OSError, subprocess.SubprocessError) as e:
+                return name, None, self.clock(), str(e)
+
+        pending = {}
+        for name, baseline, sent_at, error in self._map(dispatch, targets):
+            if error is not None:
+                results[name] = CommandResult(name, 'error', detail=error)
+            else:
+                pending[name] = (baseline, sent_at)
+
+        # 第二阶段：一起轮询所有未确认的窗口，直到都确认或超时
+        # 输入框位置之后出现匹配的行即确认；全屏客户端的输出在输入框上方，退而比较匹配的行数
+        def check(name):
+            try:
+                lines, cursor_y, first_row = self.panes.capture(name)
+            except (OSError, subprocess.SubprocessError) as e:
+                return name, None, str(e)
+            # 窗口历史达到 tmux 的 history-limit 后最早的行被丢弃，绝对位置整体前移，这时只能退而比较匹配的行数
+            mark, count = pending[name][0]
+            matched = match_lines(lines_from(lines, cursor_y, first_row, mark), pattern)
+            if not matched:
+                matched = match_lines(visible_lines(lines, cursor_y), pattern)[count:]
+            return name, matched, None
+
+        while pending:
+            for name, matched, error in self._map(check, list(pending)):
+                sent_at = pending[name][1]
+                if error is not None:
+                    results[name] = CommandResult(name, 'error', detail=error)
+                elif matched:
+                    results[name] = CommandResult(name, 'ok', self.clock() - sent_at, matched[-1])
+                elif self.clock() - sent_at >= timeout:
+                    results[name] = CommandResult(name, 'timeout', self.clock() - sent_at)
+                else:
+                    continue
+                del pending[name]
+            if pending:
+                self.sleep(self.poll_seconds)
+        return [results[name] for name in names]
+
+
+class FakePanes:
+    """
+    模拟运行 HummingBot 客户端的 tmux 窗口（用于测试）
+    delays: 机器人 -> 收到命令到回显的时间（秒）；hung 中的机器人卡住，命令一直停留在输入框（光标行）
+    height: 屏幕的行数，超出的行进入窗口历史；scrollback: capture 返回的历史行数（0 时只返回屏幕）
+    每个命令回显后再输出 reply_lines 行，之前的回显会滚出屏幕
+    """
+
+    def __init__(self, names: List[str], delays: Dict[str, float] = None, hung=(), clock=time.monotonic,
+                 height: int = 24, scrollback: int = SCROLLBACK_LINES, reply_lines: int = 1):
+        self.names = list(names)
+        self.delays = delays or {}
+        self.hung = set(hung)
+        self.clock = clock
+        self.height = height
+        self.scrollback = scrollback
+        self.reply_lines = reply_lines
+        self.history = {name: ['>>>  status', 'No strategy is currently running.'] for name in self.names}
+        self.typed = {name: [] for name in self.names}
+        self.sent = []
+
+    def windows(self) -> List[str]:
+        return list(self.names)
+
+    def capture(self, name: str) -> Tuple[List[str], Optional[int], int]:
+        now = self.clock()
+        output = list(self.history[name])
+        input_line = ''
+        for command, sent_at in self.typed[name]:
+            if name in self.hung:
+                input_line = f">>> {command}"
+            elif now - sent_at >= self.delays.get(name, 0.0):
+                output.append(f">>>  {command}")
+                output.extend(f"{command}: output line {index + 1}" for index in range(self.reply_lines))
+        # 最后一行是输入框，光标在输入框中；屏幕之前的行是窗口历史
+        rows = output + [input_line]
+        history_size = max(0, len(rows) - self.height)
+        first_row = history_size - min(self.scrollback, history_size)
+        return rows[first_row:], len(output) - first_row, first_row
+
+    def send(self, name: str, command: str):
+        self.sent.append((name, command))
+        self.typed[name].append((command, self.clock()))
+
+
+# ========== 命令行 ==========
+
+def print_results(results: List[CommandResult], command: str):
+    width = max(len(result.name) for result in results) if results else 0
+    print(f"向机器人发送命令: {command}")
+    print("=" * 60)
+    for result in results:
+        seconds = f"{result.seconds:.1f}s" if result.seconds is not None else '-'
+        print(f"{RESULT_LABELS[result.status]}  {result.name:<{width}}  {seconds:>6}  {result.detail}")
+    print("=" * 60)
+    sent = [result for result in results if result.status in ('ok', 'timeout', 'error')]
+    print(f"已确认 {sum(1 for result in results if result.ok)}/{len(sent)} 个，"
+          f"跳过 {len(results) - len(sent)} 个")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="向机器人的 tmux 窗口并行发送命令，并从窗口输出确认命令已执行")
+    parser.add_argument('command', help="要发送的命令，例如 stop / status")
+    parser.add_argument('--bots', nargs='+', default=None, help="只发送给这些机器人（默认 services.tsv 中的所有机器人）")
+    parser.add_argument('--services', default=os.path.join(EX_BOT_DIR, SERVICES_INDEX_FILE),
+                        help="服务索引文件（默认 ~/ex-bot/services.tsv）")
+    parser.add_argument('--session', default='bot', help="机器人所在的 tmux session（默认 bot）")
+    parser.add_argument('--timeout', type=float, default=10.0, help="每个机器人等待确认的最长时间（秒，默认 10）")
+    parser.add_argument('--parallel', type=int, default=32, help="同时读取或发送的窗口数（默认 32）")
+    parser.add_argument('--expect', default=None, help="确认规则（正则表达式），默认为回显的命令行")
+    parser.add_argument('--running-only', action='store_true',
+                        help="只发送给容器运行中的机器人（通过 Docker Engine API 查询，默认发送给所有有窗口的机器人）")
+    parser.add_argument('--json', action='store_true', help="以 JSON 格式输出结果")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.bots:
+        names = args.bots
+    elif os.path.exists(args.services):
+        names = [bot.name for bot in read_services_index(args.services)]
+    else:
+        print(f"错误: 找不到服务索引 {args.services}，请用 --bots 指定机器人")
+        sys.exit(2)
+
+    running = None
+    if args.running_only:
+        try:
+            running = {name.lstrip('/') for container in DockerClient().containers()
+                       if container.get('State') == 'running' for name in container.get('Names') or ()}
+        except DockerAPIError as e:
+            print(f"⚠️  无法查询容器状态，发送给所有有窗口的机器人: {e}", file=sys.stderr)
+
+    try:
+        expect = re.compile(args.expect) if args.expect else None
+    except re.error as e:
+        print(f"错误: --expect 不是有效的正则表达式: {e}")
+        sys.exit(2)
+
+    fanout = CommandFanout(TmuxPanes(args.session), parallel=args.parallel)
+    try:
+        results = fanout.run(names, args.command, args.timeout, expect, running)
+    except RuntimeError as e:
+        print(f"错误: {e}")
+        sys.exit(2)
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2, ensure_ascii=False))
+    else:
+        print_results(results, args.command)
+    sys.exit(0 if all(result.ok for result in results if result.status in ('ok', 'timeout', 'error')) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+docker-compose 服务模型
+先把 bots.csv 转换为服务列表，再统一渲染 compose 文件和服务索引：
+- 多个服务共用的代理环境变量和挂载目录通过 YAML 锚点只写一次
+- 可以按 bots.csv 的 group 列把服务拆分到多个 compose 文件，宿主机上 docker compose 只需要解析机器人所在的文件
+- 服务索引 services.tsv（名称、compose文件、分组、代理和 API key 的标识）供宿主机脚本读取，不再用正则解析 YAML
+"""
+
+import hashlib
+import json
+import re
+from typing import Dict, List
+
+DEFAULT_COMPOSE_FILE = 'docker-compose.override.yml'
+SERVICES_INDEX_FILE = 'services.tsv'
+# proxy_id / key_id 是代理和 API key 的短哈希（不写入原值），launch_scheduler.py 据此错开共用代理或 key 的机器人
+SERVICES_INDEX_COLUMNS = ('name', 'compose_file', 'group', 'proxy_id', 'key_id')
+
+# 分组名会成为文件名的一部分
+GROUP_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+
+COMPOSE_HEADER = """# 自动生成的文件，请勿手动编辑
+x-hb: &default
+  image: backpack:latest
+  build:
+    context: .
+    dockerfile: Dockerfile
+  logging:
+    driver: json-file
+    options:
+      max-size: 10m
+      max-file: "5"
+  tty: true
+  stdin_open: true
+  network_mode: host
+"""
+
+# 所有机器人共用的挂载目录（锚点名: 挂载）
+SHARED_VOLUMES = {
+    'certs': './certs:/home/hummingbot/certs',
+    'scripts': './scripts:/home/hummingbot/scripts',
+    'controllers': './controllers:/home/hummingbot/controllers',
+}
+
+
+class ComposeService:
+    """一个机器人对应的 compose 服务"""
+
+    __slots__ = ('name', 'group', 'proxy', 'api_key', 'environment', 'volumes')
+
+    def __init__(self, name: str, group: str = '', proxy: str = '', environment: Dict[str, str] = None,
+                 api_key: str = ''):
+        self.name = name
+        self.group = group
+        self.proxy = proxy
+        self.api_key = api_key
+        # 代理以外的环境变量（代理变量由锚点或 proxy_environment 提供）
+        self.environment = environment or {}
+        # 机器人自己的挂载目录，共用目录见 SHARED_VOLUMES
+        self.volumes = (
+            f'./conf/{name}:/home/hummingbot/conf',
+            f'./logs/{name}:/home/hummingbot/logs',
+            f'./data/{name}:/home/hummingbot/data',
+        )
+
+
+def short_id(value: str) -> str:
+    """服务索引中代替代理地址和 API key 的标识，值为空时为空"""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:12] if value else ''
+
+
+def proxy_environment(proxy: str) -> Dict[str, str]:
+    return {'HTTPS_PROXY': proxy, 'HTTP_PROXY': proxy} if proxy else {}
+
+
+def build_services(bots) -> List[ComposeService]:
+    """把 bots.csv 的行转换为服务列表（顺序与 bots.csv 一致，没有名称的行跳过）"""
+    services = []
+    for bot in bots:
+        if not bot.name:
+            continue
+        environment = {}
+        if bot.password:
+            environment['CONFIG_PASSWORD'] = bot.password
+        if bot.config_file_name:
+            environment['CONFIG_FILE_NAME'] = bot.config_file_name
+        if bot.script_config:
+            environment['SCRIPT_CONFIG'] = bot.script_config
+        services.append(ComposeService(bot.name, bot.group, bot.proxy, environment, bot.api_key))
+    return services
+
+
+def shard_file_name(group: str) -> str:
+    """分组对应的 compose 文件名，没有分组的服务留在 docker-compose.override.yml"""
+    return f"docker-compose.{group}.yml" if group else DEFAULT_COMPOSE_FILE
+
+
+def is_shard_file_name(name: str) -> bool:
+    return name != DEFAULT_COMPOSE_FILE and name.startswith('docker-compose.') and name.endswith('.yml')
+
+
+def split_services(services: List[ComposeService], shard: bool = False) -> Dict[str, List[ComposeService]]:
+    """
+    按 compose 文件拆分服务，shard 为 False 时全部放在 docker-compose.override.yml
+    Raises:
+        ValueError: 分组名不能用作文件名
+    """
+    files = {DEFAULT_COMPOSE_FILE: []}
+    for service in services:
+        if shard and service.group and not GROUP_NAME_PATTERN.match(service.group):
+            raise ValueError(f"机器人 {service.name} 的分组名 '{service.group}' 只能包含字母、数字、下划线和连字符")
+        files.setdefault(shard_file_name(service.group) if shard else DEFAULT_COMPOSE_FILE, []).append(service)
+    return files
+
+
+def quote(value: str) -> str:
+    """环境变量值统一加双引号，避免 YAML 把 0123、true、1e5 之类的值解析为其他类型"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def render_compose(services: List[ComposeService]) -> str:
+    """
+    渲染一个 compose 文件，至少两个服务共用的代理写成锚点
+    共用挂载目录在 x-hb 中定义一次：YAML 合并键会用服务自己的 volumes 整个替换锚点中的列表，
+    所以服务的 volumes 中只引用共用目录的锚点，不重复写挂载路径
+    """
+    proxy_counts = {}
+    for service in services:
+        if service.proxy:
+            proxy_counts[service.proxy] = proxy_counts.get(service.proxy, 0) + 1
+    anchors = {}
+    for proxy, count in proxy_counts.items():
+        if count > 1:
+            anchors[proxy] = f"proxy-{len(anchors) + 1}"
+
+    lines = [COMPOSE_HEADER.rstrip('\n'), '  volumes:']
+    lines.extend(f"    - &{anchor} {volume}" for anchor, volume in SHARED_VOLUMES.items())
+    lines.append('')
+    for proxy, anchor in anchors.items():
+        lines.append(f"x-{anchor}: &{anchor}")
+        lines.extend(f"  {key}: {quote(value)}" for key, value in proxy_environment(proxy).items())
+        lines.append('')
+
+    # 所有服务都拆分到分组文件时 docker-compose.override.yml 中没有服务
+    lines.append('services:' if services else 'services: {}')
+    for service in services:
+        lines.append(f"  {service.name}:")
+        lines.append("    <<: *default")
+        lines.append(f"    container_name: {service.name}")
+
+        environment = [f"      {key}: {quote(value)}" for key, value in service.environment.items()]
+        if service.proxy in anchors:
+            environment.insert(0, f"      <<: *{anchors[service.proxy]}")
+        elif service.proxy:
+            environment[:0] = [f"      {key}: {quote(value)}"
+                               for key, value in proxy_environment(service.proxy).items()]
+        if environment:
+            lines.append("    environment:")
+            lines.extend(environment)
+
+        lines.append("    volumes:")
+        lines.extend(f"      - {volume}" for volume in service.volumes)
+        lines.extend(f"      - *{anchor}" for anchor in SHARED_VOLUMES)
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def render_services_index(services: List[ComposeService], files: Dict[str, List[ComposeService]]) -> str:
+    """渲染服务索引：制表符分隔，第一行为列名，服务顺序与 bots.csv 一致"""
+    compose_files = {service.name: compose_file for compose_file, members in files.items() for service in members}
+    lines = ['\t'.join(SERVICES_INDEX_COLUMNS)]
+    lines.extend(f"{service.name}\t{compose_files[service.name]}\t{service.group}"
+                 f"\t{short_id(service.proxy)}\t{short_id(service.api_key)}" for service in services)
+    return '\n'.join(lines) + '\n'
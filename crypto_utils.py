@@ -5,15 +5,18 @@ HummingBot标准兼容加密模块
 """
 
 import binascii
+import hmac
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 
 # 使用HummingBot标准的eth_keyfile依赖
 from eth_keyfile.keyfile import (
     DKLEN,
     _pbkdf2_hash,
     encrypt_aes_ctr,
+    decrypt_aes_ctr,
+    decode_hex,
     get_default_work_factor_for_kdf,
     encode_hex_no_prefix,
     keccak,
@@ -38,6 +41,8 @@ class HummingBotCryptoManager:
         """
         self._password = password
         self.password_bytes = password.encode('utf-8')
+        # 已派生密钥的缓存：(salt十六进制, 迭代次数) -> derived_key
+        self._derived_keys: Dict[Tuple[str, int], bytes] = {}
 
     def encrypt_secret_value(self, attr: str, value: str) -> str:
         """
@@ -92,18 +97,27 @@ class HummingBotCryptoManager:
                 iterations=work_factor,
                 dklen=DKLEN,
             )
-            kdfparams = {
-                'c': work_factor,
-                'dklen': DKLEN,
-                'prf': 'hmac-sha256',
-                'salt': encode_hex_no_prefix(salt),
-            }
         elif kdf == 'scrypt':
             # 如果需要scrypt支持，可以添加
             raise NotImplementedError("Scrypt KDF not implemented in this version")
         else:
             raise NotImplementedError("KDF not implemented: {0}".format(kdf))
 
+        return self._build_v3_keyfile_json(message_to_encrypt, derived_key, salt, work_factor, kdf)
+
+    def _build_v3_keyfile_json(self, message_to_encrypt: bytes, derived_key: bytes, salt: bytes,
+                               work_factor: int, kdf="pbkdf2") -> Dict[str, Any]:
+        """
+        使用已派生的密钥构建ETH keyfile v3格式的加密JSON
+        每次调用都会生成新的IV，并单独计算MAC
+        """
+        kdfparams = {
+            'c': work_factor,
+            'dklen': DKLEN,
+            'prf': 'hmac-sha256',
+            'salt': encode_hex_no_prefix(salt),
+        }
+
         # 使用HummingBot标准的IV生成和AES加密
         iv = big_endian_to_int(Random.get_random_bytes(16))
         encrypt_key = derived_key[:16]
@@ -127,6 +141,84 @@ class HummingBotCryptoManager:
             'alias': '',  # HummingBot标准要求包含alias字段
         }
 
+    def _derive_pbkdf2_key(self, salt_hex: str, iterations: int) -> bytes:
+        """
+        按 (salt, 迭代次数) 派生PBKDF2密钥，结果在实例内缓存
+        """
+        cache_key = (salt_hex, iterations)
+        derived_key = self._derived_keys.get(cache_key)
+        if derived_key is None:
+            derived_key = _pbkdf2_hash(
+                self.password_bytes,
+                hash_name='sha256',
+                salt=decode_hex(salt_hex),
+                iterations=iterations,
+                dklen=DKLEN,
+            )
+            self._derived_keys[cache_key] = derived_key
+        return derived_key
+
+    def encrypt_many(self, values: List[str], work_factor=None) -> List[str]:
+        """
+        批量加密同一密码下的多个值，只派生一次PBKDF2密钥
+        所有结果共享salt，但各自使用独立的IV和MAC，仍是标准v3 keyfile格式
+        Args:
+            values: 要加密的字符串列表
+            work_factor: PBKDF2迭代次数（默认使用eth_keyfile默认值）
+        Returns:
+            十六进制编码的加密字符串列表（与输入顺序一致）
+        """
+        if self._password is None:
+            raise ValueError("Could not encrypt secret values because no password was provided.")
+
+        if work_factor is None:
+            work_factor = get_default_work_factor_for_kdf('pbkdf2')
+
+        salt = Random.get_random_bytes(16)
+        derived_key = self._derive_pbkdf2_key(encode_hex_no_prefix(salt), work_factor)
+
+        encrypted_values = []
+        for value in values:
+            keyfile_json = self._build_v3_keyfile_json(value.encode(), derived_key, salt, work_factor)
+            json_str = json.dumps(keyfile_json)
+            encrypted_values.append(binascii.hexlify(json_str.encode()).decode())
+        return encrypted_values
+
+    def decrypt_many(self, encrypted_hexes: List[str]) -> List[str]:
+        """
+        批量解密十六进制编码的v3 keyfile，相同 (salt, 迭代次数) 只派生一次密钥
+        非 pbkdf2/hmac-sha256 格式的值回退到 Account.decrypt
+        Args:
+            encrypted_hexes: 十六进制编码的加密字符串列表
+        Returns:
+            解密后的原始字符串列表（与输入顺序一致）
+        """
+        if self._password is None:
+            raise ValueError("Could not decrypt secret values because no password was provided.")
+
+        decrypted_values = []
+        for encrypted_hex in encrypted_hexes:
+            json_str = binascii.unhexlify(encrypted_hex).decode()
+            crypto = json.loads(json_str)['crypto']
+            kdfparams = crypto.get('kdfparams', {})
+
+            if (crypto.get('kdf') != 'pbkdf2' or kdfparams.get('prf') != 'hmac-sha256'
+                    or kdfparams.get('dklen') != DKLEN):
+                decrypted_values.append(Account.decrypt(json_str, self._password).decode())
+                continue
+
+            derived_key = self._derive_pbkdf2_key(kdfparams['salt'], kdfparams['c'])
+
+            # 校验MAC（与eth_keyfile一致）
+            ciphertext = decode_hex(crypto['ciphertext'])
+            mac = keccak(derived_key[16:32] + ciphertext)
+            if not hmac.compare_digest(mac, decode_hex(crypto['mac'])):
+                raise ValueError("MAC mismatch")
+
+            iv = big_endian_to_int(decode_hex(crypto['cipherparams']['iv']))
+            decrypted_values.append(decrypt_aes_ctr(ciphertext, derived_key[:16], iv).decode())
+        return decrypted_values
+
     def encrypt(self, value: str) -> str:
         """
         加密字符串值的便捷方法
@@ -163,7 +255,7 @@ class HummingBotCryptoManager:
             密码是否正确
         """
         try:
-            decrypted_word = self.decrypt(encrypted_verification)
+            decrypted_word = self.decrypt_many([encrypted_verification])[0]
             return decrypted_word == "HummingBot"
         except ValueError as e:
             if str(e) != "MAC mismatch":
@@ -245,4 +337,11 @@ if __name__ == "__main__":
     print(f"原始值: {test_value}")
     print(f"加密结果: {encrypted[:50]}...")
     print(f"解密结果: {decrypted}")
-    print(f"测试结果: {'✅ 通过' if decrypted == test_value else '❌ 失败'}")
\ No newline at end of file
+    print(f"测试结果: {'✅ 通过' if decrypted == test_value else '❌ 失败'}")
+
+    # 测试批量加密解密（每个密码只派生一次密钥）
+    values = ["HummingBot", "api_key", "secret_key"]
+    encrypted_values = manager.encrypt_many(values)
+    decrypted_values = [manager.decrypt(value) for value in encrypted_values]
+    batch_ok = decrypted_values == values and manager.decrypt_many(encrypted_values) == values
+    print(f"批量加密测试: {'✅ 通过' if batch_ok else '❌ 失败'}")
\ No newline at end of file
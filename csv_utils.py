@@ -0,0 +1,153 @@
+"""
+CSV 读取模块
+逐行流式读取 bots.csv / strategy.csv / strategies-v1.csv，在同一遍中完成空行过滤、必要字段校验和字段规范化，
+每行保存为紧凑的 __slots__ 记录：原始值按列序号存放在元组中（列名索引由同一文件的所有行共享），
+常用字段（名称、版本、市场基础币种、行键等）只计算一次
+"""
+
+import csv
+import hashlib
+import json
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+class CsvValidationError(ValueError):
+    """CSV 文件为空或缺少必要字段"""
+
+
+def split_bot_list(value: str) -> List[str]:
+    """解析策略行 bots 列中的机器人名称（分号、竖线、逗号或空白分隔）"""
+    for separator in (';', '|', ','):
+        value = value.replace(separator, ' ')
+    return value.split()
+
+
+class CsvRecord:
+    """
+    CSV 行记录
+    支持 get() / [] / in 访问原始值，可以直接作为模板变量传给 CompiledTemplate.render
+    """
+
+    __slots__ = ('columns', 'cells', 'line', '_hash')
+
+    def __init__(self, columns: Dict[str, int], cells: Tuple[str, ...], line: int):
+        self.columns = columns
+        self.cells = cells
+        self.line = line
+        self._hash = None
+
+    def get(self, field: str, default=None):
+        index = self.columns.get(field)
+        return default if index is None else self.cells[index]
+
+    def __getitem__(self, field: str) -> str:
+        return self.cells[self.columns[field]]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.columns
+
+    def as_dict(self) -> Dict[str, str]:
+        """转换为与 csv.DictReader 相同的字典"""
+        return {field: self.cells[index] for field, index in self.columns.items()}
+
+    def with_values(self, **extra) -> Dict[str, str]:
+        """返回追加了额外变量的字典（例如 scripts 模板需要的 strategy_file_path）"""
+        values = self.as_dict()
+        values.update(extra)
+        return values
+
+    @property
+    def hash(self) -> str:
+        """整行内容的哈希值（用于增量生成），只计算一次"""
+        if self._hash is None:
+            data = json.dumps(self.as_dict(), sort_keys=True, ensure_ascii=False)
+            self._hash = hashlib.sha256(data.encode('utf-8')).hexdigest()
+        return self._hash
+
+
+class BotRecord(CsvRecord):
+    """bots.csv 的一行，常用字段已去除首尾空白"""
+
+    __slots__ = ('name', 'config_file_name', 'script_config', 'proxy', 'connector',
+                 'api_key', 'secret_key', 'password', 'group')
+
+    def __init__(self, columns, cells, line):
+        super().__init__(columns, cells, line)
+        for field in BotRecord.__slots__:
+            setattr(self, field, (self.get(field) or '').strip())
+
+    @property
+    def key(self) -> str:
+        return self.name
+
+    @property
+    def has_credentials(self) -> bool:
+        """是否需要生成connector凭证（与 generate_connector_configs 的跳过条件一致）"""
+        return bool(self.name and self.connector and self.password and (self.api_key or self.secret_key))
+
+
+class StrategyRecord(CsvRecord):
+    """
+    strategy.csv / strategies-v1.csv 的一行
+    base: 市场的基础币种（APT-USDC -> APT），key: 行键 version|market
+    """
+
+    __slots__ = ('version', 'market', 'base', 'key', 'bots')
+
+    def __init__(self, columns, cells, line):
+        super().__init__(columns, cells, line)
+        self.version = (self.get('version') or '').strip()
+        self.market = (self.get('market') or '').strip()
+        self.base = self.market.split('-')[0]
+        self.key = f"{self.version}|{self.market}" if self.version and self.market else ''
+        self.bots = tuple(split_bot_list(self.get('bots') or ''))
+
+    def fname(self, prefix: str) -> str:
+        """生成的策略文件名，例如 conf_v2_ads_1_apt.yml"""
+        return f"conf_{prefix}_{self.version}_{self.base.lower()}.yml"
+
+
+def iter_csv_records(csv_file: str, record_class, required_fields: Sequence[str] = ()) -> Iterator[CsvRecord]:
+    """
+    流式读取CSV文件，逐行跳过空行、校验必要字段并生成记录
+    Raises:
+        CsvValidationError: 必要字段为空
+    """
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        # 同名列保留最后一列，与 csv.DictReader 一致
+        columns = {field: index for index, field in enumerate(header)}
+        width = len(header)
+        required = [(field, columns.get(field)) for field in required_fields]
+
+        for cells in reader:
+            # 与 csv.DictReader 相同：完全空白的行跳过，只有分隔符的行按空行过滤
+            if not any(cells):
+                continue
+            if len(cells) < width:
+                cells = cells + [''] * (width - len(cells))
+            elif len(cells) > width:
+                cells = cells[:width]
+
+            for field, index in required:
+                if index is None or not cells[index].strip():
+                    raise CsvValidationError(f"{csv_file} 第{reader.line_num}行的'{field}'字段不能为空")
+
+            yield record_class(columns, tuple(cells), reader.line_num)
+
+
+def read_csv_records(csv_file: str, record_class, required_fields: Sequence[str] = (),
+                     allow_empty: bool = False) -> List[CsvRecord]:
+    """
+    读取CSV文件的所有记录
+    Raises:
+        CsvValidationError: 文件为空（且不允许为空）或必要字段为空
+    """
+    records = list(iter_csv_records(csv_file, record_class, required_fields))
+    if not records and not allow_empty:
+        raise CsvValidationError(f"{csv_file} 文件为空")
+    return records
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+增量部署工具
+比较本地生成的配置与服务器上的部署清单（路径 -> sha256），只把变化和删除的文件打包成一个 tar.gz 流，
+通过同一个 SSH 连接发送到服务器，先完整解包到暂存目录再逐个文件替换到目标位置；
+conf/ 下的目录（包括 prepare.py 创建的空目录）也记录在清单中，在服务器上创建
+
+用法：
+   python deploy.py ads_31                  # 部署到 ~/.ssh/config 中同名的主机
+   python deploy.py ads_31 --host ads-31    # 指定主机名
+   python deploy.py ads_31 --dry-run        # 只列出会上传和删除的文件
+   python deploy.py ads_31 --full           # 忽略服务器上的部署清单，上传全部文件
+   python deploy.py ads_31 --local /tmp/h   # 部署到本地目录（相当于服务器的 home 目录，用于测试）
+
+批量部署（多个配置文件夹或通配符，每个文件夹部署到同名主机）：
+   python deploy.py 'ads_*'                       # 并行部署所有 ads_* 文件夹
+   python deploy.py ads_31 ads_32 --parallel 8    # 最多同时部署 8 台主机
+   python deploy.py 'ads_*' --timeout 120 --retries 2  # 每次尝试最长 120 秒，失败的主机单独重试 2 次
+   python deploy.py 'ads_*' --local /tmp/fleet    # 每台主机部署到 /tmp/fleet/<主机名>（用于测试）
+
+服务器上的文件位置与 deploy.sh 相同：
+   ~/ex-bot/conf/、~/ex-bot/docker-compose*.yml、~/ex-bot/services.tsv、~/*.sh
+部署清单保存在 ~/ex-bot/.deploy_manifest.json
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
+
+from bundle_utils import (DEPLOY_MANIFEST_VERSION, REMOTE_MANIFEST, collect_conf_dirs, collect_local_files,
+                          deploy_manifest)
+from compose_utils import DEFAULT_COMPOSE_FILE
+from transport_utils import LocalTransport, SSHTransport, TransportError
+
+
+def parse_remote_manifest(data):
+    """
+    解析服务器上的部署清单，返回 (文件 -> sha256, 目录列表)
+    不存在或无法解析时返回空清单（相当于全量部署），旧清单没有记录目录时目录列表为空
+    """
+    if not data:
+        return {}, []
+    try:
+        manifest = json.loads(data.decode('utf-8'))
+    except ValueError:
+        return {}, []
+    if manifest.get('version') != DEPLOY_MANIFEST_VERSION:
+        return {}, []
+    return manifest.get('files', {}), manifest.get('dirs', [])
+
+
+def is_safe_path(rel):
+    """只接受部署根目录下的相对路径"""
+    parts = rel.split('/')
+    return bool(rel) and not rel.startswith('/') and '..' not in parts and '' not in parts
+
+
+def diff_manifests(local, remote):
+    """返回 (需要上传的路径, 需要删除的路径)，只删除清单中记录过的文件"""
+    changed = sorted(rel for rel, digest in local.items() if remote.get(rel) != digest)
+    deleted = sorted(rel for rel in set(remote) - set(local) if is_safe_path(rel))
+    return changed, deleted
+
+
+def removed_dirs(local_dirs, remote_dirs):
+    """清单中记录过、本地已不存在的目录，从最深的开始"""
+    return sorted((rel for rel in set(remote_dirs) - set(local_dirs) if is_safe_path(rel)), reverse=True)
+
+
+def add_bytes(tar, name, data, mode=0o644):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def build_payload(local_files, changed, deleted, manifest, deleted_dirs=()):
+    """
+    打包部署内容：files/<路径>（内容相同的文件只保存一次，其余写成包内的硬链接）、
+    linked（写成硬链接的路径，服务器上复制为独立文件）、deleted（每行一个路径）、
+    dirs（清单中的所有目录，包括空目录）、deleted_dirs（不再需要的目录）、manifest.json
+    """
+    buffer = io.BytesIO()
+    first_members = {}
+    linked = []
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for rel in changed:
+            path, digest = local_files[rel]
+            arcname = f"files/{rel}"
+            if digest in first_members:
+                info = tar.gettarinfo(path, arcname)
+                info.type = tarfile.LNKTYPE
+                info.linkname = first_members[digest]
+                info.size = 0
+                tar.addfile(info)
+                linked.append(rel)
+            else:
+                tar.add(path, arcname=arcname, recursive=False)
+                first_members[digest] = arcname
+        add_bytes(tar, 'linked', ''.join(f"{rel}\n" for rel in linked).encode('utf-8'))
+        add_bytes(tar, 'deleted', ''.join(f"{rel}\n" for rel in deleted).encode('utf-8'))
+        add_bytes(tar, 'dirs', ''.join(f"{rel}\n" for rel in manifest['dirs']).encode('utf-8'))
+        add_bytes(tar, 'deleted_dirs', ''.join(f"{rel}\n" for rel in deleted_dirs).encode('utf-8'))
+        add_bytes(tar, 'manifest.json', json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return buffer.getvalue()
+
+
+def deploy_folder(config_folder, transport, full=False, verify=False, dry_run=False, log=print):
+    """
+    把一个配置文件夹增量部署到 transport 对应的机器，log 用于输出进度（批量部署时带主机名前缀）
+    返回 {'changed': 上传的文件数, 'deleted': 删除的文件数, 'bytes': 发送的字节数}
+    Raises:
+        TransportError: 连接或远端命令失败
+    """
+    local_files = collect_local_files(config_folder, verify)
+    local = {rel: digest for rel, (_, digest) in local_files.items()}
+    local_dirs = collect_conf_dirs(config_folder)
+
+    remote, remote_dirs = ({}, []) if full else parse_remote_manifest(transport.read_file(REMOTE_MANIFEST))
+    changed, deleted = diff_manifests(local, remote)
+    deleted_dirs = removed_dirs(local_dirs, remote_dirs)
+    log(f"本地 {len(local)} 个文件，服务器清单 {len(remote)} 个：上传 {len(changed)} 个，删除 {len(deleted)} 个")
+
+    if dry_run:
+        for rel in changed:
+            log(f"上传: {rel}")
+        for rel in deleted:
+            log(f"删除: {rel}")
+        for rel in sorted(set(local_dirs) - set(remote_dirs)):
+            log(f"创建目录: {rel}")
+        for rel in deleted_dirs:
+            log(f"删除目录: {rel}")
+        return {'changed': len(changed), 'deleted': len(deleted), 'bytes': 0}
+
+    if not changed and not deleted and remote and sorted(remote_dirs) == local_dirs:
+        log("服务器上的文件已是最新，无需部署")
+        return {'changed': 0, 'deleted': 0, 'bytes': 0}
+
+    manifest = deploy_manifest(local_files, local_dirs)
+    payload = build_payload(local_files, changed, deleted, manifest, deleted_dirs)
+    transport.apply(payload, REMOTE_MANIFEST)
+    return {'changed': len(changed), 'deleted': len(deleted), 'bytes': len(payload)}
+
+
+def check_config_folder(config_folder):
+    """与 deploy.sh 相同的本地检查，返回错误信息或 None"""
+    if not os.path.isdir(config_folder):
+        return f"配置文件夹不存在: {config_folder}"
+    for name in ('conf', DEFAULT_COMPOSE_FILE):
+        if not os.path.exists(os.path.join(config_folder, name)):
+            return f"{name} 不存在: {os.path.join(config_folder, name)}，请先运行: python prepare.py {config_folder}"
+    return None
+
+
+def folder_host(config_folder):
+    """配置文件夹对应的 SSH 主机名（与文件夹名相同）"""
+    return os.path.basename(os.path.normpath(config_folder))
+
+
+def transport_factory(args, fleet=False):
+    """按命令行参数返回 创建传输对象的函数(配置文件夹)；批量部署时 --local 目录下每台主机一个子目录"""
+    def create(config_folder):
+        host = args.host or folder_host(config_folder)
+        if args.local:
+            return LocalTransport(os.path.join(args.local, host) if fleet else args.local, args.timeout)
+        return SSHTransport(host, timeout=args.timeout)
+    return create
+
+
+# ========== 批量部署 ==========
+
+def expand_config_folders(patterns):
+    """展开配置文件夹参数中的通配符（只保留目录），保持参数顺序并去重"""
+    folders = []
+    for pattern in patterns:
+        matches = sorted(path for path in glob.glob(pattern) if os.path.isdir(path)) \
+            if glob.has_magic(pattern) else [pattern]
+        for folder in matches:
+            if folder not in folders:
+                folders.append(folder)
+    return folders
+
+
+def deploy_host(config_folder, create_transport, args, log=print):
+    """
+    部署一个配置文件夹，失败时按 --retries 重试（每次尝试使用新的连接），不影响其他主机
+    返回结果字典：folder, host, ok, attempts, changed, deleted, bytes（所有尝试发送的字节数）, seconds, error
+    """
+    result = {'folder': config_folder, 'host': args.host or folder_host(config_folder), 'ok': False,
+              'attempts': 0, 'changed': 0, 'deleted': 0, 'bytes': 0, 'seconds': 0.0, 'error': None}
+    started = time.perf_counter()
+
+    error = check_config_folder(config_folder)
+    if error:
+        result['error'] = error
+        return result
+
+    for attempt in range(1, args.retries + 2):
+        result['attempts'] = attempt
+        transport = create_transport(config_folder)
+        try:
+            outcome = deploy_folder(config_folder, transport, args.full, args.verify, args.dry_run, log)
+            result.update(changed=outcome['changed'], deleted=outcome['deleted'], ok=True, error=None)
+            break
+        except TransportError as e:
+            result['error'] = str(e)
+            log(f"第 {attempt} 次部署失败: {e}")
+        finally:
+            result['bytes'] += transport.bytes_sent
+            transport.close()
+
+        if attempt <= args.retries:
+            time.sleep(args.retry_delay * attempt)
+
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def print_fleet_table(results):
+    """按参数顺序输出每台主机的部署结果"""
+    print("=" * 50)
+    print(f"{'主机':<16} {'状态':<6}{'尝试':>6}{'上传':>8}{'删除':>8}{'发送':>10}{'耗时(s)':>10}")
+    for result in results:
+        status = "成功" if result['ok'] else "失败"
+        print(f"{result['host']:<16} {status:<6}{result['attempts']:>6}{result['changed']:>8}{result['deleted']:>8}"
+              f"{format_bytes(result['bytes']):>10}{result['seconds']:>10.2f}"
+              + (f"  {result['error']}" if result['error'] and not result['ok'] else ""))
+
+
+def run_fleet(config_folders, args, create_transport=None):
+    """并行部署多个配置文件夹，同时部署的主机数不超过 --parallel，返回各主机的结果列表"""
+    create_transport = create_transport or transport_factory(args, fleet=True)
+    parallel = max(1, min(args.parallel, len(config_folders)))
+    print(f"批量部署 {len(config_folders)} 台主机（并行 {parallel} 台）")
+
+    print_lock = threading.Lock()
+
+    def worker(folder):
+        host = args.host or folder_host(folder)
+
+        def log(message):
+            with print_lock:
+                print(f"[{host}] {message}", flush=True)
+
+        return deploy_host(folder, create_transport, args, log)
+
+    # 部署主要在等待 ssh 子进程，使用线程即可
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = list(executor.map(worker, config_folders))
+
+    print_fleet_table(results)
+    failed = [result for result in results if not result['ok']]
+    print(f"完成 {len(results) - len(failed)}/{len(results)} 台主机，"
+          f"共发送 {format_bytes(sum(result['bytes'] for result in results))}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="增量部署生成的配置到服务器")
+    parser.add_argument('config_folders', nargs='+', metavar='config_folder',
+                        help="配置文件夹名或通配符（默认部署到 ~/.ssh/config 中同名的主机），多个时批量部署")
+    parser.add_argument('--host', help="SSH 主机名（默认与配置文件夹名相同，只能用于单个文件夹）")
+    parser.add_argument('--local', metavar='DIR',
+                        help="部署到本地目录（相当于服务器的 home 目录，批量部署时每台主机一个子目录，用于测试）")
+    parser.add_argument('--full', action='store_true', help="忽略服务器上的部署清单，上传全部文件")
+    parser.add_argument('--verify', action='store_true', help="重新计算所有本地文件的哈希，不使用生成清单")
+    parser.add_argument('--dry-run', action='store_true', help="只列出会上传和删除的文件")
+
+    fleet = parser.add_argument_group('批量部署')
+    fleet.add_argument('--parallel', type=int, default=4, help="同时部署的主机数（默认 4）")
+    fleet.add_argument('--timeout', type=float, default=None, help="每台主机每次尝试的超时时间（秒，默认不限制）")
+    fleet.add_argument('--retries', type=int, default=1, help="失败主机的重试次数（默认 1）")
+    fleet.add_argument('--retry-delay', type=float, default=5.0, help="重试前的等待时间（秒，按尝试次数递增，默认 5）")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    config_folders = expand_config_folders(args.config_folders)
+    if not config_folders:
+        print(f"错误: 没有匹配的配置文件夹: {' '.join(args.config_folders)}")
+        sys.exit(1)
+
+    fleet = len(config_folders) > 1 or any(glob.has_magic(pattern) for pattern in args.config_folders)
+    if fleet:
+        if args.host:
+            print("错误: --host 只能用于单个配置文件夹")
+            sys.exit(1)
+        results = run_fleet(config_folders, args)
+        sys.exit(0 if all(result['ok'] for result in results) else 1)
+
+    config_folder = config_folders[0]
+    error = check_config_folder(config_folder)
+    if error:
+        print(f"错误: {error}")
+        sys.exit(1)
+
+    transport = transport_factory(args)(config_folder)
+    target = args.local or transport.host
+    print(f"部署配置: {config_folder} -> {target}")
+    started = time.perf_counter()
+    try:
+        result = deploy_folder(config_folder, transport, args.full, args.verify, args.dry_run)
+    except TransportError as e:
+        print(f"错误: 部署失败: {e}")
+        sys.exit(1)
+    finally:
+        transport.close()
+
+    if args.dry_run:
+        print("演练完成，未发送任何文件")
+        return
+    print(f"部署完成：上传 {result['changed']} 个文件，删除 {result['deleted']} 个，"
+          f"发送 {result['bytes']} 字节，耗时 {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,19 @@ set -e
 
 # 检查参数
 if [ $# -eq 0 ]; then
-    echo "用法: $0 <配置文件夹名>"
+    echo "用法: $0 <配置文件夹名> [--bundle]"
     echo "示例: $0 ads_31"
+    echo "      $0 ads_31 --bundle   # 上传 prepare.py --bundle 生成的部署包并在服务器上解包"
     echo "注意: SSH配置中的主机名必须与配置文件夹名相同"
     exit 1
 fi
 
 CONFIG_FOLDER="$1"
 SSH_HOST="$1"
+USE_BUNDLE=false
+if [ "$2" = "--bundle" ]; then
+    USE_BUNDLE=true
+fi
 
 echo "部署配置: $CONFIG_FOLDER -> $SSH_HOST"
 
@@ -32,11 +37,34 @@ if [ ! -f "$CONFIG_FOLDER/docker-compose.override.yml" ]; then
     exit 1
 fi
 
+# 上传到服务器 home 目录的宿主机脚本，与 deploy.py 和部署包使用同一个列表（bundle_utils.FLEET_SCRIPTS）
+SCRIPT_DIR=$(cd "$(dirname "$0")" && pwd)
+PYTHON=$(command -v python3 || command -v python || true)
+if [ -z "$PYTHON" ]; then
+    echo "错误: 需要 python3 读取宿主机脚本列表（bundle_utils.py）"
+    exit 1
+fi
+read -r -a FLEET_SCRIPTS <<< "$(cd "$SCRIPT_DIR" && "$PYTHON" -c \
+    'from bundle_utils import FLEET_SCRIPTS; print(" ".join(FLEET_SCRIPTS))')"
+if [ ${#FLEET_SCRIPTS[@]} -eq 0 ]; then
+    echo "错误: 无法从 bundle_utils.py 读取宿主机脚本列表"
+    exit 1
+fi
+
 echo "本地文件检查通过"
 
+# 之后的 ssh / scp / rsync 都复用第一次建立的连接（ControlMaster），整个部署只握手一次
+CONTROL_DIR=$(mktemp -d)
+SSH_OPTS=(-o ControlMaster=auto -o "ControlPath=$CONTROL_DIR/%C" -o ControlPersist=60)
+cleanup() {
+    ssh "${SSH_OPTS[@]}" -O exit "$SSH_HOST" >/dev/null 2>&1 || true
+    rm -rf "$CONTROL_DIR"
+}
+trap cleanup EXIT
+
 # 测试SSH连接
 echo "测试SSH连接..."
-if ! ssh -o ConnectTimeout=10 -o BatchMode=yes "$SSH_HOST" "echo '连接成功'" >/dev/null 2>&1; then
+if ! ssh "${SSH_OPTS[@]}" -o ConnectTimeout=10 -o BatchMode=yes "$SSH_HOST" "echo '连接成功'" >/dev/null 2>&1; then
     echo "错误: 无法连接到服务器: $SSH_HOST"
     echo "请检查:"
     echo "1. ~/.ssh/config 中是否配置了 Host $SSH_HOST"
@@ -47,32 +75,55 @@ fi
 
 echo "SSH连接正常"
 
+# 部署包模式：只上传一个文件，由服务器上的 unpack-bundle.sh 解包
+if [ "$USE_BUNDLE" = true ]; then
+    BUNDLE=""
+    for name in bundle.tar.xz bundle.tar.gz; do
+        if [ -f "$CONFIG_FOLDER/$name" ]; then
+            BUNDLE="$name"
+        fi
+    done
+    if [ -z "$BUNDLE" ]; then
+        echo "错误: 部署包不存在: $CONFIG_FOLDER/bundle.tar.xz"
+        echo "请先运行: python prepare.py $CONFIG_FOLDER --bundle"
+        exit 1
+    fi
+
+    echo "上传部署包 $BUNDLE 和 unpack-bundle.sh..."
+    scp "${SSH_OPTS[@]}" "$CONFIG_FOLDER/$BUNDLE" "$SCRIPT_DIR/unpack-bundle.sh" "$SSH_HOST:~/"
+    ssh "${SSH_OPTS[@]}" "$SSH_HOST" "chmod +x ~/unpack-bundle.sh && ~/unpack-bundle.sh ~/$BUNDLE && rm -f ~/$BUNDLE"
+    echo "部署完成！"
+    exit 0
+fi
+
 # 上传conf目录
 echo "上传 conf 目录..."
-rsync -avz "$CONFIG_FOLDER/conf/" "$SSH_HOST:~/ex-bot/conf/"
-
-# 上传docker-compose文件
-echo "上传 docker-compose.override.yml..."
-scp "$CONFIG_FOLDER/docker-compose.override.yml" "$SSH_HOST:~/ex-bot/docker-compose.override.yml"
-
-# 上传脚本文件
-echo "上传 start-bot.sh..."
-scp "start-bot.sh" "$SSH_HOST:~/"
-
-echo "上传 stop-pending.sh..."
-scp "stop-pending.sh" "$SSH_HOST:~/"
-
-echo "上传 bot-cmd.sh..."
-scp "bot-cmd.sh" "$SSH_HOST:~/"
+rsync -avz -e "ssh ${SSH_OPTS[*]}" "$CONFIG_FOLDER/conf/" "$SSH_HOST:~/ex-bot/conf/"
+
+# 上传docker-compose文件（prepare.py --shard-compose 时还有按分组拆分的 docker-compose.<group>.yml）
+# 和服务索引（宿主机脚本通过它读取机器人名称和所在的compose文件），一次 scp
+EX_BOT_FILES=("$CONFIG_FOLDER/docker-compose.override.yml")
+if [ -f "$CONFIG_FOLDER/services.tsv" ]; then
+    for compose_file in $(tail -n +2 "$CONFIG_FOLDER/services.tsv" | cut -f2 | sort -u); do
+        if [ "$compose_file" != "docker-compose.override.yml" ]; then
+            EX_BOT_FILES+=("$CONFIG_FOLDER/$compose_file")
+        fi
+    done
+    EX_BOT_FILES+=("$CONFIG_FOLDER/services.tsv")
+fi
+echo "上传 ${EX_BOT_FILES[*]##*/}..."
+scp "${SSH_OPTS[@]}" "${EX_BOT_FILES[@]}" "$SSH_HOST:~/ex-bot/"
 
-echo "上传 bot-manager.sh..."
-scp "bot-manager.sh" "$SSH_HOST:~/"
+# 上传宿主机脚本，一次 scp
+echo "上传 ${FLEET_SCRIPTS[*]}..."
+scp "${SSH_OPTS[@]}" "${FLEET_SCRIPTS[@]/#/$SCRIPT_DIR/}" "$SSH_HOST:~/"
 
 echo "部署完成！"
 echo "远程文件位置:"
 echo "  ~/ex-bot/conf/"
-echo "  ~/ex-bot/docker-compose.override.yml"
-echo "  ~/start-bot.sh"
-echo "  ~/stop-pending.sh"
-echo "  ~/bot-cmd.sh"
-echo "  ~/bot-manager.sh"
+for path in "${EX_BOT_FILES[@]}"; do
+    echo "  ~/ex-bot/${path##*/}"
+done
+for name in "${FLEET_SCRIPTS[@]}"; do
+    echo "  ~/$name"
+done
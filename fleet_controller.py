@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+机器人批量管理（在服务器上运行，只依赖标准库），供 bot-manager.sh 的 status / start-all / stop-all / restart-all 调用
+- 机器人列表只从 ~/ex-bot/services.tsv 读取一次
+- 所有容器的状态通过 Docker Engine API（unix socket）一次批量查询，得到的快照在同一次操作中复用，
+  不再为每个机器人分别运行 docker ps
+- 停止后轮询快照直到容器都已停止（或超时），代替固定的 sleep；停止请求通过 API 并行发送
+- 启动交给 launch_scheduler.py 的 LaunchScheduler：同时启动中的机器人有上限，上一批稳定后再启动下一批，
+  共用代理或 API key 的机器人不会同时处于启动中，主机负载过高时暂停；
+  每个机器人与 bot-manager.sh 相同，在 tmux 窗口中 docker compose up 后 attach
+
+用法：
+   python3 ~/fleet_controller.py status           # 所有机器人的状态
+   python3 ~/fleet_controller.py status --json    # JSON 格式输出
+   python3 ~/fleet_controller.py start-all        # 启动所有未运行的机器人
+   python3 ~/fleet_controller.py stop-all         # 停止所有运行中的机器人
+   python3 ~/fleet_controller.py restart-all      # 停止后重新启动所有机器人
+   python3 ~/fleet_controller.py start-all --max-starting 4 --settle 20  # 调整启动的节奏
+
+FakeDockerServer 在 unix socket 上模拟 Docker Engine API，用于测试（见 benchmarks/bench_controller.py）
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote, urlsplit
+
+from launch_scheduler import (EX_BOT_DIR, SERVICES_INDEX_FILE, ContainerState, HostMetrics, LaunchBot, LaunchPolicy,
+                              LaunchScheduler, TmuxLauncher, parse_docker_time, read_services_index, run_schedule)
+
+DEFAULT_DOCKER_SOCKET = '/var/run/docker.sock'
+
+
+class DockerAPIError(Exception):
+    """无法连接 docker socket 或 API 返回错误"""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过 unix socket 发送 HTTP 请求"""
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def docker_socket_path() -> str:
+    """DOCKER_HOST 为 unix:// 时使用其中的路径，否则使用默认的 /var/run/docker.sock"""
+    host = os.environ.get('DOCKER_HOST', '')
+    if host.startswith('unix://'):
+        return host[len('unix://'):]
+    return DEFAULT_DOCKER_SOCKET
+
+
+class DockerClient:
+    """Docker Engine API 客户端，每个请求使用单独的连接，可以在多个线程中并行调用"""
+
+    def __init__(self, socket_path: str = None, timeout: float = 30.0):
+        self.socket_path = socket_path or docker_socket_path()
+        self.timeout = timeout
+        self.requests = 0
+
+    def request(self, method: str, path: str, timeout: float = None):
+        """返回 (状态码, 解析后的 JSON 或 None)"""
+        connection = UnixHTTPConnection(self.socket_path, timeout or self.timeout)
+        try:
+            connection.request(method, path, headers={'Host': 'docker'})
+            response = connection.getresponse()
+            body = response.read()
+        except OSError as e:
+            raise DockerAPIError(f"无法访问 docker socket {self.socket_path}: {e}") from None
+        finally:
+            connection.close()
+        self.requests += 1
+        data = None
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+        if response.status >= 400 and response.status != 404:
+            message = data.get('message') if isinstance(data, dict) else body.decode('utf-8', 'replace')
+            raise DockerAPIError(f"{method} {path}: {response.status} {message}")
+        return response.status, data
+
+    def containers(self) -> List[dict]:
+        """所有容器（包括已停止的）的摘要，一次请求"""
+        _, data = self.request('GET', '/containers/json?all=1')
+        return data or []
+
+    def states(self, names: List[str]) -> Dict[str, ContainerState]:
+        """
+        容器的详细状态（包括最近一次启动的时间），供 LaunchScheduler 判断启动中的容器是否稳定
+        每个容器一次请求，只用于启动中的少数容器；不存在的容器不返回
+        """
+        states = {}
+        for name in names:
+            status, data = self.request('GET', f"/containers/{quote(name)}/json")
+            if status == 404 or not isinstance(data, dict):
+                continue
+            state = data.get('State') or {}
+            states[name] = ContainerState(state.get('Status', ''), parse_docker_time(state.get('StartedAt', '')),
+                                          int(data.get('RestartCount') or 0))
+        return states
+
+    def stop(self, name: str, timeout: int = 10) -> int:
+        """停止容器，返回状态码（204 已停止，304 本来就未运行，404 不存在）"""
+        status, _ = self.request('POST', f"/containers/{quote(name)}/stop?t={timeout}", timeout=timeout + 30)
+        return status
+
+
+class ContainerInfo:
+    """快照中的一个容器：state 为 running / exited / created 等，status 为 docker ps 的状态描述"""
+
+    __slots__ = ('state', 'status')
+
+    def __init__(self, state: str, status: str = ''):
+        self.state = state
+        self.status = status
+
+    @property
+    def running(self) -> bool:
+        return self.state == 'running'
+
+
+class FleetController:
+    """
+    批量管理服务列表中的机器人
+    docker 需要提供 containers()、states(names) 和 stop(name)，launch(bot) 执行启动命令（默认 TmuxLauncher）
+    clock 需要与 docker 的启动时间可比（time.time）
+    """
+
+    def __init__(self, bots: List[LaunchBot], docker, launch: Callable[[LaunchBot], None],
+                 clock=time.time, sleep=time.sleep, log=print):
+        self.bots = bots
+        self.docker = docker
+        self.launch = launch
+        self.clock = clock
+        self.sleep = sleep
+        self.log = log
+        self._snapshot: Optional[Dict[str, ContainerInfo]] = None
+
+    def snapshot(self, refresh: bool = False) -> Dict[str, ContainerInfo]:
+        """所有容器的状态 {容器名: ContainerInfo}，未刷新时返回上一次查询的结果"""
+        if self._snapshot is None or refresh:
+            snapshot = {}
+            for container in self.docker.containers():
+                info = ContainerInfo(container.get('State', ''), container.get('Status', ''))
+                for name in container.get('Names') or ():
+                    snapshot[name.lstrip('/')] = info
+            self._snapshot = snapshot
+        return self._snapshot
+
+    def running(self, refresh: bool = False) -> List[LaunchBot]:
+        snapshot = self.snapshot(refresh)
+        return [bot for bot in self.bots if bot.name in snapshot and snapshot[bot.name].running]
+
+    def stopped(self, refresh: bool = False) -> List[LaunchBot]:
+        snapshot = self.snapshot(refresh)
+        return [bot for bot in self.bots if bot.name not in snapshot or not snapshot[bot.name].running]
+
+    def wait_until(self, names: List[str], running: bool, timeout: float, poll_seconds: float = 1.0) -> List[str]:
+        """轮询快照直到 names 中的容器都达到预期状态，返回超时后仍未达到的容器名"""
+        deadline = self.clock() + timeout
+        remaining = list(names)
+        while remaining:
+            snapshot = self.snapshot(refresh=True)
+            remaining = [name for name in remaining
+                         if (name in snapshot and snapshot[name].running) != running]
+            if not remaining or self.clock() >= deadline:
+                break
+            self.sleep(poll_seconds)
+        return remaining
+
+    def status(self) -> List[dict]:
+        snapshot = self.snapshot()
+        rows = []
+        for bot in self.bots:
+            info = snapshot.get(bot.name)
+            rows.append({'name': bot.name, 'running': bool(info and info.running),
+                         'state': info.state if info else 'missing', 'status': info.status if info else ''})
+        return rows
+
+    def start_all(self, policy: LaunchPolicy = None, host=None, poll_seconds: float = 1.0) -> dict:
+        """
+        按 LaunchScheduler 的调度启动快照中所有未运行的机器人，直到全部稳定或失败，
+        返回 {'started': 已稳定的机器人, 'failed': [...], 'skipped': [...]}
+        host 需要提供 sample() -> HostSample（默认读取 /proc 的 HostMetrics）
+        没有快照时先查询一次；stop_all 等待停止时已经刷新了快照，restart-all 不需要再查询
+        """
+        targets = self.stopped()
+        skipped = [bot.name for bot in self.bots if bot not in targets]
+        if not targets:
+            return {'started': [], 'failed': [], 'skipped': skipped}
+        scheduler = LaunchScheduler(targets, policy or LaunchPolicy(), self.docker, host or HostMetrics())
+        run_schedule(scheduler, self.launch, self.clock, self.sleep, poll_seconds, self.log)
+        return {'started': list(scheduler.settled), 'failed': [name for name, _ in scheduler.failed],
+                'skipped': skipped}
+
+    def stop_all(self, timeout: float = 60.0, parallel: int = 16, poll_seconds: float = 1.0) -> dict:
+        """并行停止快照中所有运行中的机器人，返回 {'stopped': [...], 'failed': [...], 'skipped': [...]}"""
+        targets = [bot.name for bot in self.running()]
+        skipped = [bot.name for bot in self.bots if bot.name not in targets]
+        failed = []
+
+        def stop(name):
+            try:
+                self.docker.stop(name)
+            except DockerAPIError as e:
+                self.log(f"❌ {name} 停止失败: {e}")
+                failed.append(name)
+
+        if targets:
+            with ThreadPoolExecutor(max_workers=max(1, min(parallel, len(targets)))) as executor:
+                list(executor.map(stop, targets))
+        still_running = self.wait_until([name for name in targets if name not in failed], False, timeout,
+                                        poll_seconds)
+        failed += still_running
+        return {'stopped': [name for name in targets if name not in failed], 'failed': failed,
+                'skipped': skipped}
+
+
+# ========== 模拟的 Docker Engine API（用于测试） ==========
+
+class _FakeDockerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, data=None):
+        body = b'' if data is None else json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        fake = self.server.fake
+        fake.record(self.command, self.path)
+        path = urlsplit(self.path).path
+        parts = path.strip('/').split('/')
+        if path == '/containers/json':
+            self._reply(200, fake.list_containers())
+        elif len(parts) == 3 and parts[0] == 'containers' and parts[2] == 'json':
+            info = fake.inspect(parts[1])
+            self._reply(200 if info else 404, info or {'message': f"No such container: {parts[1]}"})
+        else:
+            self._reply(404, {'message': 'page not found'})
+
+    def do_POST(self):
+        fake = self.server.fake
+        fake.record(self.command, self.path)
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'containers' and parts[2] in ('start', 'stop'):
+            self._reply(fake.change_state(parts[1], parts[2] == 'start'))
+        else:
+            self._reply(404, {'message': 'page not found'})
+
+    def address_string(self):
+        return 'unix'
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # 默认只有 5，并行停止时 unix socket 的 connect 会返回 EAGAIN
+    request_queue_size = 128
+
+
+class FakeDockerServer:
+    """
+    在 unix socket 上模拟 Docker Engine API 的 /containers/json、/containers/<名称>/json、/start 和 /stop
+    containers: 容器名 -> 是否运行中；latency: 每个请求的延迟（秒），requests 记录收到的 (方法, 路径)
+    """
+
+    def __init__(self, socket_path: str, containers: Dict[str, bool] = None, latency: float = 0.0):
+        self.socket_path = socket_path
+        self.containers = dict(containers or {})
+        # 容器名 -> 最近一次启动的时间戳，初始运行中的容器视为很早以前启动
+        self.started_at = {name: 0.0 for name, running in self.containers.items() if running}
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def record(self, method: str, path: str):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests.append((method, path))
+
+    def list_containers(self) -> List[dict]:
+        with self._lock:
+            return [{'Id': name, 'Names': [f"/{name}"], 'State': 'running' if running else 'exited',
+                     'Status': 'Up 1 minute' if running else 'Exited (0) 1 minute ago'}
+                    for name, running in self.containers.items()]
+
+    def inspect(self, name: str) -> Optional[dict]:
+        with self._lock:
+            if name not in self.containers:
+                return None
+            started_at = self.started_at.get(name)
+            return {'Name': f"/{name}", 'RestartCount': 0,
+                    'State': {'Status': 'running' if self.containers[name] else 'exited',
+                              'StartedAt': '0001-01-01T00:00:00Z' if started_at is None else
+                              datetime.fromtimestamp(started_at, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')}}
+
+    def change_state(self, name: str, running: bool) -> int:
+        with self._lock:
+            if name not in self.containers:
+                return 404
+            if self.containers[name] == running:
+                return 304
+            self.containers[name] = running
+            if running:
+                self.started_at[name] = time.time()
+            return 204
+
+    def launch(self, bot: LaunchBot):
+        """代替 TmuxLauncher：docker compose up 会创建并启动容器"""
+        with self._lock:
+            if not self.containers.get(bot.name):
+                self.started_at[bot.name] = time.time()
+            self.containers[bot.name] = True
+
+    def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = _UnixHTTPServer(self.socket_path, _FakeDockerHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+# ========== 命令行 ==========
+
+def print_status(rows: List[dict]):
+    print("所有机器人状态:")
+    print("========================================")
+    for row in rows:
+        if row['running']:
+            print(f"✅ {row['name']} - 运行中（{row['status']}）")
+        elif row['state'] == 'missing':
+            print(f"❌ {row['name']} - 未创建")
+        else:
+            print(f"❌ {row['name']} - 未运行（{row['status'] or row['state']}）")
+    print("========================================")
+    print(f"总计: {sum(1 for row in rows if row['running'])}/{len(rows)} 个机器人运行中")
+
+
+def print_result(result: dict, action: str):
+    done_key = 'started' if action == '启动' else 'stopped'
+    for name in result[done_key]:
+        print(f"✅ {name} {action}成功")
+    for name in result['failed']:
+        print(f"❌ {name} {action}失败")
+    print(f"{action}完成，共{action}了 {len(result[done_key])} 个机器人，"
+          f"失败 {len(result['failed'])} 个，跳过 {len(result['skipped'])} 个")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="通过 Docker Engine API 批量查看、启动和停止机器人")
+    parser.add_argument('action', choices=('status', 'start-all', 'stop-all', 'restart-all'))
+    parser.add_argument('--json', action='store_true', help="status 以 JSON 格式输出")
+    parser.add_argument('--services', default=os.path.join(EX_BOT_DIR, SERVICES_INDEX_FILE),
+                        help="服务索引文件（默认 ~/ex-bot/services.tsv）")
+    parser.add_argument('--socket', default=None, help=f"docker socket（默认 DOCKER_HOST 或 {DEFAULT_DOCKER_SOCKET}）")
+    parser.add_argument('--session', default='bot', help="启动时使用的 tmux session（默认 bot）")
+    parser.add_argument('--timeout', type=float, default=60.0, help="等待容器启动或停止的最长时间（秒，默认 60）")
+    parser.add_argument('--parallel', type=int, default=16, help="同时发送的停止请求数（默认 16）")
+
+    launch = parser.add_argument_group('启动（start-all / restart-all，见 launch_scheduler.py）')
+    launch.add_argument('--batch-size', type=int, default=2, help="每批最多启动的机器人数（默认 2）")
+    launch.add_argument('--max-starting', type=int, default=3, help="同时处于启动中的机器人上限（默认 3）")
+    launch.add_argument('--settle', type=float, default=10.0, help="容器连续运行多少秒算稳定（默认 10）")
+    launch.add_argument('--min-interval', type=float, default=2.0, help="两批之间的最短间隔（秒，默认 2）")
+    launch.add_argument('--poll', type=float, default=2.0, help="检查容器状态的间隔（秒，默认 2）")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.services):
+        print(f"错误: 找不到服务索引 {args.services}")
+        sys.exit(2)
+
+    controller = FleetController(read_services_index(args.services), DockerClient(args.socket),
+                                 TmuxLauncher(args.session))
+    try:
+        controller.snapshot()
+    except DockerAPIError as e:
+        # 还没有执行任何操作，bot-manager.sh 收到 2 时改用逐个 docker ps 的实现
+        print(f"错误: {e}")
+        sys.exit(2)
+
+    try:
+        if args.action == 'status':
+            rows = controller.status()
+            if args.json:
+                print(json.dumps(rows, indent=2, ensure_ascii=False))
+            else:
+                print_status(rows)
+            return
+
+        failed = []
+        if args.action in ('stop-all', 'restart-all'):
+            print("停止所有运行的机器人...")
+            result = controller.stop_all(args.timeout, args.parallel)
+            print_result(result, '停止')
+            failed += result['failed']
+        if args.action in ('start-all', 'restart-all'):
+            print("检查并启动所有未运行的机器人...")
+            policy = LaunchPolicy(batch_size=args.batch_size, max_starting=args.max_starting,
+                                  settle_seconds=args.settle, max_wait_seconds=args.timeout,
+                                  min_interval_seconds=args.min_interval)
+            result = controller.start_all(policy, HostMetrics(), args.poll)
+            print_result(result, '启动')
+            failed += result['failed']
+            print("使用 'tmux attach' 连接到session查看机器人状态")
+        sys.exit(1 if failed else 0)
+    except DockerAPIError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+延迟启动任务登记（在服务器上运行，只依赖标准库），供 start-bot.sh --fixed 和 stop-pending.sh 调用
+代替原来每个机器人一个 /tmp/start_<机器人>_<pid>.sh 加 at 队列的方式：
+- 任务保存在 ~/ex-bot/launch_jobs.db（SQLite），以机器人名为主键、按到期时间建索引，
+  按机器人查询和取消只需一次索引查找，不再对每个 at 任务运行 at -c 再 grep
+- 由单个调度进程（文件锁保证只有一个）按到期时间依次启动，没有待执行的任务时退出
+- 任务保存在磁盘上，install-boot 在当前用户的 crontab 中加入 @reboot 条目（start-bot.sh 添加任务时自动执行），
+  服务器重启后自动运行调度进程继续；重启期间已经过期的任务整体顺延，保持原来的启动间隔
+
+用法：
+   python3 ~/launch_jobs.py add --interval 3 bot1 bot2 bot3   # bot1 立即、bot2 3 分钟后、bot3 6 分钟后启动
+   python3 ~/launch_jobs.py list                              # 列出待执行的任务和调度进程状态
+   python3 ~/launch_jobs.py cancel --bot bot2                 # 取消 bot2 的任务
+   python3 ~/launch_jobs.py cancel --all                      # 取消所有任务
+   python3 ~/launch_jobs.py run                               # 运行调度进程（已有调度进程时直接退出）
+   python3 ~/launch_jobs.py install-boot                      # 开机后自动运行调度进程（crontab @reboot）
+
+调度逻辑可以用模拟时钟测试（见 benchmarks/bench_jobs.py）
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shlex
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from launch_scheduler import EX_BOT_DIR, SERVICES_INDEX_FILE, LaunchBot, TmuxLauncher, read_services_index
+
+JOBS_DB_FILE = 'launch_jobs.db'
+JOBS_LOG_FILE = 'launch_jobs.log'
+# crontab 中 @reboot 条目的结尾注释，用于查找和替换
+BOOT_MARKER = '# ex-bot launch_jobs'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    bot TEXT PRIMARY KEY,
+    due REAL NOT NULL,
+    compose_file TEXT NOT NULL DEFAULT '',
+    session TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (due);
+"""
+
+
+class LaunchJob:
+    """一个待执行的启动任务：due 为到期时间（Unix 时间戳，重启后仍然有效）"""
+
+    __slots__ = ('bot', 'due', 'compose_file', 'session', 'created')
+
+    def __init__(self, bot: str, due: float, compose_file: str = '', session: str = 'bot', created: float = 0.0):
+        self.bot = bot
+        self.due = due
+        self.compose_file = compose_file
+        self.session = session
+        self.created = created
+
+    def to_dict(self) -> dict:
+        return {'bot': self.bot, 'due': self.due, 'compose_file': self.compose_file, 'session': self.session,
+                'created': self.created}
+
+
+class JobRegistry:
+    """SQLite 中的任务表，每个机器人最多一个待执行的任务（重复添加时替换）"""
+
+    def __init__(self, path: str, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._conn = sqlite3.connect(path, timeout=10.0)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _jobs(self, sql: str, params=()) -> List[LaunchJob]:
+        return [LaunchJob(*row) for row in
+                self._conn.execute(f"SELECT bot, due, compose_file, session, created FROM jobs {sql}", params)]
+
+    def add(self, jobs: List[LaunchJob]):
+        now = self.clock()
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO jobs (bot, due, compose_file, session, created) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   [(job.bot, job.due, job.compose_file, job.session, now) for job in jobs])
+
+    def pending(self) -> List[LaunchJob]:
+        """按到期时间排序的所有任务"""
+        return self._jobs("ORDER BY due, bot")
+
+    def get(self, bot: str) -> Optional[LaunchJob]:
+        jobs = self._jobs("WHERE bot = ?", (bot,))
+        return jobs[0] if jobs else None
+
+    def next_job(self) -> Optional[LaunchJob]:
+        jobs = self._jobs("ORDER BY due LIMIT 1")
+        return jobs[0] if jobs else None
+
+    def cancel(self, bot: str) -> bool:
+        with self._conn:
+            return self._conn.execute("DELETE FROM jobs WHERE bot = ?", (bot,)).rowcount > 0
+
+    def cancel_all(self) -> int:
+        with self._conn:
+            return self._conn.execute("DELETE FROM jobs").rowcount
+
+    def claim(self, job: LaunchJob) -> bool:
+        """删除即将执行的任务；任务已被取消或重新安排时返回 False"""
+        with self._conn:
+            return self._conn.execute("DELETE FROM jobs WHERE bot = ? AND due = ?", (job.bot, job.due)).rowcount > 0
+
+    def shift_overdue(self, now: float, grace_seconds: float) -> float:
+        """最早的任务过期超过 grace_seconds 时（调度进程停止过，例如服务器重启），所有任务整体顺延，返回顺延的秒数"""
+        job = self.next_job()
+        if job is None or now - job.due <= grace_seconds:
+            return 0.0
+        delta = now - job.due
+        with self._conn:
+            self._conn.execute("UPDATE jobs SET due = due + ?", (delta,))
+        return delta
+
+
+class SchedulerLock:
+    """保证只有一个调度进程：对锁文件加 flock（进程退出时自动释放），并在文件中记录 PID"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        f = open(self.path, 'a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def holder_pid(self) -> Optional[int]:
+        """持有锁的调度进程的 PID，没有调度进程时返回 None"""
+        if self._file is not None:
+            return os.getpid()
+        try:
+            f = open(self.path, 'r')
+        except OSError:
+            return None
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except OSError:
+                pid = f.read().strip()
+                return int(pid) if pid.isdigit() else -1
+            fcntl.flock(f, fcntl.LOCK_UN)
+        return None
+
+
+def run_jobs(registry: JobRegistry, launch: Callable[[LaunchJob], None], lock: SchedulerLock,
+             clock=time.time, sleep=time.sleep, poll_seconds: float = 5.0, grace_seconds: float = 60.0,
+             log=print) -> int:
+    """
+    调度进程：按到期时间依次启动，没有待执行的任务时退出，返回发送的启动命令数
+    等待时最多睡 poll_seconds 秒，期间新增或取消的任务在下一次检查时生效
+    """
+    if not lock.acquire():
+        log(f"调度进程已在运行（PID {lock.holder_pid()}）")
+        return 0
+    launched = 0
+    try:
+        delta = registry.shift_overdue(clock(), grace_seconds)
+        if delta:
+            log(f"任务已过期 {delta / 60:.0f} 分钟（调度进程停止过），全部顺延，保持原来的启动间隔")
+        while True:
+            job = registry.next_job()
+            if job is None:
+                # 先释放锁再检查一次：释放前加入的任务在这里处理，释放后加入的任务由新的调度进程处理
+                lock.release()
+                if registry.next_job() is None or not lock.acquire():
+                    return launched
+                continue
+            wait = job.due - clock()
+            if wait > 0:
+                sleep(min(wait, poll_seconds))
+                continue
+            if not registry.claim(job):
+                continue
+            try:
+                launch(job)
+                log(f"✅ {job.bot} 启动命令已发送")
+            except (OSError, subprocess.SubprocessError) as e:
+                log(f"❌ {job.bot} 启动命令失败: {e}")
+            launched += 1
+    finally:
+        lock.release()
+
+
+class SessionLauncher:
+    """按任务记录的 tmux session 启动，每个 session 一个 TmuxLauncher"""
+
+    def __init__(self):
+        self._launchers = {}
+
+    def __call__(self, job: LaunchJob):
+        if job.session not in self._launchers:
+            self._launchers[job.session] = TmuxLauncher(job.session)
+        self._launchers[job.session](LaunchBot(job.bot, job.compose_file))
+
+
+def boot_entry(db_path: str, delay_seconds: int) -> str:
+    """开机后运行调度进程的 crontab 条目；等待 delay_seconds 秒让 docker 先启动"""
+    script = os.path.abspath(__file__)
+    log_path = os.path.join(os.path.dirname(os.path.abspath(db_path)), JOBS_LOG_FILE)
+    return (f"@reboot sleep {delay_seconds} && {shlex.quote(sys.executable)} {shlex.quote(script)} "
+            f"--db {shlex.quote(os.path.abspath(db_path))} run >> {shlex.quote(log_path)} 2>&1 {BOOT_MARKER}")
+
+
+def install_boot_entry(entry: str) -> bool:
+    """
+    把 @reboot 条目写入当前用户的 crontab，替换之前写入的条目（以及 README 中手动添加的条目），返回是否有变化
+    Raises:
+        OSError / subprocess.SubprocessError: 没有 crontab 命令或写入失败
+    """
+    result = subprocess.run(['crontab', '-l'], capture_output=True, text=True)
+    # 还没有 crontab 时 crontab -l 返回非零
+    lines = result.stdout.splitlines() if result.returncode == 0 else []
+    kept = [line for line in lines if not line.endswith(BOOT_MARKER)
+            and not (line.startswith('@reboot') and 'launch_jobs.py' in line)]
+    if kept + [entry] == lines:
+        return False
+    subprocess.run(['crontab', '-'], input='\n'.join(kept + [entry]) + '\n', capture_output=True, text=True,
+                   check=True)
+    return True
+
+
+# ========== 命令行 ==========
+
+def format_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def print_jobs(jobs: List[LaunchJob], pid: Optional[int], now: float):
+    print("待执行的启动任务:")
+    print("==================")
+    if not jobs:
+        print("没有待执行的启动任务")
+    for job in jobs:
+        remaining = max(0.0, job.due - now) / 60
+        print(f"{job.bot:<20} {format_time(job.due)}（{remaining:.1f} 分钟后） session: {job.session}")
+    print("==================")
+    if pid is not None:
+        print(f"调度进程运行中（PID {pid}）")
+    elif jobs:
+        print("调度进程未运行，运行 python3 ~/launch_jobs.py run 继续执行任务")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="延迟启动任务登记和调度进程")
+    parser.add_argument('--db', default=os.path.join(EX_BOT_DIR, JOBS_DB_FILE),
+                        help="任务数据库（默认 ~/ex-bot/launch_jobs.db）")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    add = subparsers.add_parser('add', help="添加启动任务（机器人已有任务时替换）")
+    add.add_argument('bots', nargs='+', help="按启动顺序排列的机器人")
+    add.add_argument('--delay', type=float, default=0.0, help="第一批的延迟（分钟，默认 0）")
+    add.add_argument('--interval', type=float, default=3.0, help="批次之间的间隔（分钟，默认 3）")
+    add.add_argument('--batch', type=int, default=1, help="每批启动的机器人数（默认 1）")
+    add.add_argument('--session', default='bot', help="tmux session（默认 bot）")
+    add.add_argument('--services', default=os.path.join(EX_BOT_DIR, SERVICES_INDEX_FILE),
+                     help="服务索引文件，用于查找机器人所在的 compose 文件（默认 ~/ex-bot/services.tsv）")
+
+    listing = subparsers.add_parser('list', help="列出待执行的任务")
+    listing.add_argument('--json', action='store_true', help="以 JSON 格式输出")
+
+    cancel = subparsers.add_parser('cancel', help="取消任务")
+    target = cancel.add_mutually_exclusive_group(required=True)
+    target.add_argument('--bot', nargs='+', help="取消这些机器人的任务")
+    target.add_argument('--all', action='store_true', help="取消所有任务")
+
+    run = subparsers.add_parser('run', help="运行调度进程，没有待执行的任务时退出")
+    run.add_argument('--poll', type=float, default=5.0, help="检查任务变化的间隔（秒，默认 5）")
+    run.add_argument('--grace', type=float, default=60.0,
+                     help="最早的任务过期超过多少秒时整体顺延（秒，默认 60）")
+
+    subparsers.add_parser('is-running', help="调度进程运行中时返回 0，否则返回 1")
+
+    boot = subparsers.add_parser('install-boot', help="在 crontab 中加入 @reboot 条目，开机后自动运行调度进程")
+    boot.add_argument('--delay', type=int, default=60, help="开机后等待多少秒再运行（等待 docker 启动，默认 60）")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    registry = JobRegistry(args.db)
+    lock = SchedulerLock(args.db + '.lock')
+
+    if args.action == 'add':
+        compose_files = {}
+        if os.path.exists(args.services):
+            compose_files = {bot.name: bot.compose_file for bot in read_services_index(args.services)}
+        now = time.time()
+        batch = max(1, args.batch)
+        jobs = [LaunchJob(name, now + (args.delay + index // batch * args.interval) * 60,
+                          compose_files.get(name, ''), args.session) for index, name in enumerate(args.bots)]
+        registry.add(jobs)
+        print(f"已添加 {len(jobs)} 个启动任务，最后一个在 {format_time(jobs[-1].due)} 启动")
+    elif args.action == 'list':
+        jobs = registry.pending()
+        pid = lock.holder_pid()
+        if args.json:
+            print(json.dumps({'scheduler_pid': pid, 'jobs': [job.to_dict() for job in jobs]}, indent=2,
+                             ensure_ascii=False))
+        else:
+            print_jobs(jobs, pid, time.time())
+    elif args.action == 'cancel':
+        if args.all:
+            print(f"已取消 {registry.cancel_all()} 个启动任务")
+        else:
+            for name in args.bot:
+                if registry.cancel(name):
+                    print(f"已取消机器人 {name} 的启动任务")
+                else:
+                    print(f"机器人 {name} 没有待执行的启动任务")
+    elif args.action == 'run':
+        launched = run_jobs(registry, SessionLauncher(), lock, poll_seconds=args.poll, grace_seconds=args.grace,
+                            log=lambda message: print(f"[{format_time(time.time())}] {message}", flush=True))
+        print(f"调度进程退出，共发送 {launched} 个启动命令")
+    elif args.action == 'is-running':
+        sys.exit(0 if lock.holder_pid() is not None else 1)
+    elif args.action == 'install-boot':
+        try:
+            changed = install_boot_entry(boot_entry(args.db, args.delay))
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"错误: 无法写入 crontab: {e}")
+            sys.exit(1)
+        if changed:
+            print("已在 crontab 中加入 @reboot 条目，服务器重启后自动运行调度进程")
+    registry.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+机器人启动调度器（在服务器上运行，只依赖标准库）
+替代 start-bot.sh 的固定间隔启动：上一批容器稳定后立即启动下一批，而不是每批固定等待几分钟
+- 容器连续运行 --settle 秒才算稳定；启动后退出或反复重启的容器记为失败，不阻塞后续机器人
+- 每核平均负载、CPU 使用率或可用内存超过上限时暂停启动，可用内存同时限制一批启动的数量
+- 同时处于启动中（未稳定）的机器人不超过 --max-starting 个
+- 共用代理或 API key 的机器人不会同时处于启动中，分散交易所的限频压力
+  （按 services.tsv 的 proxy_id / key_id 列判断，由 prepare.py 生成）
+
+决策逻辑（LaunchScheduler）只通过 docker 状态和主机指标两个接口获取信息，
+可以用 FakeDocker / FakeHost 和模拟时钟测试（见 benchmarks/bench_launch.py）
+
+用法（通常由 start-bot.sh 在 tmux 的 launcher 窗口中调用）：
+   python3 ~/launch_scheduler.py                   # 启动 services.tsv 中所有未运行的机器人
+   python3 ~/launch_scheduler.py bot1 bot2         # 只启动指定的机器人（按给定顺序）
+   python3 ~/launch_scheduler.py --max-starting 4  # 最多同时 4 个容器处于启动中
+   python3 ~/launch_scheduler.py --dry-run         # 只输出机器人列表、主机指标和当前的启动决策
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+EX_BOT_DIR = os.path.expanduser('~/ex-bot')
+DEFAULT_COMPOSE_FILE = 'docker-compose.override.yml'
+SERVICES_INDEX_FILE = 'services.tsv'
+
+
+class LaunchBot:
+    """services.tsv 的一行"""
+
+    __slots__ = ('name', 'compose_file', 'proxy_id', 'key_id')
+
+    def __init__(self, name: str, compose_file: str = '', proxy_id: str = '', key_id: str = ''):
+        self.name = name
+        self.compose_file = compose_file
+        self.proxy_id = proxy_id
+        self.key_id = key_id
+
+
+class LaunchPolicy:
+    """
+    启动策略
+    batch_size: 每次决策最多启动的机器人数；max_starting: 同时处于启动中的机器人上限
+    settle_seconds: 容器连续运行多久算稳定；max_wait_seconds: 超过后不再等待该容器（记为失败）
+    max_load_per_cpu / max_cpu_percent / min_memory_mb: 主机指标的上限，超过时暂停启动
+    memory_per_bot_mb: 预估每个机器人占用的内存，可用内存需要留出启动这一批的余量
+    """
+
+    def __init__(self, batch_size: int = 2, max_starting: int = 3, settle_seconds: float = 30.0,
+                 max_wait_seconds: float = 300.0, min_interval_seconds: float = 5.0, max_restarts: int = 2,
+                 max_load_per_cpu: float = 0.85, max_cpu_percent: float = 85.0, min_memory_mb: float = 512.0,
+                 memory_per_bot_mb: float = 300.0):
+        self.batch_size = max(1, batch_size)
+        self.max_starting = max(1, max_starting)
+        self.settle_seconds = settle_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.max_restarts = max_restarts
+        self.max_load_per_cpu = max_load_per_cpu
+        self.max_cpu_percent = max_cpu_percent
+        self.min_memory_mb = min_memory_mb
+        self.memory_per_bot_mb = memory_per_bot_mb
+
+
+class ContainerState:
+    """容器状态：status 为 docker 的 State.Status，started_at 为最近一次启动的时间戳（未启动过为 None）"""
+
+    __slots__ = ('status', 'started_at', 'restart_count')
+
+    def __init__(self, status: str, started_at: Optional[float] = None, restart_count: int = 0):
+        self.status = status
+        self.started_at = started_at
+        self.restart_count = restart_count
+
+
+class HostSample:
+    """主机指标：每核 1 分钟平均负载、CPU 使用率（%）、可用内存（MB）"""
+
+    __slots__ = ('load_per_cpu', 'cpu_percent', 'memory_available_mb')
+
+    def __init__(self, load_per_cpu: float, cpu_percent: float, memory_available_mb: float):
+        self.load_per_cpu = load_per_cpu
+        self.cpu_percent = cpu_percent
+        self.memory_available_mb = memory_available_mb
+
+
+class Decision:
+    """一次调度决策：bots 为现在要启动的机器人，为空时 reason 说明等待的原因；done 表示调度结束"""
+
+    __slots__ = ('bots', 'reason', 'done')
+
+    def __init__(self, bots: List[LaunchBot] = (), reason: str = '', done: bool = False):
+        self.bots = list(bots)
+        self.reason = reason
+        self.done = done
+
+
+class LaunchScheduler:
+    """
+    启动调度的决策逻辑，不直接执行命令：
+    update(now) 根据容器状态更新启动中的机器人，decide(now) 返回下一步，mark_launched 记录已启动的机器人
+    docker 需要提供 states(names) -> {名称: ContainerState}，host 需要提供 sample() -> HostSample
+    """
+
+    def __init__(self, bots: List[LaunchBot], policy: LaunchPolicy, docker, host):
+        self.policy = policy
+        self.docker = docker
+        self.host = host
+        self.pending = list(bots)
+        self.starting: Dict[str, tuple] = {}  # 名称 -> (LaunchBot, 启动时间)
+        self.settled: List[str] = []
+        self.failed: List[tuple] = []  # (名称, 原因)
+        self.last_launch = None
+
+    def _outcome(self, state: Optional[ContainerState], launched: float, now: float) -> Optional[str]:
+        """启动中的容器的结果：'settled'、失败原因，或 None（继续等待）"""
+        policy = self.policy
+        # started_at 早于本次启动的状态是上一次运行留下的，忽略
+        started = state is not None and state.started_at is not None and state.started_at >= launched
+        if started and state.status in ('exited', 'dead'):
+            return "容器启动后退出"
+        if started and state.restart_count > policy.max_restarts:
+            return f"容器重启了 {state.restart_count} 次"
+        if started and state.status == 'running' and now - state.started_at >= policy.settle_seconds:
+            return 'settled'
+        if now - launched >= policy.max_wait_seconds:
+            return f"{policy.max_wait_seconds:g} 秒内未稳定"
+        return None
+
+    def update(self, now: float) -> List[tuple]:
+        """更新启动中的机器人，返回本次稳定或失败的 [(名称, 结果)]"""
+        if not self.starting:
+            return []
+        states = self.docker.states(list(self.starting))
+        events = []
+        for name, (bot, launched) in list(self.starting.items()):
+            outcome = self._outcome(states.get(name), launched, now)
+            if outcome is None:
+                continue
+            del self.starting[name]
+            if outcome == 'settled':
+                self.settled.append(name)
+            else:
+                self.failed.append((name, outcome))
+            events.append((name, outcome))
+        return events
+
+    def _host_busy(self, sample: HostSample) -> Optional[str]:
+        policy = self.policy
+        if sample.load_per_cpu > policy.max_load_per_cpu:
+            return f"每核负载 {sample.load_per_cpu:.2f} 超过 {policy.max_load_per_cpu:g}"
+        if sample.cpu_percent > policy.max_cpu_percent:
+            return f"CPU 使用率 {sample.cpu_percent:.0f}% 超过 {policy.max_cpu_percent:g}%"
+        if sample.memory_available_mb < policy.min_memory_mb + policy.memory_per_bot_mb:
+            return f"可用内存 {sample.memory_available_mb:.0f}MB 不足（需要保留 {policy.min_memory_mb:g}MB）"
+        return None
+
+    def decide(self, now: float) -> Decision:
+        policy = self.policy
+        if not self.pending:
+            if self.starting:
+                return Decision(reason=f"等待 {len(self.starting)} 个容器稳定")
+            return Decision(reason="全部机器人已处理", done=True)
+
+        if self.last_launch is not None and now - self.last_launch < policy.min_interval_seconds:
+            return Decision(reason=f"距上一批启动不足 {policy.min_interval_seconds:g} 秒")
+
+        slots = min(policy.batch_size, policy.max_starting - len(self.starting))
+        if slots <= 0:
+            return Decision(reason=f"{len(self.starting)} 个容器启动中，已达到上限 {policy.max_starting}")
+
+        sample = self.host.sample()
+        busy = self._host_busy(sample)
+        if busy:
+            return Decision(reason=busy)
+        if policy.memory_per_bot_mb > 0:
+            slots = min(slots, int((sample.memory_available_mb - policy.min_memory_mb) // policy.memory_per_bot_mb))
+
+        # 与启动中的机器人（以及同一批中已选中的机器人）共用代理或 API key 的机器人留到之后启动
+        proxies = {bot.proxy_id for bot, _ in self.starting.values() if bot.proxy_id}
+        keys = {bot.key_id for bot, _ in self.starting.values() if bot.key_id}
+        batch = []
+        for bot in self.pending:
+            if len(batch) >= slots:
+                break
+            if bot.proxy_id in proxies or bot.key_id in keys:
+                continue
+            batch.append(bot)
+            if bot.proxy_id:
+                proxies.add(bot.proxy_id)
+            if bot.key_id:
+                keys.add(bot.key_id)
+
+        if not batch:
+            return Decision(reason="剩余的机器人与启动中的机器人共用代理或 API key")
+        return Decision(batch)
+
+    def mark_launched(self, bots: List[LaunchBot], now: float):
+        names = {bot.name for bot in bots}
+        self.pending = [bot for bot in self.pending if bot.name not in names]
+        for bot in bots:
+            self.starting[bot.name] = (bot, now)
+        self.last_launch = now
+
+    def mark_failed(self, bot: LaunchBot, reason: str):
+        """启动命令本身失败（例如 tmux 不可用）"""
+        self.starting.pop(bot.name, None)
+        self.failed.append((bot.name, reason))
+
+
+def run_schedule(scheduler: LaunchScheduler, launch, clock=time.time, sleep=time.sleep, poll_seconds: float = 5.0,
+                 log=print):
+    """按调度决策启动所有机器人，直到全部稳定或失败；launch(bot) 执行启动命令，失败时抛出异常"""
+    started = clock()
+    last_reason = None
+    while True:
+        now = clock()
+        for name, outcome in scheduler.update(now):
+            if outcome == 'settled':
+                log(f"[{now - started:6.0f}s] 已稳定: {name}")
+            else:
+                log(f"[{now - started:6.0f}s] 失败: {name}（{outcome}）")
+
+        decision = scheduler.decide(now)
+        if decision.done:
+            break
+        if decision.bots:
+            scheduler.mark_launched(decision.bots, now)
+            for bot in decision.bots:
+                try:
+                    launch(bot)
+                except (OSError, subprocess.SubprocessError) as e:
+                    scheduler.mark_failed(bot, f"启动命令失败: {e}")
+            log(f"[{now - started:6.0f}s] 启动: {' '.join(bot.name for bot in decision.bots)}"
+                f"（启动中 {len(scheduler.starting)}，剩余 {len(scheduler.pending)}）")
+            last_reason = None
+        elif decision.reason != last_reason:
+            log(f"[{now - started:6.0f}s] 等待: {decision.reason}")
+            last_reason = decision.reason
+        sleep(poll_seconds)
+
+    log(f"完成：{len(scheduler.settled)} 个机器人已稳定，{len(scheduler.failed)} 个失败，"
+        f"用时 {clock() - started:.0f} 秒")
+    for name, reason in scheduler.failed:
+        log(f"  失败: {name}（{reason}）")
+    return scheduler
+
+
+# ========== 服务器上的 docker / 主机指标 / tmux ==========
+
+def parse_docker_time(value: str) -> Optional[float]:
+    """解析 docker 的 RFC3339 时间（例如 2024-05-01T12:34:56.123456789Z），未启动过的容器为 0001 年"""
+    if not value or value.startswith('0001-'):
+        return None
+    try:
+        seconds = datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+    # 小数秒（最多纳秒），与启动时间比较时需要
+    fraction = value[19:].rstrip('Z')
+    if fraction.startswith('.') and fraction[1:].isdigit():
+        seconds += float(f"0{fraction}")
+    return seconds
+
+
+class DockerStates:
+    """通过 docker inspect 一次读取多个容器的状态"""
+
+    FORMAT = '{{.Name}}\t{{.State.Status}}\t{{.State.StartedAt}}\t{{.RestartCount}}'
+
+    def states(self, names: List[str]) -> Dict[str, ContainerState]:
+        # 部分容器还不存在时 docker inspect 返回非零，但仍会输出存在的容器
+        result = subprocess.run(['docker', 'inspect', '--format', self.FORMAT, *names],
+                                capture_output=True, text=True)
+        states = {}
+        for line in result.stdout.splitlines():
+            fields = line.split('\t')
+            if len(fields) != 4:
+                continue
+            name, status, started_at, restart_count = fields
+            states[name.lstrip('/')] = ContainerState(
+                status, parse_docker_time(started_at), int(restart_count) if restart_count.isdigit() else 0)
+        return states
+
+
+def running_containers() -> set:
+    result = subprocess.run(['docker', 'ps', '--format', '{{.Names}}'], capture_output=True, text=True)
+    return set(result.stdout.split())
+
+
+class HostMetrics:
+    """从 /proc 读取主机指标，CPU 使用率为两次采样之间的平均值"""
+
+    def __init__(self):
+        self.cpu_count = os.cpu_count() or 1
+        self._cpu_times = self._read_cpu_times()
+
+    @staticmethod
+    def _read_cpu_times():
+        with open('/proc/stat', 'r') as f:
+            values = [int(value) for value in f.readline().split()[1:]]
+        # user nice system idle iowait irq softirq steal ...
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        return sum(values[:8]), idle
+
+    def sample(self) -> HostSample:
+        with open('/proc/loadavg', 'r') as f:
+            load1 = float(f.read().split()[0])
+
+        total, idle = self._read_cpu_times()
+        last_total, last_idle = self._cpu_times
+        self._cpu_times = (total, idle)
+        elapsed = total - last_total
+        cpu_percent = 100.0 * (elapsed - (idle - last_idle)) / elapsed if elapsed > 0 else 0.0
+
+        memory_available_mb = 0.0
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    memory_available_mb = int(line.split()[1]) / 1024
+                    break
+        return HostSample(load1 / self.cpu_count, cpu_percent, memory_available_mb)
+
+
+class TmuxLauncher:
+    """与 start-bot.sh 相同：每个机器人一个 tmux 窗口，在窗口中 docker compose up 后 attach"""
+
+    def __init__(self, session: str):
+        self.session = session
+        self._session_checked = False
+
+    def __call__(self, bot: LaunchBot):
+        if not self._session_checked:
+            # session 不存在时创建一个新的
+            if subprocess.run(['tmux', 'has-session', '-t', self.session], capture_output=True).returncode != 0:
+                subprocess.run(['tmux', 'new-session', '-d', '-s', self.session], check=True)
+            self._session_checked = True
+        windows = subprocess.run(['tmux', 'list-windows', '-t', self.session, '-F', '#{window_name}'],
+                                 capture_output=True, text=True, check=True).stdout.split()
+        if bot.name not in windows:
+            subprocess.run(['tmux', 'new-window', '-d', '-t', f"{self.session}:", '-n', bot.name], check=True)
+        compose = 'docker compose'
+        if bot.compose_file and bot.compose_file != DEFAULT_COMPOSE_FILE:
+            compose += f" -f {bot.compose_file}"
+        subprocess.run(['tmux', 'send-keys', '-t', f"{self.session}:{bot.name}",
+                        f"cd ~/ex-bot && {compose} up {bot.name} -d && docker attach {bot.name}", 'C-m'],
+                       check=True)
+
+
+# ========== 模拟的 docker 和主机（用于测试调度逻辑） ==========
+
+class FakeClock:
+    """模拟时钟：sleep 只推进时间"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class FakeDocker:
+    """
+    模拟容器：launch 后 boot_seconds 秒进入 running
+    crashing 中的机器人运行 crash_after 秒后退出，hanging 中的机器人一直停留在 created
+    """
+
+    def __init__(self, clock, boot_seconds: float = 10.0, crashing=(), crash_after: float = 5.0, hanging=()):
+        self.clock = clock
+        self.boot_seconds = boot_seconds
+        self.crashing = set(crashing)
+        self.crash_after = crash_after
+        self.hanging = set(hanging)
+        self.launched: Dict[str, float] = {}
+
+    def launch(self, bot: LaunchBot):
+        self.launched[bot.name] = self.clock()
+
+    def states(self, names: List[str]) -> Dict[str, ContainerState]:
+        now = self.clock()
+        states = {}
+        for name in names:
+            launched = self.launched.get(name)
+            if launched is None:
+                continue
+            started_at = launched + self.boot_seconds
+            if name in self.hanging or now < started_at:
+                states[name] = ContainerState('created')
+            elif name in self.crashing and now >= started_at + self.crash_after:
+                states[name] = ContainerState('exited', started_at)
+            else:
+                states[name] = ContainerState('running', started_at)
+        return states
+
+
+class FakeHost:
+    """
+    模拟主机指标：启动后 warmup_seconds 秒内的容器各增加 load_per_starting 的负载和 cpu_per_starting 的 CPU，
+    每个已启动的容器占用 memory_per_bot_mb 内存
+    """
+
+    def __init__(self, docker: FakeDocker, cpus: int = 4, base_load: float = 0.2, load_per_starting: float = 1.0,
+                 cpu_per_starting: float = 15.0, warmup_seconds: float = 40.0, memory_mb: float = 16384.0,
+                 memory_per_bot_mb: float = 300.0):
+        self.docker = docker
+        self.cpus = cpus
+        self.base_load = base_load
+        self.load_per_starting = load_per_starting
+        self.cpu_per_starting = cpu_per_starting
+        self.warmup_seconds = warmup_seconds
+        self.memory_mb = memory_mb
+        self.memory_per_bot_mb = memory_per_bot_mb
+
+    def sample(self) -> HostSample:
+        now = self.docker.clock()
+        warming = sum(1 for launched in self.docker.launched.values() if now - launched < self.warmup_seconds)
+        load = self.base_load + warming * self.load_per_starting
+        return HostSample(load / self.cpus, min(100.0, 5.0 + warming * self.cpu_per_starting),
+                          self.memory_mb - len(self.docker.launched) * self.memory_per_bot_mb)
+
+
+# ========== 命令行 ==========
+
+def read_services_index(path: str) -> List[LaunchBot]:
+    """读取 services.tsv（第一行为列名，旧版本没有 proxy_id / key_id 列）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        columns = f.readline().rstrip('\n').split('\t')
+        bots = []
+        for line in f:
+            values = dict(zip(columns, line.rstrip('\n').split('\t')))
+            if values.get('name'):
+                bots.append(LaunchBot(values['name'], values.get('compose_file', ''),
+                                      values.get('proxy_id', ''), values.get('key_id', '')))
+    return bots
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="按容器状态和主机负载自适应地分批启动机器人")
+    parser.add_argument('bots', nargs='*', help="要启动的机器人（默认 services.tsv 中所有未运行的机器人）")
+    parser.add_argument('--services', default=os.path.join(EX_BOT_DIR, SERVICES_INDEX_FILE),
+                        help="服务索引文件（默认 ~/ex-bot/services.tsv）")
+    parser.add_argument('--session', default='bot', help="tmux session（默认 bot）")
+    parser.add_argument('--no-shuffle', action='store_true', help="按给定顺序启动（默认随机化启动顺序）")
+    parser.add_argument('--batch-size', type=int, default=2, help="每批最多启动的机器人数（默认 2）")
+    parser.add_argument('--max-starting', type=int, default=3, help="同时处于启动中的机器人上限（默认 3）")
+    parser.add_argument('--settle', type=float, default=30.0, help="容器连续运行多少秒算稳定（默认 30）")
+    parser.add_argument('--max-wait', type=float, default=300.0, help="等待一个容器稳定的最长时间（秒，默认 300）")
+    parser.add_argument('--min-interval', type=float, default=5.0, help="两批之间的最短间隔（秒，默认 5）")
+    parser.add_argument('--max-load', type=float, default=0.85, help="每核 1 分钟平均负载上限（默认 0.85）")
+    parser.add_argument('--max-cpu', type=float, default=85.0, help="CPU 使用率上限（%%，默认 85）")
+    parser.add_argument('--min-memory', type=float, default=512.0, help="需要保留的可用内存（MB，默认 512）")
+    parser.add_argument('--memory-per-bot', type=float, default=300.0, help="预估每个机器人的内存（MB，默认 300）")
+    parser.add_argument('--poll', type=float, default=5.0, help="检查容器状态的间隔（秒，默认 5）")
+    parser.add_argument('--dry-run', action='store_true', help="只输出机器人列表、主机指标和当前的启动决策")
+    return parser.parse_args(argv)
+
+
+def policy_from_args(args) -> LaunchPolicy:
+    return LaunchPolicy(batch_size=args.batch_size, max_starting=args.max_starting, settle_seconds=args.settle,
+                        max_wait_seconds=args.max_wait, min_interval_seconds=args.min_interval,
+                        max_load_per_cpu=args.max_load, max_cpu_percent=args.max_cpu,
+                        min_memory_mb=args.min_memory, memory_per_bot_mb=args.memory_per_bot)
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.services):
+        print(f"错误: 找不到服务索引 {args.services}，请使用新版 prepare.py 生成并重新部署，或使用 start-bot.sh --fixed")
+        sys.exit(1)
+
+    services = read_services_index(args.services)
+    if args.bots:
+        by_name = {bot.name: bot for bot in services}
+        unknown = [name for name in args.bots if name not in by_name]
+        if unknown:
+            print(f"错误: services.tsv 中没有这些机器人: {' '.join(unknown)}")
+            sys.exit(1)
+        bots = [by_name[name] for name in args.bots]
+    else:
+        running = running_containers()
+        bots = [bot for bot in services if bot.name not in running]
+        if not args.no_shuffle:
+            random.shuffle(bots)
+    if not bots:
+        print("所有机器人均已在运行，没有需要启动的机器人")
+        return
+
+    scheduler = LaunchScheduler(bots, policy_from_args(args), DockerStates(), HostMetrics())
+    if args.dry_run:
+        sample = scheduler.host.sample()
+        print(f"待启动 {len(bots)} 个机器人: {' '.join(bot.name for bot in bots)}")
+        print(f"主机指标: 每核负载 {sample.load_per_cpu:.2f}，CPU {sample.cpu_percent:.0f}%，"
+              f"可用内存 {sample.memory_available_mb:.0f}MB")
+        decision = scheduler.decide(time.time())
+        if decision.bots:
+            print(f"现在会启动: {' '.join(bot.name for bot in decision.bots)}")
+        else:
+            print(f"现在会等待: {decision.reason}")
+        return
+
+    print(f"自适应启动 {len(bots)} 个机器人（每批最多 {args.batch_size} 个，同时启动中最多 {args.max_starting} 个）")
+    scheduler = run_schedule(scheduler, TmuxLauncher(args.session), poll_seconds=args.poll)
+    sys.exit(1 if scheduler.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+机器人日志扫描（在服务器上运行，只依赖标准库）
+统计 ~/ex-bot/logs/<机器人>/ 下日志中的错误、警告、成交和断线次数（每个机器人的日志目录由 compose 挂载）：
+- 每个文件记录已读取到的位置（按 inode 识别），再次运行只读取新增的部分；没有变化的文件只需一次 stat
+- 日志轮转（改名后新建文件）时改名的文件从原来的位置继续，新文件从头读取，不会重复统计；
+  文件被截断（copytruncate）或被替换时从头读取
+- 使用 mmap 读取，多个文件（以及大文件按行切分的多个分段）在多个进程中并行统计
+- 统计结果累计保存在状态文件中，输出每个机器人的汇总表或 JSON；--follow 持续输出新增的事件
+
+统计规则按 HummingBot 的日志格式（"时间 - PID - 模块 - 级别 - 消息"），成交和断线为关键字匹配，
+可以用 --pattern 名称=正则表达式 修改或增加
+
+用法：
+   python3 ~/log_scanner.py                       # 扫描 ~/ex-bot/logs，输出汇总表
+   python3 ~/log_scanner.py --json                # JSON 格式输出
+   python3 ~/log_scanner.py --bots bot1 bot2      # 只扫描指定的机器人
+   python3 ~/log_scanner.py --follow              # 每隔几秒扫描一次，输出新增的事件
+   python3 ~/log_scanner.py --reset               # 丢弃已保存的位置和统计，从头扫描
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from launch_scheduler import EX_BOT_DIR
+
+STATE_FILE = '.log_scanner_state.json'
+STATE_VERSION = 1
+
+# 名称 -> (显示名, 正则表达式)，一行匹配其中任意一个即计一次
+# 以字面量开头的正则表达式比分支或忽略大小写快一个数量级，关键字省略首字母以同时匹配大小写（isconnect -> Disconnect）
+DEFAULT_PATTERNS = {
+    'error': ('错误', (r' - ERROR - ', r' - CRITICAL - ')),
+    'warning': ('警告', (r' - WARNING - ',)),
+    'fill': ('成交', (r' filled\b', r'OrderFilled')),
+    'disconnect': ('断线', (r'isconnect', r'onnection (?:closed|lost|reset)', r'econnect')),
+}
+
+# 压缩的轮转日志是已经统计过的内容，不再读取
+SKIPPED_SUFFIXES = ('.gz', '.bz2', '.xz', '.zip')
+# 识别文件是否被替换时比较的开头字节数
+HEAD_BYTES = 256
+# 大于该大小的文件按行切分成多个分段并行统计
+CHUNK_BYTES = 32 * 1024 * 1024
+# 需要读取的总字节数小于该值时在当前进程中统计，避免启动进程的开销
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+LAST_ERROR_CHARS = 200
+
+_compiled = {}
+
+
+def compile_patterns(patterns: Dict[str, Tuple[str, Tuple[str, ...]]]):
+    key = tuple(sorted((name, tuple(regexes)) for name, (_, regexes) in patterns.items()))
+    if key not in _compiled:
+        _compiled[key] = [(name, [re.compile(regex.encode('utf-8')) for regex in regexes]) for name, regexes in key]
+    return _compiled[key]
+
+
+def matching_lines(mm, regexes, begin: int, end: int) -> set:
+    """[begin, end) 中匹配任意一个正则表达式的行的开头位置；匹配后跳到下一行，一行只计一次"""
+    lines = set()
+    for regex in regexes:
+        position = begin
+        while position < end:
+            match = regex.search(mm, position, end)
+            if match is None:
+                break
+            lines.add(mm.rfind(b'\n', begin, match.start()) + 1 or begin)
+            position = mm.find(b'\n', match.end() - 1 if match.end() > match.start() else match.end(), end) + 1
+            if position <= 0:
+                break
+    return lines
+
+
+def scan_range(path: str, start: int, stop: Optional[int], first: bool, patterns) -> dict:
+    """
+    统计文件中从 start 开始、到 stop 为止开始的完整行（stop 为 None 时到最后一个换行符）
+    first 为 False 时 start 可能在一行中间，从下一行开始（该行属于上一个分段）
+    返回 {'end': 统计到的位置, 'counts': {名称: 行数}, 'last_error': 最后一条错误, 'error': 读取失败的原因}
+    """
+    result = {'end': start, 'counts': {}, 'last_error': '', 'error': ''}
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= start:
+                return result
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                begin = start if first else mm.find(b'\n', start - 1) + 1
+                last_line_end = mm.rfind(b'\n', 0, size) + 1
+                if stop is None or stop >= size:
+                    end = last_line_end
+                else:
+                    end = mm.find(b'\n', stop - 1) + 1 or last_line_end
+                if (not first and begin == 0) or end <= begin:
+                    # 没有在这个分段中开始的完整行
+                    result['end'] = start if first else 0
+                    return result
+                for name, regexes in compile_patterns(patterns):
+                    lines = matching_lines(mm, regexes, begin, end)
+                    result['counts'][name] = len(lines)
+                    if name == 'error' and lines:
+                        line_start = max(lines)
+                        line_end = mm.find(b'\n', line_start, end)
+                        line = mm[line_start:line_end if line_end >= 0 else end]
+                        result['last_error'] = line.decode('utf-8', 'replace').strip()[:LAST_ERROR_CHARS]
+                result['end'] = end
+    except (OSError, ValueError) as e:
+        result['error'] = str(e)
+    return result
+
+
+def _scan_task(task):
+    return scan_range(*task)
+
+
+def file_head(path: str) -> str:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read(HEAD_BYTES)).hexdigest()
+    except OSError:
+        return ''
+
+
+class LogScanner:
+    """
+    扫描 logs_dir 下每个机器人目录中的日志文件
+    state 为上一次保存的状态：{'files': {相对路径: {'dev', 'ino', 'offset', 'head'}}, 'bots': {机器人: 统计}}
+    """
+
+    def __init__(self, logs_dir: str, patterns: Dict[str, Tuple[str, Tuple[str, ...]]] = None, state: dict = None,
+                 jobs: int = None):
+        self.logs_dir = logs_dir
+        self.patterns = patterns or dict(DEFAULT_PATTERNS)
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        state = state if state and state.get('version') == STATE_VERSION else {}
+        self.files = state.get('files', {})
+        self.bots = state.get('bots', {})
+
+    def state(self) -> dict:
+        return {'version': STATE_VERSION, 'files': self.files, 'bots': self.bots}
+
+    def bot_names(self) -> List[str]:
+        try:
+            entries = sorted(os.scandir(self.logs_dir), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return []
+        return [entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
+
+    def _log_files(self, bot: str):
+        """(相对路径, 绝对路径, stat)，按修改时间排序（轮转出的旧文件在前）"""
+        files = []
+        try:
+            entries = list(os.scandir(os.path.join(self.logs_dir, bot)))
+        except OSError:
+            return files
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name.endswith(SKIPPED_SUFFIXES) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            files.append((f"{bot}/{entry.name}", entry.path, stat))
+        files.sort(key=lambda item: (item[2].st_mtime, item[0]))
+        return files
+
+    def _start_offset(self, relative: str, path: str, stat, by_inode: Dict[tuple, dict]) -> Tuple[int, str]:
+        """继续读取的位置和文件开头的摘要；新文件、被截断或被替换的文件从 0 开始"""
+        entry = self.files.get(relative)
+        if entry is None or (entry['dev'], entry['ino']) != (stat.st_dev, stat.st_ino):
+            # 轮转时改名的文件：按 inode 找到原来的记录
+            entry = by_inode.get((stat.st_dev, stat.st_ino))
+        if entry is None or stat.st_size < entry['offset']:
+            return 0, ''
+        if entry['offset'] == stat.st_size:
+            return entry['offset'], entry['head']
+        head = file_head(path)
+        if entry['head'] and head != entry['head'] and entry['offset'] >= HEAD_BYTES:
+            return 0, head
+        return entry['offset'], head
+
+    def scan(self, bots: List[str] = None) -> dict:
+        """
+        扫描一次，更新状态，返回 {'bots': {机器人: 本次新增的统计}, 'files': 读取的文件数, 'bytes': 读取的字节数,
+        'errors': [读取失败的文件]}
+        """
+        bots = bots if bots is not None else self.bot_names()
+        by_inode = {(entry['dev'], entry['ino']): entry for entry in self.files.values()}
+        files = {}
+        tasks = []
+        owners = []
+        total_bytes = 0
+        for bot in bots:
+            for relative, path, stat in self._log_files(bot):
+                offset, head = self._start_offset(relative, path, stat, by_inode)
+                files[relative] = {'dev': stat.st_dev, 'ino': stat.st_ino, 'offset': offset, 'head': head}
+                if stat.st_size <= offset:
+                    continue
+                total_bytes += stat.st_size - offset
+                # 大文件按 CHUNK_BYTES 切分，分段的边界在 scan_range 中对齐到行
+                bounds = list(range(offset, stat.st_size, CHUNK_BYTES)) + [None]
+                for index, (start, stop) in enumerate(zip(bounds, bounds[1:])):
+                    tasks.append((path, start, stop, index == 0, self.patterns))
+                    owners.append((bot, relative))
+
+        if self.jobs > 1 and len(tasks) > 1 and total_bytes >= PARALLEL_MIN_BYTES:
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(tasks))) as executor:
+                results = list(executor.map(_scan_task, tasks, chunksize=max(1, len(tasks) // (self.jobs * 4))))
+        else:
+            results = [_scan_task(task) for task in tasks]
+
+        new = {bot: dict.fromkeys(self.patterns, 0) for bot in bots}
+        errors = []
+        for (bot, relative), result in zip(owners, results):
+            if result['error']:
+                errors.append(f"{relative}: {result['error']}")
+                continue
+            files[relative]['offset'] = max(files[relative]['offset'], result['end'])
+            for name, count in result['counts'].items():
+                new[bot][name] += count
+            if result['last_error']:
+                new[bot]['last_error'] = result['last_error']
+        for relative, entry in files.items():
+            if not entry['head'] and entry['offset']:
+                entry['head'] = file_head(os.path.join(self.logs_dir, relative))
+
+        # 只替换本次扫描的机器人的文件记录，其余机器人的记录保持不变
+        scanned = set(bots)
+        self.files = {relative: entry for relative, entry in self.files.items()
+                      if relative.split('/', 1)[0] not in scanned}
+        self.files.update(files)
+        for bot, counts in new.items():
+            totals = self.bots.setdefault(bot, dict.fromkeys(self.patterns, 0))
+            for name in self.patterns:
+                totals[name] = totals.get(name, 0) + counts[name]
+            if counts.get('last_error'):
+                totals['last_error'] = counts['last_error']
+        return {'bots': new, 'files': len({relative for _, relative in owners}), 'bytes': total_bytes,
+                'errors': errors}
+
+
+def load_state(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path: str, state: dict):
+    """先写临时文件再 rename，中断时不会留下不完整的状态文件"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+# ========== 命令行 ==========
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def display_width(text: str) -> int:
+    """终端显示宽度（中文占两列）"""
+    return sum(2 if ord(char) > 0x2e7f else 1 for char in text)
+
+
+def print_summary(scanner: LogScanner, bots: List[str], new: Dict[str, dict], stats: dict, seconds: float):
+    names = list(scanner.patterns)
+    rows = []
+    totals = dict.fromkeys(names, 0)
+    for bot in bots:
+        counts = scanner.bots.get(bot, {})
+        cells = []
+        for name in names:
+            value = counts.get(name, 0)
+            totals[name] += value
+            added = new.get(bot, {}).get(name, 0)
+            cells.append(f"{value}(+{added})" if added else str(value))
+        rows.append((bot, cells, counts.get('last_error', '')))
+    labels = [scanner.patterns[name][0] for name in names]
+    total_cells = [str(totals[name]) for name in names]
+    width = max([len(bot) for bot in bots] + [6])
+    widths = [max([display_width(label), len(total)] + [len(cells[index]) for _, cells, _ in rows]) + 2
+              for index, (label, total) in enumerate(zip(labels, total_cells))]
+
+    def line(name: str, cells: List[str], tail: str = '') -> str:
+        text = name + ' ' * (width - display_width(name))
+        text += ''.join(' ' * (column - display_width(cell)) + cell for cell, column in zip(cells, widths))
+        return f"{text}  {tail}".rstrip()
+
+    print(line('机器人', labels, '最近的错误'))
+    print("=" * (width + sum(widths) + 12))
+    for bot, cells, last_error in rows:
+        print(line(bot, cells, last_error))
+    print("=" * (width + sum(widths) + 12))
+    print(line('总计', total_cells))
+    print(f"扫描 {len(bots)} 个机器人，读取 {stats['files']} 个文件 {format_size(stats['bytes'])}，用时 {seconds:.2f}s"
+          f"（括号中为本次新增）")
+
+
+def print_events(new: Dict[str, dict], patterns):
+    """--follow：输出有新增事件的机器人"""
+    now = time.strftime('%H:%M:%S')
+    for bot, counts in new.items():
+        parts = [f"+{counts[name]} {patterns[name][0]}" for name in patterns if counts.get(name)]
+        if parts:
+            line = f"[{now}] {bot}: {' '.join(parts)}"
+            if counts.get('last_error'):
+                line += f"  {counts['last_error']}"
+            print(line, flush=True)
+
+
+def parse_pattern(value: str):
+    name, sep, regex = value.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"应为 名称=正则表达式: {value}")
+    try:
+        re.compile(regex)
+    except re.error as e:
+        raise argparse.ArgumentTypeError(f"无效的正则表达式 {regex}: {e}")
+    return name, regex
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="增量统计机器人日志中的错误、警告、成交和断线")
+    parser.add_argument('--logs', default=os.path.join(EX_BOT_DIR, 'logs'), help="日志目录（默认 ~/ex-bot/logs）")
+    parser.add_argument('--bots', nargs='+', default=None, help="只扫描这些机器人（默认所有机器人目录）")
+    parser.add_argument('--state', default=None, help=f"状态文件（默认 <日志目录>/{STATE_FILE}）")
+    parser.add_argument('--pattern', action='append', type=parse_pattern, default=[],
+                        help="修改或增加统计规则：名称=正则表达式（可以多次指定）")
+    parser.add_argument('--jobs', type=int, default=None, help="并行的进程数（默认 CPU 核数）")
+    parser.add_argument('--json', action='store_true', help="以 JSON 格式输出")
+    parser.add_argument('--follow', action='store_true', help="持续扫描，输出新增的事件（Ctrl-C 退出）")
+    parser.add_argument('--interval', type=float, default=2.0, help="--follow 时的扫描间隔（秒，默认 2）")
+    parser.add_argument('--reset', action='store_true', help="丢弃已保存的位置和统计，从头扫描")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.logs):
+        print(f"错误: 日志目录不存在: {args.logs}")
+        sys.exit(1)
+    state_path = args.state or os.path.join(args.logs, STATE_FILE)
+    patterns = dict(DEFAULT_PATTERNS)
+    for name, regex in args.pattern:
+        patterns[name] = (patterns[name][0] if name in patterns else name, (regex,))
+
+    state = {} if args.reset else load_state(state_path)
+    pattern_state = {name: list(regexes) for name, (_, regexes) in patterns.items()}
+    if state.get('patterns') not in (None, pattern_state):
+        # 统计规则变化后累计的结果不再可比，从头扫描
+        print("统计规则已变化，从头扫描", file=sys.stderr)
+        state = {}
+    scanner = LogScanner(args.logs, patterns, state, args.jobs)
+
+    def scan_once():
+        started = time.perf_counter()
+        bots = args.bots or scanner.bot_names()
+        stats = scanner.scan(bots)
+        saved = scanner.state()
+        saved['patterns'] = pattern_state
+        save_state(state_path, saved)
+        for error in stats['errors']:
+            print(f"⚠️  无法读取 {error}", file=sys.stderr)
+        return bots, stats, time.perf_counter() - started
+
+    bots, stats, seconds = scan_once()
+    if args.json:
+        print(json.dumps({'bots': {bot: scanner.bots.get(bot, {}) for bot in bots},
+                          'new': stats['bots'], 'files': stats['files'], 'bytes': stats['bytes'],
+                          'seconds': round(seconds, 3)}, indent=2, ensure_ascii=False))
+    else:
+        print_summary(scanner, bots, stats['bots'], stats, seconds)
+
+    if args.follow:
+        try:
+            while True:
+                time.sleep(args.interval)
+                _, stats, _ = scan_once()
+                if args.json:
+                    changed = {bot: counts for bot, counts in stats['bots'].items() if any(counts.values())}
+                    if changed:
+                        print(json.dumps({'time': time.time(), 'new': changed}, ensure_ascii=False), flush=True)
+                else:
+                    print_events(stats['bots'], patterns)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+生成文件清单模块
+记录 prepare.py 生成的每个文件（相对路径、sha256、大小、来源CSV行和模板）
+内容未变化的文件不再重写，保持 mtime 不变，减少 rsync 的传输和校验量
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """分块计算文件的SHA256哈希值"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# mkstemp 创建的临时文件权限为 0600，替换前改为普通文件的默认权限
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def write_atomic(path: str, data: bytes):
+    """
+    先在同一目录下写唯一命名的临时文件再替换，避免改写硬链接共享的内容
+    多个线程同时写同一路径时各自使用自己的临时文件，失败时删除临时文件
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f".{os.path.basename(path)}.",
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_path)
+        raise
+
+
+class OutputManifest:
+    """
+    生成文件清单
+    entries: 相对路径 -> {'sha256', 'size', 'row', 'template'}
+    """
+
+    def __init__(self, root: str, manifest_path: str, entries: Optional[Dict[str, dict]] = None):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, dict] = entries or {}
+        self.reset_counters()
+        # 为 True 时不信任清单，跳过写入前会重新计算磁盘文件的哈希
+        self.verify_content = False
+        # 设置为 ParallelWriter 时写入任务提交到线程池，否则同步写入
+        self.writer = None
+
+    def reset_counters(self):
+        """开始新一次生成前重置本次运行的统计（watch 模式下清单对象会跨周期复用）"""
+        self.produced = set()  # 本次运行生成（写入或确认未变化）的文件
+        self.written = 0
+        self.suppressed = 0
+        self.bytes_written = 0  # 实际写入磁盘的字节数（硬链接不计）
+
+    @classmethod
+    def load(cls, root: str, manifest_path: str) -> 'OutputManifest':
+        """加载清单文件，不存在或无法解析时返回空清单"""
+        entries = {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    entries = data.get('files', {})
+            except Exception:
+                pass
+        return cls(root, manifest_path, entries)
+
+    def relpath(self, path: str) -> str:
+        """转换为相对于配置文件夹的路径（统一使用 / 分隔）"""
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def is_current(self, path: str, digest: str, size: int) -> bool:
+        """清单中记录的内容与新内容相同，且磁盘上的文件大小一致"""
+        entry = self.entries.get(self.relpath(path))
+        if not entry or entry.get('sha256') != digest or entry.get('size') != size:
+            return False
+        try:
+            if os.path.getsize(path) != size:
+                return False
+            return not self.verify_content or file_sha256(path) == digest
+        except OSError:
+            return False
+
+    def record(self, path: str, digest: str, size: int, row: str = None, template: str = None):
+        """记录一个生成文件"""
+        rel = self.relpath(path)
+        self.entries[rel] = {'sha256': digest, 'size': size, 'row': row, 'template': template}
+        self.produced.add(rel)
+
+    def forget(self, path: str):
+        """删除路径（或目录下所有路径）对应的清单条目"""
+        rel = self.relpath(path)
+        prefix = rel + '/'
+        for key in [key for key in self.entries if key == rel or key.startswith(prefix)]:
+            del self.entries[key]
+            self.produced.discard(key)
+
+    def discard(self, paths: Iterable[str]):
+        """移除写入失败的文件的清单条目，下次运行会重新写入"""
+        for path in paths:
+            rel = self.relpath(path)
+            if self.entries.pop(rel, None) is not None:
+                self.written -= 1
+            self.produced.discard(rel)
+
+    def write_file(self, path: str, content, row: str = None, template: str = None) -> bool:
+        """
+        写入生成文件，内容与清单记录相同时跳过写入
+        Returns:
+            是否需要写入文件（使用 writer 时写入在后台完成）
+        """
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+
+        if self.is_current(path, digest, len(data)):
+            self.record(path, digest, len(data), row, template)
+            self.suppressed += 1
+            return False
+
+        # 先记录清单，写入失败时由调用方通过 discard 移除
+        if self.writer is not None:
+            self.writer.submit(path, write_atomic, path, data)
+        else:
+            write_atomic(path, data)
+
+        self.record(path, digest, len(data), row, template)
+        self.written += 1
+        self.bytes_written += len(data)
+        return True
+
+    def save(self):
+        """保存清单，已不存在的文件会被移除"""
+        self.entries = {
+            rel: entry for rel, entry in self.entries.items()
+            if os.path.exists(os.path.join(self.root, rel))
+        }
+        data = json.dumps({'version': MANIFEST_VERSION, 'files': self.entries}, indent=2, sort_keys=True)
+        write_atomic(self.manifest_path, data.encode('utf-8'))
+
+    def check(self, tracked_dirs: Iterable[str] = ()) -> Tuple[List[str], List[str], List[str]]:
+        """
+        按清单校验磁盘上的文件（不做任何渲染）
+        Args:
+            tracked_dirs: 需要检查多余文件的目录（相对路径，如 'conf'）
+        Returns:
+            (缺失的文件, 内容不一致的文件, 清单之外的文件)
+        """
+        missing, modified = [], []
+        for rel, entry in sorted(self.entries.items()):
+            path = os.path.join(self.root, rel)
+            try:
+                if os.path.getsize(path) != entry.get('size') or file_sha256(path) != entry.get('sha256'):
+                    modified.append(rel)
+            except OSError:
+                missing.append(rel)
+
+        untracked = []
+        for tracked_dir in tracked_dirs:
+            for dirpath, _, filenames in os.walk(os.path.join(self.root, tracked_dir)):
+                for filename in filenames:
+                    rel = self.relpath(os.path.join(dirpath, filename))
+                    if rel not in self.entries:
+                        untracked.append(rel)
+
+        return missing, modified, sorted(untracked)
@@ -15,7 +15,7 @@ HummingBot 配置生成器 v2策略 - 使用指南
 
 2. 准备 strategy.csv 文件 - 包含 v2 策略详细配置
    必需列：market, version
-   可选列：amount, buy_spreads, sell_spreads, buy_amounts_pct, sell_amounts_pct 等
+   可选列：amount, buy_spreads, sell_spreads, buy_amounts_pct, sell_amounts_pct, bots（分配给哪些机器人）等
    注意：controllers 固定为 pmm_dynamic，scripts 固定为 market_making.pmm_dynamic_scripts
    示例：
    market,version,amount,buy_spreads
@@ -43,12 +43,26 @@ HummingBot 配置生成器 v2策略 - 使用指南
    - python prepare.py ads_31  # 使用 ads_31 文件夹下的配置
    - python prepare.py ads_32  # 使用 ads_32 文件夹下的配置
    - python prepare.py         # 使用当前目录下的配置
+   - python prepare.py ads_31 --jobs 8  # 使用8个进程并行加密凭证
+   - python prepare.py ads_31 --check   # 按生成清单校验已生成的文件（不重新生成）
+   - python prepare.py ads_31 --watch   # 常驻监听CSV和模板变化，自动增量重新生成
+   - python prepare.py ads_31 --timings # 输出各阶段耗时的JSON报告
+   - python prepare.py ads_31 --profile # 使用 cProfile 运行，保存 prepare.pstats
+   - python prepare.py --all            # 并行处理所有包含 bots.csv 的配置文件夹
+   - python prepare.py --folders ads_31,ads_32  # 并行处理指定的配置文件夹
+   - python prepare.py ads_31 --bundle  # 另外生成去重压缩的部署包 bundle.tar.xz
 
 🔧 特性：
-- 智能文件变化检测（SHA256哈希）
+- 智能文件变化检测（SHA256哈希，包含 templates/ 下的模板文件）
+- 行级增量生成：只重新生成变化的机器人/策略对应的文件（--full 强制全量）
 - 自动生成机器人配置
 - 双重策略文件系统（controllers + scripts）
+- 策略只分发到引用它的机器人（script_config / config_file_name 或策略行的 bots 列），--assign-all 恢复全部分发
 - 🆕 自动connector凭证配置（HummingBot标准加密）
+- 多进程并行凭证加密（--jobs）
+- 线程池批量写入生成文件（--io-threads），写入错误统一汇总报告
+- 已加密凭证缓存，凭证未变化的机器人无需重新加密
+- 部署包（--bundle）：conf/、compose 文件和宿主机脚本打成一个文件，内容相同的文件只保存一份
 - 完整的目录结构创建
 
 📁 输出结构：
@@ -66,6 +80,7 @@ HummingBot 配置生成器 v2策略 - 使用指南
 <配置文件夹>/logs/botX/                    # 日志目录
 <配置文件夹>/data/botX/                    # 数据目录
 <配置文件夹>/docker-compose.override.yml   # Docker Compose 配置
+<配置文件夹>/.manifest.json                # 生成文件清单（路径、sha256、大小、来源CSV行和模板）
 
 🔐 凭证管理：
 - 支持从bots.csv自动读取API凭证
@@ -104,28 +119,55 @@ hummingbot-prepare/
 
 
 
-import csv
+import argparse
+import binascii
+import contextlib
 import os
-import re
 import sys
 import hashlib
+import io
 import shutil
 import json
-import yaml
+import time
+import unicodedata
+from operator import attrgetter
 
 # 添加当前目录到Python路径，以便导入HummingBot模块
 current_dir = os.path.dirname(os.path.abspath(__file__))
 if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
+from bundle_utils import BUNDLE_CODECS, DEFAULT_BUNDLE_CODEC, write_bundle
+from compose_utils import (SERVICES_INDEX_FILE, build_services, is_shard_file_name, render_compose,
+                           render_services_index, split_services)
+from csv_utils import BotRecord, CsvValidationError, StrategyRecord, read_csv_records
+from manifest_utils import OutputManifest, file_sha256, write_atomic
+from template_utils import CompiledTemplate, compile_template, load_compiled_template
+from writer_utils import DEFAULT_WRITER_THREADS, ParallelWriter
+
 # 使用HummingBot标准兼容的加密功能
-try:
-    from crypto_utils import CustomCryptoManager
-    HUMMINGBOT_AVAILABLE = True
-    print("✅ 已加载HummingBot标准兼容加密模块")
-except ImportError:
-    print("❌ 加密模块不可用 - 请安装依赖: pip install -r requirements-crypto.txt")
-    HUMMINGBOT_AVAILABLE = False
+# crypto_utils 依赖 eth_keyfile/eth_account，导入约需1秒，只在真正需要加密时才导入
+_crypto_manager_class = None
+_crypto_import_attempted = False
+
+
+def get_crypto_manager_class():
+    """按需导入HummingBot标准兼容加密模块，不可用时返回 None"""
+    global _crypto_manager_class, _crypto_import_attempted
+    if not _crypto_import_attempted:
+        _crypto_import_attempted = True
+        try:
+            from crypto_utils import CustomCryptoManager
+            _crypto_manager_class = CustomCryptoManager
+            print("✅ 已加载HummingBot标准兼容加密模块")
+        except ImportError:
+            print("❌ 加密模块不可用 - 请安装依赖: pip install -r requirements-crypto.txt")
+    return _crypto_manager_class
+
+
+def hummingbot_available():
+    """加密模块是否可用（首次调用时导入）"""
+    return get_crypto_manager_class() is not None
 
 # 默认文件配置 - 输出到同级目录
 DEFAULT_BOTS_CSV_FILE = 'bots.csv'  # 当前prepare目录下
@@ -134,60 +176,105 @@ DEFAULT_STRATEGY_V1_CSV_FILE = 'strategies-v1.csv'  # v1策略配置
 DEFAULT_YML_FILE = 'docker-compose.override.yml'  # 同级目录下
 DEFAULT_TEMPLATES_DIR = 'templates'  # 当前prepare目录下的templates文件夹
 DEFAULT_HASH_CACHE_FILE = '.csv_hashes.json'  # 当前prepare目录下
+DEFAULT_CREDENTIAL_CACHE_FILE = '.credential_cache.json'  # 已加密凭证缓存
 DEFAULT_CONF_OUTPUT_DIR = 'conf'  # 同级目录下的conf文件夹
 DEFAULT_LOGS_OUTPUT_DIR = 'logs'  # 同级目录下的logs文件夹
 DEFAULT_DATA_OUTPUT_DIR = 'data'  # 同级目录下的data文件夹
+DEFAULT_CONTENT_STORE_DIR = '.conf_store'  # 旧版本的渲染结果内容存储，运行时删除
+DEFAULT_STATE_FILE = '.prepare_state.json'  # 上次生成时各CSV行和模板的哈希，用于增量生成
+DEFAULT_MANIFEST_FILE = '.manifest.json'  # 生成文件清单（路径、sha256、大小、来源）
 
-# 全局变量，将在main函数中根据参数设置
-BOTS_CSV_FILE = DEFAULT_BOTS_CSV_FILE
-STRATEGY_CSV_FILE = DEFAULT_STRATEGY_CSV_FILE
-STRATEGY_V1_CSV_FILE = DEFAULT_STRATEGY_V1_CSV_FILE
-YML_FILE = DEFAULT_YML_FILE
-TEMPLATES_DIR = DEFAULT_TEMPLATES_DIR
-HASH_CACHE_FILE = DEFAULT_HASH_CACHE_FILE
-CONF_OUTPUT_DIR = DEFAULT_CONF_OUTPUT_DIR
-LOGS_OUTPUT_DIR = DEFAULT_LOGS_OUTPUT_DIR
-DATA_OUTPUT_DIR = DEFAULT_DATA_OUTPUT_DIR
+# 哈希缓存只记录修改时间早于此值的文件的 (size, mtime_ns)
+STAT_CACHE_MIN_AGE_NS = 2 * 10**9
 
 SUB_DIRS = ['connectors', 'controllers', 'environment',
             'scripts', 'services', 'strategies']
 
+# 模板文件与生成内容的对应关系，模板变化时只重新生成受影响的文件
+V2_TEMPLATE_FILES = ('pmm_dynamic.yml', 'market_making.pmm_dynamic_scripts.yml',
+                     'default_controllers.yml', 'default_scripts.yml')
+V1_TEMPLATE_FILES = ('perpetual_market_making.yml',)
+
+# 策略模板名称（不含 .yml）
+V2_CONTROLLERS_TEMPLATE = 'pmm_dynamic'
+V2_SCRIPTS_TEMPLATE = 'market_making.pmm_dynamic_scripts'
+V1_STRATEGY_TEMPLATE = 'perpetual_market_making'
+
+# 渲染时由脚本提供、不来自CSV列的模板变量
+SCRIPTS_TEMPLATE_VARIABLES = frozenset({'strategy_file_path'})
+CONNECTOR_TEMPLATE_VARIABLES = frozenset({'encrypted_api_key', 'encrypted_secret_key', 'connector'})
 
-def calculate_file_hash(file_path):
-    """计算文件的SHA256哈希值"""
-    if not os.path.exists(file_path):
+
+def calculate_file_hash(file_path, stat_cache=None, new_stat_cache=None):
+    """
+    计算文件的SHA256哈希值
+    stat_cache 中记录的 (size, mtime_ns) 与文件一致时直接复用上次的哈希，不读取文件内容；
+    new_stat_cache 用于收集本次的 (size, mtime_ns, 哈希)，供下次运行使用
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
         return None
 
-    with open(file_path, 'rb') as f:
-        return hashlib.sha256(f.read()).hexdigest()
+    signature = [stat.st_size, stat.st_mtime_ns]
+    cached = (stat_cache or {}).get(file_path)
+    if cached and cached[:2] == signature:
+        digest = cached[2]
+    else:
+        digest = file_sha256(file_path)
+
+    # mtime 距今过近时不记录：同一时间戳内再次修改且大小不变的情况无法通过 stat 区分
+    if new_stat_cache is not None and time.time_ns() - stat.st_mtime_ns > STAT_CACHE_MIN_AGE_NS:
+        new_stat_cache[file_path] = signature + [digest]
+    return digest
 
 
-def load_hash_cache():
-    """加载哈希值缓存"""
-    if os.path.exists(HASH_CACHE_FILE):
+def load_hash_cache(ctx):
+    """加载哈希值缓存（watch 模式下直接使用内存中的上次结果）"""
+    if ctx.hash_cache is not None:
+        return ctx.hash_cache
+    if os.path.exists(ctx.hash_cache_file):
         try:
-            with open(HASH_CACHE_FILE, 'r') as f:
+            with open(ctx.hash_cache_file, 'r') as f:
                 return json.load(f)
         except:
             pass
     return {}
 
 
-def save_hash_cache(hashes):
+def save_hash_cache(ctx, hashes):
     """保存哈希值缓存"""
-    with open(HASH_CACHE_FILE, 'w') as f:
+    with open(ctx.hash_cache_file, 'w') as f:
         json.dump(hashes, f, indent=2)
+    ctx.hash_cache = hashes
 
 
-def check_files_changed():
-    """检查CSV文件是否发生变化"""
-    current_hashes = {
-        'bots': calculate_file_hash(BOTS_CSV_FILE),
-        'strategy': calculate_file_hash(STRATEGY_CSV_FILE),
-        'strategies_v1': calculate_file_hash(STRATEGY_V1_CSV_FILE)
+def calculate_template_hashes(ctx, stat_cache=None, new_stat_cache=None):
+    """计算模板目录下所有模板文件的哈希值"""
+    if not os.path.isdir(ctx.templates_dir):
+        return {}
+
+    return {
+        name: calculate_file_hash(os.path.join(ctx.templates_dir, name), stat_cache, new_stat_cache)
+        for name in sorted(os.listdir(ctx.templates_dir))
+        if name.endswith('.yml')
     }
 
-    cached_hashes = load_hash_cache()
+
+def check_files_changed(ctx, options=None):
+    """检查CSV文件、模板文件和影响生成结果的选项是否发生变化（先比较 size/mtime，变化的文件才计算哈希）"""
+    cached_hashes = load_hash_cache(ctx)
+    stat_cache = cached_hashes.get('stats', {})
+    new_stat_cache = {}
+
+    current_hashes = {
+        'bots': calculate_file_hash(ctx.bots_csv_file, stat_cache, new_stat_cache),
+        'strategy': calculate_file_hash(ctx.strategy_csv_file, stat_cache, new_stat_cache),
+        'strategies_v1': calculate_file_hash(ctx.strategy_v1_csv_file, stat_cache, new_stat_cache),
+        'templates': calculate_template_hashes(ctx, stat_cache, new_stat_cache),
+        'stats': new_stat_cache,
+        'options': options or {},
+    }
 
     # 如果任一文件不存在，返回变化状态
     if current_hashes['bots'] is None or current_hashes['strategy'] is None:
@@ -197,20 +284,26 @@ def check_files_changed():
     changed = (
         current_hashes['bots'] != cached_hashes.get('bots') or
         current_hashes['strategy'] != cached_hashes.get('strategy') or
-        current_hashes['strategies_v1'] != cached_hashes.get('strategies_v1')
+        current_hashes['strategies_v1'] != cached_hashes.get('strategies_v1') or
+        current_hashes['templates'] != cached_hashes.get('templates') or
+        current_hashes['options'] != cached_hashes.get('options')
     )
 
+    # 内容未变化但 stat 记录有更新（例如文件被 touch 过）时也保存，下次运行即可跳过哈希计算
+    if not changed and new_stat_cache != stat_cache:
+        save_hash_cache(ctx, current_hashes)
+
     return changed, current_hashes
 
 
-def clean_generated_files():
+def clean_generated_files(ctx):
     """清理自动生成的文件和目录"""
     print("检测到文件变化，清理旧配置...")
 
     # 删除 docker-compose.override.yml
-    if os.path.exists(YML_FILE):
-        os.remove(YML_FILE)
-        print(f"已删除: {YML_FILE}")
+    if os.path.exists(ctx.yml_file):
+        os.remove(ctx.yml_file)
+        print(f"已删除: {ctx.yml_file}")
 
     # strategies 目录不再使用，无需清理
     # if os.path.exists('strategies'):
@@ -236,76 +329,26 @@ def clean_generated_files():
                         print(f"已删除目录: {item_path}")
 
 
-def load_template(template_type, strategy_name):
-    """根据策略名加载对应的模板文件"""
-    template_path = os.path.join(TEMPLATES_DIR, f"{strategy_name}.yml")
+def load_template(ctx, template_type, strategy_name):
+    """根据策略名加载对应的已编译模板（按路径和修改时间缓存）"""
+    template_path = os.path.join(ctx.templates_dir, f"{strategy_name}.yml")
 
     if not os.path.exists(template_path):
         # 如果找不到特定策略的模板，尝试使用默认模板
-        template_path = os.path.join(TEMPLATES_DIR, f"default_{template_type}.yml")
+        template_path = os.path.join(ctx.templates_dir, f"default_{template_type}.yml")
         if not os.path.exists(template_path):
             raise FileNotFoundError(f"找不到模板: {strategy_name}.yml 或 default_{template_type}.yml")
 
-    with open(template_path, 'r', encoding='utf-8') as f:
-        return f.read()
-
-
-def render_template(template_content, variables):
-    """使用变量渲染模板内容，支持数组格式转换"""
-    def replace_match(match):
-        var_name = match.group(1)
-        value = variables.get(var_name, match.group(0))
-
-        # 如果变量不存在，保留原占位符
-        if value == match.group(0):
-            return value
-
-        # 检查是否需要转换为YAML数组格式
-        value_str = str(value)
-        # 检查三重引号或包含分隔符的情况
-        if (value_str.startswith('"""') or
-            any(separator in value_str for separator in [',', ';', '|'])):
-            return convert_to_yaml_array(value_str)
-
-        return value_str
+    return load_compiled_template(template_path)
 
-    return re.sub(r'\$\{([^}]+)\}', replace_match, template_content)
 
-
-def convert_to_yaml_array(value_str):
-    """将CSV中的数组字符串转换为YAML数组格式"""
-    # 清理三重引号格式
-    cleaned_value = value_str.strip()
-    if cleaned_value.startswith('"""') and cleaned_value.endswith('"""'):
-        cleaned_value = cleaned_value[3:-3]
-    elif cleaned_value.startswith('"') and cleaned_value.endswith('"'):
-        cleaned_value = cleaned_value[1:-1]
-
-    # 确定分隔符
-    if ',' in cleaned_value:
-        separator = ','
-    elif ';' in cleaned_value:
-        separator = ';'
-    elif '|' in cleaned_value:
-        separator = '|'
-    else:
-        return cleaned_value
-
-    # 分割并清理数据
-    items = [item.strip() for item in cleaned_value.split(separator)]
-
-    # 转换为YAML数组格式
-    yaml_array = '\n'.join(f'- {item}' for item in items if item)
-    return yaml_array
-
-
-def validate_csv_data(data, csv_file_name, required_fields):
-    """验证CSV数据的必要字段"""
-    for i, row in enumerate(data, start=2):  # 从第2行开始（第1行是标题）
-        for field in required_fields:
-            if not row.get(field, '').strip():
-                print(f"错误: {csv_file_name} 第{i}行的'{field}'字段不能为空")
-                sys.exit(1)
+def read_csv_rows(csv_file, record_class, required_fields, allow_empty=False):
+    """单遍读取CSV文件为记录列表（过滤空行、校验必要字段），文件为空且不允许为空或校验失败时退出"""
+    try:
+        return read_csv_records(csv_file, record_class, required_fields, allow_empty)
+    except CsvValidationError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
 
 
 # ========== 凭证管理功能 ==========
@@ -325,13 +368,21 @@ connector: {connector_name}
     return template_content
 
 
+def load_connector_template(ctx, connector):
+    """加载connector模板，返回 (已编译模板, 模板文件名)；没有特定模板时使用自动生成的模板，文件名为 None"""
+    template_path = os.path.join(ctx.templates_dir, f"{connector}_connector.yml")
+    if os.path.exists(template_path):
+        return load_compiled_template(template_path), os.path.basename(template_path)
+    return compile_template(create_connector_config_template(connector)), None
+
+
 def encrypt_credential(password, credential_value):
     """使用自实现的加密系统加密凭证"""
-    if not HUMMINGBOT_AVAILABLE:
+    if not hummingbot_available():
         return credential_value
 
     try:
-        crypto_manager = CustomCryptoManager(password)
+        crypto_manager = get_crypto_manager_class()(password)
         encrypted_value = crypto_manager.encrypt(credential_value)
         return encrypted_value
     except Exception as e:
@@ -339,20 +390,153 @@ def encrypt_credential(password, credential_value):
         return credential_value
 
 
-def generate_connector_configs(bots):
-    """为每个机器人生成connector配置文件"""
-    if not HUMMINGBOT_AVAILABLE:
+def encrypt_bot_credentials(password, api_key, secret_key, work_factor=None):
+    """加密单个机器人的密码验证字符串和API凭证（可在工作进程中执行）
+
+    三个值通过 encrypt_many 共享一次PBKDF2密钥派生，各自使用独立的IV和MAC
+    work_factor 为 None 时使用HummingBot默认的PBKDF2迭代次数
+    """
+    crypto_manager = get_crypto_manager_class()(password)
+    values = ["HummingBot"] + [value for value in (api_key, secret_key) if value]
+    encrypted = iter(crypto_manager.encrypt_many(values, work_factor))
+    encrypted_verification = next(encrypted)
+    encrypted_api_key = next(encrypted) if api_key else ""
+    encrypted_secret_key = next(encrypted) if secret_key else ""
+    return encrypted_verification, encrypted_api_key, encrypted_secret_key
+
+
+def verify_cached_credentials(password, api_key, secret_key, cached):
+    """使用密码校验缓存中的密文（可在工作进程中执行），同一salt只派生一次密钥"""
+    crypto_manager = get_crypto_manager_class()(password)
+    encrypted_verification, encrypted_api_key, encrypted_secret_key = cached
+    if not crypto_manager.validate_password(encrypted_verification):
+        return False
+
+    expected = [(value, encrypted) for value, encrypted in
+                ((api_key, encrypted_api_key), (secret_key, encrypted_secret_key)) if value]
+    decrypted = crypto_manager.decrypt_many([encrypted for _, encrypted in expected])
+    return decrypted == [value for value, _ in expected]
+
+
+def run_in_process_pool(func, tasks, jobs=None):
+    """在进程池中并行执行 func(*task)，按输入顺序返回 (结果, 异常) 列表"""
+    jobs = jobs or os.cpu_count() or 1
+    results = []
+
+    # 单个任务或单进程时直接串行执行，避免进程池开销
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                results.append((func(*task), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor  # 导入较慢，只在需要并行时导入
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        futures = [executor.submit(func, *task) for task in tasks]
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, e))
+    return results
+
+
+def encrypt_all_credentials(tasks, jobs=None):
+    """并行加密所有机器人的凭证，按输入顺序返回 (结果, 异常) 列表"""
+    return run_in_process_pool(encrypt_bot_credentials, tasks, jobs)
+
+
+# ========== 凭证缓存 ==========
+
+def credential_digest(bot_name, connector, password, api_key, secret_key, work_factor=None):
+    """计算凭证缓存的摘要，缓存中只保存摘要，不保存明文
+
+    使用非默认迭代次数加密的密文摘要不同，不会被正常运行复用
+    """
+    digest = hashlib.sha256()
+    parts = (bot_name, connector, password, api_key, secret_key)
+    if work_factor is not None:
+        parts += (f"work_factor={work_factor}",)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def is_keyfile_hex(value):
+    """检查字符串是否为十六进制编码的 v3 keyfile JSON（不做密钥派生）"""
+    try:
+        keyfile = json.loads(binascii.unhexlify(value))
+        return keyfile.get('version') == 3 and 'ciphertext' in keyfile.get('crypto', {})
+    except Exception:
+        return False
+
+
+def load_credential_cache(ctx):
+    """加载已加密凭证缓存"""
+    if os.path.exists(ctx.credential_cache_file):
+        try:
+            with open(ctx.credential_cache_file, 'r') as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return {}
+
+
+def save_credential_cache(ctx, cache):
+    """保存已加密凭证缓存"""
+    with open(ctx.credential_cache_file, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+
+def lookup_cached_credentials(cache, bot_name, digest, api_key, secret_key):
+    """从缓存中查找凭证密文，未命中或缓存内容不完整时返回 None"""
+    entry = cache.get(bot_name)
+    if not entry or entry.get('digest') != digest:
+        return None
+
+    encrypted = (
+        entry.get('password_verification', ''),
+        entry.get('encrypted_api_key', ''),
+        entry.get('encrypted_secret_key', ''),
+    )
+    expected = (True, bool(api_key), bool(secret_key))
+    if tuple(bool(value) and is_keyfile_hex(value) for value in encrypted) != expected:
+        return None
+    return encrypted
+
+
+def generate_connector_configs(ctx, bots, jobs=None, verify_cache=False, targets=None, work_factor=None):
+    """为每个机器人生成connector配置文件
+
+    targets 为机器人名称集合时只重新生成这些机器人，其余机器人保留已有文件和缓存条目
+    work_factor 为PBKDF2迭代次数，None 时使用HummingBot默认值（仅测试和基准时降低）
+    """
+    if not hummingbot_available():
         print("跳过connector配置生成（HummingBot标准加密模块不可用）")
         return
 
     print("使用HummingBot标准加密生成connector配置文件...")
 
+    # 先筛选需要加密的机器人，命中缓存的直接复用密文，其余统一交给并行加密阶段
+    cache = load_credential_cache(ctx)
+    pending = []
+    # 只保留当前机器人的缓存条目，已删除的机器人自动淘汰
+    new_cache = {}
     for bot in bots:
-        bot_name = bot.get('name', '').strip()
-        connector = bot.get('connector', '').strip()
-        api_key = bot.get('api_key', '').strip()
-        secret_key = bot.get('secret_key', '').strip()
-        password = bot.get('password', '').strip()
+        bot_name = bot.name
+        if targets is not None and bot_name not in targets:
+            if bot_name in cache:
+                new_cache[bot_name] = cache[bot_name]
+            continue
+
+        connector = bot.connector
+        api_key = bot.api_key
+        secret_key = bot.secret_key
+        password = bot.password
 
         # 检查必要字段
         if not all([bot_name, connector, password]):
@@ -364,29 +548,59 @@ def generate_connector_configs(bots):
             print(f"跳过 {bot_name}：没有提供API凭证")
             continue
 
+        digest = credential_digest(bot_name, connector, password, api_key, secret_key, work_factor)
+        pending.append({
+            'name': bot_name,
+            'connector': connector,
+            'task': (password, api_key, secret_key),
+            'digest': digest,
+            'cached': lookup_cached_credentials(cache, bot_name, digest, api_key, secret_key),
+        })
+
+    # 可选：使用 validate_password 复核命中的缓存（每个机器人一次密钥派生）
+    if verify_cache:
+        hits = [item for item in pending if item['cached']]
+        # 每个机器人的密文共享同一salt，校验只需一次密钥派生
+        ctx.pbkdf2_derivations += len(hits)
+        checks = run_in_process_pool(
+            verify_cached_credentials,
+            [item['task'] + (item['cached'],) for item in hits],
+            jobs,
+        )
+        for item, (valid, error) in zip(hits, checks):
+            if error is not None or not valid:
+                print(f"{item['name']} 的缓存凭证校验失败，重新加密")
+                item['cached'] = None
+
+    misses = [item for item in pending if not item['cached']]
+    print(f"凭证缓存命中 {len(pending) - len(misses)} 个，需要加密 {len(misses)} 个")
+    # encrypt_many 对每个机器人只派生一次密钥
+    ctx.pbkdf2_derivations += len(misses)
+    fresh_results = iter(encrypt_all_credentials([item['task'] + (work_factor,) for item in misses], jobs))
+
+    for item in pending:
+        bot_name = item['name']
+        connector = item['connector']
+        if item['cached']:
+            encrypted, error = item['cached'], None
+        else:
+            encrypted, error = next(fresh_results)
+
         try:
-            # 创建密码验证文件
-            crypto_manager = CustomCryptoManager(password)
-            bot_conf_dir = os.path.join(CONF_OUTPUT_DIR, bot_name)
-            password_verification_path = os.path.join(bot_conf_dir, '.password_verification')
+            if error is not None:
+                raise error
 
-            # 创建密码验证文件
-            encrypted_verification = crypto_manager.create_password_verification()
-            with open(password_verification_path, 'w') as f:
-                f.write(encrypted_verification)
+            encrypted_verification, encrypted_api_key, encrypted_secret_key = encrypted
 
-            # 加密API凭证
-            encrypted_api_key = encrypt_credential(password, api_key) if api_key else ""
-            encrypted_secret_key = encrypt_credential(password, secret_key) if secret_key else ""
+            # 创建密码验证文件
+            bot_conf_dir = os.path.join(ctx.conf_output_dir, bot_name)
+            password_verification_path = os.path.join(bot_conf_dir, '.password_verification')
+            bot_row = f"{os.path.basename(ctx.bots_csv_file)}:{bot_name}"
+            ctx.manifest.write_file(password_verification_path, encrypted_verification, row=bot_row)
 
             # 加载或创建connector模板
-            template_path = os.path.join(TEMPLATES_DIR, f"{connector}_connector.yml")
-            if os.path.exists(template_path):
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    template_content = f.read()
-            else:
-                # 如果没有特定模板，创建通用模板
-                template_content = create_connector_config_template(connector)
+            template, template_name = load_connector_template(ctx, connector)
+            if template_name is None:
                 print(f"使用自动生成的模板: {connector}")
 
             # 替换模板变量
@@ -396,260 +610,817 @@ def generate_connector_configs(bots):
                 'connector': connector
             }
 
-            rendered_content = render_template(template_content, variables)
+            rendered_content = template.render(variables)
 
             # 保存connector配置文件
-            connector_config_path = os.path.join(CONF_OUTPUT_DIR, bot_name, 'connectors', f"{connector}.yml")
-            with open(connector_config_path, 'w', encoding='utf-8') as f:
-                f.write(rendered_content)
+            connector_config_path = os.path.join(ctx.conf_output_dir, bot_name, 'connectors', f"{connector}.yml")
+            ctx.manifest.write_file(connector_config_path, rendered_content, row=bot_row, template=template_name)
 
             print(f"已生成 {bot_name} 的 {connector} connector配置")
 
+            # encrypt_credential 失败时会返回明文，这种结果不能写入缓存
+            if all(is_keyfile_hex(value) for value in encrypted if value):
+                new_cache[bot_name] = {
+                    'digest': item['digest'],
+                    'password_verification': encrypted_verification,
+                    'encrypted_api_key': encrypted_api_key,
+                    'encrypted_secret_key': encrypted_secret_key,
+                }
+
         except Exception as e:
             print(f"为 {bot_name} 生成connector配置时出错: {e}")
             continue
 
+    save_credential_cache(ctx, new_cache)
+
+
+def generate_docker_compose(ctx, bots, shard=False):
+    """生成 docker-compose.override.yml（shard 时按 bots.csv 的 group 列拆分为多个文件）和服务索引 services.tsv"""
+    services = build_services(bots)
+    try:
+        files = split_services(services, shard)
+    except ValueError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    # 内容未变化时不重写文件
+    base_dir = os.path.dirname(ctx.yml_file)
+    bots_row = os.path.basename(ctx.bots_csv_file)
+    for compose_file, members in files.items():
+        ctx.manifest.write_file(os.path.join(base_dir, compose_file), render_compose(members), row=bots_row)
+    ctx.manifest.write_file(ctx.services_index_file, render_services_index(services, files), row=bots_row)
+    if shard:
+        print(f"{len(services)} 个服务拆分到 {len(files)} 个 compose 文件")
+
+    # 分组变化或取消拆分后，删除不再使用的分组文件
+    for rel in sorted(ctx.manifest.entries):
+        if '/' not in rel and is_shard_file_name(rel) and rel not in files:
+            remove_path(ctx, os.path.join(ctx.manifest.root, rel))
+            print(f"已删除: {rel}")
+
+
+def create_directories(ctx, bots):
+    """为每个机器人创建必要的目录结构（一次性收集所有子目录后批量创建，主目录随子目录一起创建）"""
+    directories = [
+        os.path.join(ctx.conf_output_dir, name, sub)
+        for name in (bot.name for bot in bots) if name
+        for sub in SUB_DIRS
+    ]
+    ctx.writer.make_dirs(directories)
+
+
+# ========== 机器人与策略的分配 ==========
+
+def assign_strategies(bots, strategies, v1_strategies, assign_all=False):
+    """
+    计算每个策略行需要分发到哪些机器人
+    - 隐式分配：机器人的 script_config / config_file_name 与策略生成的文件名相同
+    - 显式分配：策略行的 bots 列列出的机器人（* 表示全部机器人）
+    Returns:
+        {'v2': {策略行键: 机器人名称集合}, 'v1': {...}}；assign_all 时返回 None（分发到所有机器人）
+    """
+    if assign_all:
+        return None
 
-def generate_docker_compose(bots):
-    """生成 docker-compose.override.yml 文件"""
-    # 使用手动字符串拼接写入文件，确保正确的 YAML 格式
-    with open(YML_FILE, 'w', encoding='utf-8') as f:
-        f.write("# 自动生成的文件，请勿手动编辑\n")
-        f.write("x-hb: &default\n")
-        f.write("  image: backpack:latest\n")
-        f.write("  build:\n")
-        f.write("    context: .\n")
-        f.write("    dockerfile: Dockerfile\n")
-        f.write("  logging:\n")
-        f.write("    driver: json-file\n")
-        f.write("    options:\n")
-        f.write("      max-size: 10m\n")
-        f.write("      max-file: \"5\"\n")
-        f.write("  tty: true\n")
-        f.write("  stdin_open: true\n")
-        f.write("  network_mode: host\n\n")
-        f.write("services:\n")
-
-        # 为每个机器人生成配置
-        for bot in bots:
-            # 检查 bot 是否为 None 或空字典
-            if not bot:
+    bot_names = [bot.name for bot in bots if bot.name]
+    referenced = {}  # 文件名 -> 引用它的机器人
+    for bot in bots:
+        for fname in (bot.script_config, bot.config_file_name):
+            if fname:
+                referenced.setdefault(fname, set()).add(bot.name)
+
+    assignments = {}
+    produced_fnames = set()
+    unassigned = []
+    unknown_bots = set()
+    for prefix, rows in (('v2', strategies), ('v1', v1_strategies)):
+        assignments[prefix] = {}
+        for row in rows:
+            key = row.key
+            if not key:
                 continue
+            fname = row.fname(prefix)
+            produced_fnames.add(fname)
 
-            name = bot.get('name', '').strip()
-            if not name:
+            names = set(referenced.get(fname, ()))
+            explicit = row.bots
+            if '*' in explicit:
+                names.update(bot_names)
+            else:
+                names.update(name for name in explicit if name in bot_names)
+                unknown_bots.update(name for name in explicit if name not in bot_names)
+
+            assignments[prefix][key] = assignments[prefix].get(key, set()) | names
+            if not assignments[prefix][key]:
+                unassigned.append(fname)
+
+    # 校验并报告分配结果（不影响生成）
+    if unassigned:
+        print(f"警告: {len(unassigned)} 个策略没有分配给任何机器人，不会生成文件: {', '.join(sorted(unassigned))}")
+    if unknown_bots:
+        print(f"警告: 策略的 bots 列中有 bots.csv 不存在的机器人: {', '.join(sorted(unknown_bots))}")
+    for fname in sorted(set(referenced) - produced_fnames):
+        if fname.startswith(('conf_v1_', 'conf_v2_')):
+            print(f"警告: {', '.join(sorted(referenced[fname]))} 引用的策略文件 {fname} 没有对应的策略行")
+
+    return assignments
+
+
+def assigned_bot_names(ctx, prefix, strategy, bot_names):
+    """返回策略行需要分发到的机器人（保持 bot_names 的顺序）"""
+    if ctx.assignments is None:
+        return bot_names
+    assigned = ctx.assignments[prefix].get(strategy.key, ())
+    return [name for name in bot_names if name in assigned]
+
+
+def expected_strategy_files(ctx, bots, strategies, v1_strategies):
+    """按分配结果计算每个机器人应有的策略文件（相对清单路径）"""
+    bot_names = [bot.name for bot in bots if bot.name]
+    expected = set()
+    for prefix, rows, sub_dirs in (('v2', strategies, ('controllers', 'scripts')),
+                                   ('v1', v1_strategies, ('strategies',))):
+        for row in rows:
+            if not row.key:
                 continue
+            fname = row.fname(prefix)
+            for name in assigned_bot_names(ctx, prefix, row, bot_names):
+                for sub_dir in sub_dirs:
+                    expected.add(ctx.manifest.relpath(os.path.join(ctx.conf_output_dir, name, sub_dir, fname)))
+    return expected
+
+
+def remove_unassigned_strategy_files(ctx, bots, strategies, v1_strategies):
+    """删除清单中已不再分配给对应机器人的策略文件（分配关系变化或改用 --assign-all 之后）"""
+    expected = expected_strategy_files(ctx, bots, strategies, v1_strategies)
+    conf_rel = ctx.manifest.relpath(ctx.conf_output_dir)
+    for rel in sorted(ctx.manifest.entries):
+        parts = rel.split('/')
+        if (rel.startswith(conf_rel + '/') and len(parts) >= 3
+                and parts[-2] in ('controllers', 'scripts', 'strategies') and rel not in expected):
+            remove_path(ctx, os.path.join(ctx.manifest.root, rel))
+            print(f"已删除未分配的策略文件: {rel}")
+
+
+# ========== 模板变量检查 ==========
+
+def placeholder_coverage_jobs(ctx, bots, strategies, v1_strategies):
+    """
+    列出需要检查的 (CSV文件, 行列表, 行对应模板的函数, 脚本提供的变量)
+    模板只在这里加载一次，找不到的模板跳过（生成阶段会报告）
+    """
+    jobs = []
+    for template_type, name, provided in (('controllers', V2_CONTROLLERS_TEMPLATE, frozenset()),
+                                          ('scripts', V2_SCRIPTS_TEMPLATE, SCRIPTS_TEMPLATE_VARIABLES)):
+        try:
+            template = load_template(ctx, template_type, name)
+        except FileNotFoundError:
+            continue
+        jobs.append((ctx.strategy_csv_file, strategies, lambda row, t=template: t, provided))
+
+    v1_template_path = os.path.join(ctx.templates_dir, f"{V1_STRATEGY_TEMPLATE}.yml")
+    if v1_strategies and os.path.exists(v1_template_path):
+        v1_template = load_compiled_template(v1_template_path)
+        jobs.append((ctx.strategy_v1_csv_file, v1_strategies, lambda row: v1_template, frozenset()))
+
+    # connector模板的变量全部由加密结果提供，按每个机器人的connector检查（自定义模板可能引用其他变量）
+    connector_templates = {}
+
+    def connector_template(bot):
+        if not bot.has_credentials:
+            return None
+        if bot.connector not in connector_templates:
+            connector_templates[bot.connector] = load_connector_template(ctx, bot.connector)[0]
+        return connector_templates[bot.connector]
+
+    jobs.append((ctx.bots_csv_file, bots, connector_template, CONNECTOR_TEMPLATE_VARIABLES))
+    return jobs
+
+
+def check_fname_collisions(ctx, strategies, v1_strategies):
+    """
+    文件名只取市场的基础币种，同一版本的 BTC-USDC 和 BTC-USDT 会生成同一个文件
+    每个文件只保留第一行的渲染结果，其余行输出警告
+    """
+    for prefix, csv_file, rows in (('v2', ctx.strategy_csv_file, strategies),
+                                   ('v1', ctx.strategy_v1_csv_file, v1_strategies)):
+        first_rows = {}
+        for row in rows:
+            if not row.key:
+                continue
+            fname = row.fname(prefix)
+            first = first_rows.setdefault(fname, row)
+            if first is not row:
+                print(f"警告: {os.path.basename(csv_file)} 第{row.line}行（{row.market}）与第{first.line}行"
+                      f"（{first.market}）都生成 {fname}，只保留第{first.line}行的内容")
+
+
+def check_placeholder_coverage(ctx, bots, strategies, v1_strategies):
+    """
+    生成前检查每个CSV行是否提供了模板的全部占位符（缺失的占位符会原样留在生成的文件中）
+    返回缺失列表 [(CSV文件名, 行号, 模板名, 缺失变量元组)]
+    """
+    missing = []
+    for csv_file, rows, template_for, provided in placeholder_coverage_jobs(ctx, bots, strategies, v1_strategies):
+        csv_name = os.path.basename(csv_file)
+        # 同一文件的行共享列索引，同一 (列索引, 模板) 只计算一次差集
+        computed = {}
+        for row in rows:
+            template = template_for(row)
+            if template is None:
+                continue
+            cache_key = (id(row.columns), id(template))
+            if cache_key not in computed:
+                absent = template.placeholders - provided - row.columns.keys()
+                computed[cache_key] = tuple(sorted(absent))
+            if computed[cache_key]:
+                template_name = os.path.basename(template.source) if template.source else '自动生成模板'
+                missing.append((csv_name, row.line, template_name, computed[cache_key]))
+    return missing
+
+
+def format_line_ranges(lines):
+    """把行号列表压缩为范围，例如 [2, 3, 4, 7] -> 2-4,7"""
+    ranges = []
+    for line in sorted(set(lines)):
+        if ranges and line == ranges[-1][1] + 1:
+            ranges[-1][1] = line
+        else:
+            ranges.append([line, line])
+    return ','.join(f"{start}-{end}" if start != end else f"{start}" for start, end in ranges)
+
+
+def display_width(text):
+    """终端显示宽度（中文等全角字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1 for char in text)
+
+
+def print_placeholder_matrix(missing):
+    """按 CSV行 × 模板 打印缺失变量矩阵，缺失情况相同的行合并为一行"""
+    templates = sorted({template for _, _, template, _ in missing})
+    by_row = {}
+    for csv_name, line, template, names in missing:
+        by_row.setdefault((csv_name, line), {})[template] = ', '.join(names)
+
+    groups = {}  # (CSV文件名, 各模板缺失变量) -> 行号列表
+    for (csv_name, line), cells in by_row.items():
+        signature = tuple(cells.get(template, '-') for template in templates)
+        groups.setdefault((csv_name, signature), []).append(line)
+
+    table = [['CSV行'] + templates]
+    for (csv_name, signature), lines in sorted(groups.items(), key=lambda item: (item[0][0], min(item[1]))):
+        table.append([f"{csv_name} 第{format_line_ranges(lines)}行"] + list(signature))
+    widths = [max(display_width(row[column]) for row in table) for column in range(len(table[0]))]
+
+    print(f"模板变量检查：{len(by_row)} 行缺少模板变量（生成的文件中会保留 ${{变量}} 占位符）")
+    for row in table:
+        cells = (cell + ' ' * (width - display_width(cell)) for cell, width in zip(row, widths))
+        print('  ' + '  '.join(cells).rstrip())
+
+
+# ========== 渲染结果分发 ==========
+
+def is_hardlinked(path):
+    """文件是否与其他路径共用同一个 inode（旧版本生成的硬链接）"""
+    try:
+        return os.stat(path).st_nlink > 1
+    except OSError:
+        return False
 
-            # 提取环境变量
-            proxy = bot.get('proxy', '').strip()
-            config_file_name = bot.get('config_file_name', '').strip()
-            script_config = bot.get('script_config', '').strip()
-            password = bot.get('password', '').strip()
-
-            f.write(f"  {name}:\n")
-            f.write("    <<: *default\n")
-            f.write(f"    container_name: {name}\n")
-
-            # 构建环境变量
-            environment_vars = []
-            if proxy:
-                environment_vars.append(f"HTTPS_PROXY={proxy}")
-                environment_vars.append(f"HTTP_PROXY={proxy}")
-            if password:
-                environment_vars.append(f"CONFIG_PASSWORD={password}")
-            if config_file_name:
-                environment_vars.append(f"CONFIG_FILE_NAME={config_file_name}")
-            if script_config:
-                environment_vars.append(f"SCRIPT_CONFIG={script_config}")
-
-            if environment_vars:
-                f.write("    environment:\n")
-                for env_var in environment_vars:
-                    f.write(f"      - {env_var}\n")
-
-            f.write("    volumes:\n")
-            f.write(f"      - ./conf/{name}:/home/hummingbot/conf\n")
-            f.write(f"      - ./logs/{name}:/home/hummingbot/logs\n")
-            f.write(f"      - ./data/{name}:/home/hummingbot/data\n")
-            f.write("      - ./certs:/home/hummingbot/certs\n")
-            f.write("      - ./scripts:/home/hummingbot/scripts\n")
-            f.write("      - ./controllers:/home/hummingbot/controllers\n")
-            f.write("\n")
-
-
-def create_directories(bots):
-    """为每个机器人创建必要的目录结构"""
-    for bot in bots:
-        name = bot.get('name', '').strip()
-        if not name:
+
+def fan_out_content(ctx, content, target_paths, row=None, template=None):
+    """渲染结果只编码、计算哈希一次，再把各机器人目标路径的写入任务提交给写入线程池
+
+    每个机器人写入独立的文件：HummingBot 会原地修改自己的配置，共用 inode 会同时改动其他机器人。
+    同一次运行中每个目标路径只写一次，清单中内容相同且不是硬链接的目标文件保持不动；
+    写入失败的路径在写入完成后统一报告。返回本次分发的目标文件数
+    """
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    count = 0
+
+    for target_path in target_paths:
+        # 本次运行已有策略行生成了同名文件（见 check_fname_collisions），保留先生成的内容
+        if ctx.manifest.relpath(target_path) in ctx.manifest.produced:
             continue
+        count += 1
 
-        # 主目录
-        for root_dir, output_path in [('conf', CONF_OUTPUT_DIR)]:
-            os.makedirs(os.path.join(output_path, name), exist_ok=True)
+        if ctx.manifest.is_current(target_path, digest, len(data)) and not is_hardlinked(target_path):
+            ctx.manifest.record(target_path, digest, len(data), row, template)
+            ctx.manifest.suppressed += 1
+            continue
 
-        # 子目录
-        for sub in SUB_DIRS:
-            os.makedirs(os.path.join(CONF_OUTPUT_DIR, name, sub), exist_ok=True)
+        # write_atomic 先写临时文件再 rename，同时断开旧版本留下的硬链接
+        ctx.writer.submit(target_path, write_atomic, target_path, data)
+        ctx.manifest.record(target_path, digest, len(data), row, template)
+        ctx.manifest.written += 1
+        ctx.manifest.bytes_written += len(data)
+    return count
 
 
-def generate_v2_strategy_files(bots, strategies):
-    """生成策略配置文件"""
-    # 固定使用 pmm_dynamic 策略
-    controllers = "pmm_dynamic"
-    scripts = "market_making.pmm_dynamic_scripts"
+def flush_writes(ctx):
+    """等待所有写入任务完成，按路径顺序报告失败的文件，并从清单中移除，返回失败数"""
+    errors = ctx.writer.wait()
+    if errors:
+        print(f"以下 {len(errors)} 个文件或目录写入失败:")
+        for path, e in errors:
+            print(f"  {path}: {e}")
+        ctx.manifest.discard(path for path, _ in errors)
+    return len(errors)
 
-    for strategy in strategies:
-        market = strategy.get('market', '').strip().split('-')[0]
-        version = strategy.get('version', '').strip()
 
-        if not all([market, version]):
-            print(f"跳过策略（缺少必要字段）: {strategy}")
-            continue
+def remove_content_store(ctx):
+    """删除旧版本的内容存储目录（conf 下的策略文件曾是它的硬链接，现在都是独立文件）"""
+    shutil.rmtree(ctx.content_store_dir, ignore_errors=True)
 
-        controllers_fname = f"conf_v2_{version}_{market.lower()}.yml"
-        scripts_fname = f"conf_v2_{version}_{market.lower()}.yml"
 
-        # 为每个机器人生成配置文件
-        for bot in bots:
-            bot_name = bot.get('name', '').strip()
-            if not bot_name:
-                continue
+def generate_deploy_bundle(ctx, codec):
+    """生成部署包，需要部署的文件都没有变化时不重写"""
+    stats = write_bundle(ctx.config_folder or '.', codec)
+    if stats is None:
+        print("部署包内容未变化，跳过")
+        return
+    print(f"生成部署包 {stats['path']}: {stats['files']} 个文件，{stats['objects']} 个不同内容，"
+          f"{stats['raw_bytes']} -> {stats['object_bytes']} 字节（去重）-> {stats['bytes']} 字节（压缩）")
 
-            # 生成第一个文件：基于 controllers 的模板文件，保存到每个机器人的 controllers 目录
-            try:
-                controllers_file_path = os.path.join(CONF_OUTPUT_DIR, bot_name, 'controllers', controllers_fname)
 
-                # 加载 controllers 模板（固定使用 pmm_dynamic）
-                template_content = load_template('controllers', controllers)
-                rendered_content = render_template(template_content, strategy)
+def generate_v2_strategy_files(ctx, bots, strategies):
+    """生成策略配置文件（每个策略只渲染一次，再分发到分配给它的机器人）"""
+    # 固定使用 pmm_dynamic 策略
+    controllers = V2_CONTROLLERS_TEMPLATE
+    scripts = V2_SCRIPTS_TEMPLATE
 
-                # 写入 controllers 策略文件到机器人的 controllers 目录
-                with open(controllers_file_path, 'w', encoding='utf-8') as f:
-                    f.write(rendered_content)
+    # 模板只加载和编译一次，所有策略和机器人共用
+    try:
+        controllers_template = load_template(ctx, 'controllers', controllers)
+    except FileNotFoundError as e:
+        print(f"警告: {e}")
+        print("跳过生成所有 controllers 文件")
+        return
 
-                print(f"已生成 controllers 策略文件: {controllers_file_path}")
+    try:
+        scripts_template = load_template(ctx, 'scripts', scripts)
+    except FileNotFoundError as e:
+        print(f"警告: {e}")
+        print("跳过生成所有 scripts 文件")
+        scripts_template = None
 
-            except FileNotFoundError as e:
-                print(f"警告: {e}")
-                print(f"跳过生成 controllers 文件: {controllers_fname}")
-                continue
-            except Exception as e:
-                print(f"生成 controllers 文件时出错 {controllers_fname}: {e}")
-                continue
+    bot_names = [bot.name for bot in bots if bot.name]
 
-            # 生成第二个文件：基于 scripts 的模板文件，保存到每个机器人的 scripts 目录
-            try:
-                scripts_file_path = os.path.join(CONF_OUTPUT_DIR, bot_name, 'scripts', scripts_fname)
+    for strategy in strategies:
+        if not all([strategy.base, strategy.version]):
+            print(f"跳过策略（缺少必要字段）: {strategy.as_dict()}")
+            continue
 
-                # 加载 scripts 模板（固定使用 market_making.pmm_dynamic_scripts）
-                scripts_template_content = load_template('scripts', scripts)
+        controllers_fname = strategy.fname('v2')
+        scripts_fname = strategy.fname('v2')
 
-                # 创建策略变量，包含策略文件路径（容器内路径）
-                strategy_with_path = strategy.copy()
-                strategy_with_path['strategy_file_path'] = f"{controllers_fname}"
+        # 没有分配给任何机器人的策略不渲染
+        strategy_bots = assigned_bot_names(ctx, 'v2', strategy, bot_names)
+        if not strategy_bots:
+            continue
 
-                rendered_scripts_content = render_template(scripts_template_content, strategy_with_path)
+        # 生成第一个文件：基于 controllers 的模板文件，分发到每个机器人的 controllers 目录
+        try:
+            rendered_content = controllers_template.render(strategy)
+            targets = {name: os.path.join(ctx.conf_output_dir, name, 'controllers', controllers_fname)
+                       for name in strategy_bots}
+            strategy_row = f"{os.path.basename(ctx.strategy_csv_file)}:{strategy.key}"
+            count = fan_out_content(ctx, rendered_content, targets.values(), strategy_row,
+                                    os.path.basename(controllers_template.source))
+        except Exception as e:
+            print(f"生成 controllers 文件时出错 {controllers_fname}: {e}")
+            continue
 
-                # 写入 scripts 文件
-                with open(scripts_file_path, 'w', encoding='utf-8') as f:
-                    f.write(rendered_scripts_content)
+        print(f"已生成 controllers 策略文件: {controllers_fname}（{count} 个机器人）")
 
-                print(f"已生成 scripts 文件: {scripts_file_path}")
+        if scripts_template is None:
+            continue
 
-            except FileNotFoundError as e:
-                print(f"警告: {e}")
-                print(f"跳过生成 scripts 文件: {scripts_fname}")
-            except Exception as e:
-                print(f"生成 scripts 文件时出错 {scripts_fname}: {e}")
+        # 生成第二个文件：基于 scripts 的模板文件，分发到每个机器人的 scripts 目录
+        try:
+            # 创建策略变量，包含策略文件路径（容器内路径）
+            strategy_with_path = strategy.with_values(strategy_file_path=controllers_fname)
+
+            rendered_scripts_content = scripts_template.render(strategy_with_path)
+            script_targets = [os.path.join(ctx.conf_output_dir, name, 'scripts', scripts_fname)
+                              for name in strategy_bots]
+            count = fan_out_content(ctx, rendered_scripts_content, script_targets, strategy_row,
+                                    os.path.basename(scripts_template.source))
+        except Exception as e:
+            print(f"生成 scripts 文件时出错 {scripts_fname}: {e}")
+            continue
 
+        print(f"已生成 scripts 文件: {scripts_fname}（{count} 个机器人）")
 
-def generate_v1_strategy_files(bots, v1_strategies):
-    """生成 v1 策略配置文件（perpetual_market_making）"""
+
+def generate_v1_strategy_files(ctx, bots, v1_strategies):
+    """生成 v1 策略配置文件（perpetual_market_making，每个策略只渲染一次，只分发到分配给它的机器人）"""
     # 加载 perpetual_market_making 模板
-    template_path = os.path.join(TEMPLATES_DIR, 'perpetual_market_making.yml')
+    template_path = os.path.join(ctx.templates_dir, f"{V1_STRATEGY_TEMPLATE}.yml")
 
     if not os.path.exists(template_path):
         print(f"错误: 找不到 v1 策略模板文件: {template_path}")
         return
 
-    with open(template_path, 'r', encoding='utf-8') as f:
-        template_content = f.read()
+    template = load_compiled_template(template_path)
+
+    bot_names = [bot.name for bot in bots if bot.name]
 
     for strategy in v1_strategies:
-        version = strategy.get('version', '').strip()
-        market = strategy.get('market', '').strip().split('-')[0]
+        if not all([strategy.version, strategy.base]):
+            print(f"跳过 v1 策略（缺少必要字段）: {strategy.as_dict()}")
+            continue
+
+        # 生成文件名
+        strategy_fname = strategy.fname('v1')
 
-        if not all([version, market]):
-            print(f"跳过 v1 策略（缺少必要字段）: {strategy}")
+        # 没有分配给任何机器人的策略不渲染
+        strategy_bots = assigned_bot_names(ctx, 'v1', strategy, bot_names)
+        if not strategy_bots:
             continue
 
-        # 为每个机器人生成配置文件
-        for bot in bots:
-            bot_name = bot.get('name', '').strip()
-            if not bot_name:
-                continue
+        try:
+            # 渲染模板内容，并分发到每个机器人的 strategies 目录
+            rendered_content = template.render(strategy)
+            targets = [os.path.join(ctx.conf_output_dir, name, 'strategies', strategy_fname)
+                       for name in strategy_bots]
+            strategy_row = f"{os.path.basename(ctx.strategy_v1_csv_file)}:{strategy.key}"
+            count = fan_out_content(ctx, rendered_content, targets, strategy_row, os.path.basename(template_path))
+        except Exception as e:
+            print(f"生成 v1 策略文件时出错 {strategy_fname}: {e}")
+            continue
 
-            # 生成文件名
-            strategy_fname = f"conf_v1_{version}_{market.lower()}.yml"
+        print(f"已生成 v1 策略文件: {strategy_fname}（{count} 个机器人）")
 
-            try:
-                # 创建策略文件路径
-                strategy_file_path = os.path.join(CONF_OUTPUT_DIR, bot_name, 'strategies', strategy_fname)
 
-                # 渲染模板内容
-                rendered_content = render_template(template_content, strategy)
+# ========== 增量生成 ==========
 
-                # 写入策略文件
-                with open(strategy_file_path, 'w', encoding='utf-8') as f:
-                    f.write(rendered_content)
+def strategy_fname(prefix, key):
+    """根据行键生成策略文件名，与生成函数中的命名规则一致"""
+    version, market = key.split('|', 1)
+    return f"conf_{prefix}_{version}_{market.split('-')[0].lower()}.yml"
 
-                print(f"已生成 v1 策略文件: {strategy_file_path}")
 
-            except Exception as e:
-                print(f"生成 v1 策略文件时出错 {strategy_fname}: {e}")
-                continue
+def index_rows(rows, key_func):
+    """按行键建立 {键: 行} 索引，忽略没有键的行（bots.csv 的行键为 name，策略文件为 key，即 version|market）"""
+    return {key: row for row in rows for key in [key_func(row)] if key}
 
 
-def setup_paths(config_folder=None):
-    """根据配置文件夹设置文件路径"""
-    global BOTS_CSV_FILE, STRATEGY_CSV_FILE, STRATEGY_V1_CSV_FILE, YML_FILE
-    global TEMPLATES_DIR, HASH_CACHE_FILE, CONF_OUTPUT_DIR, LOGS_OUTPUT_DIR, DATA_OUTPUT_DIR
+def diff_rows(old_hashes, new_rows):
+    """比较旧的行哈希与新的行，返回 (新增, 删除, 修改) 的键集合"""
+    new_hashes = {key: row.hash for key, row in new_rows.items()}
+    added = set(new_hashes) - set(old_hashes)
+    removed = set(old_hashes) - set(new_hashes)
+    changed = {key for key in set(new_hashes) & set(old_hashes) if new_hashes[key] != old_hashes[key]}
+    return added, removed, changed
+
+
+def load_generation_state(ctx):
+    """加载上次生成时的行和模板哈希，不存在或无法解析时返回 None"""
+    if ctx.generation_state is not None:
+        return ctx.generation_state
+    if os.path.exists(ctx.state_file):
+        try:
+            with open(ctx.state_file, 'r') as f:
+                return json.load(f)
+        except Exception:
+            pass
+    return None
+
+
+def save_generation_state(ctx, bots, strategies, v1_strategies, template_hashes, assign_all=False,
+                          shard_compose=False):
+    """保存本次生成使用的行和模板哈希"""
+    state = {
+        'assign_all': assign_all,
+        'shard_compose': shard_compose,
+        'bots': {key: row.hash for key, row in index_rows(bots, attrgetter('name')).items()},
+        'strategies': {key: row.hash for key, row in index_rows(strategies, attrgetter('key')).items()},
+        'strategies_v1': {key: row.hash for key, row in index_rows(v1_strategies, attrgetter('key')).items()},
+        'templates': template_hashes,
+    }
+    with open(ctx.state_file, 'w') as f:
+        json.dump(state, f, indent=2)
+    ctx.generation_state = state
+
+
+def remove_path(ctx, path):
+    """删除生成的文件或目录（不存在时忽略），同时移除清单条目"""
+    ctx.manifest.forget(path)
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def remove_unproduced_outputs(ctx, bots):
+    """删除输出目录中本次没有生成的文件，以及已不存在的机器人目录"""
+    bot_names = {bot.name for bot in bots}
+
+    for rel in sorted(set(ctx.manifest.entries) - ctx.manifest.produced):
+        remove_path(ctx, os.path.join(ctx.manifest.root, rel))
+
+    if not os.path.isdir(ctx.conf_output_dir):
+        return
+
+    for item in sorted(os.listdir(ctx.conf_output_dir)):
+        item_path = os.path.join(ctx.conf_output_dir, item)
+        if item not in bot_names:
+            remove_path(ctx, item_path)
+            print(f"已删除: {item_path}")
+            continue
+
+        # 机器人目录下不在清单中的文件（例如手动放入或生成失败残留的文件）
+        for dirpath, _, filenames in os.walk(item_path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if ctx.manifest.relpath(path) not in ctx.manifest.produced:
+                    remove_path(ctx, path)
+                    print(f"已删除: {path}")
+
+
+def remove_stale_connector_files(ctx, bot_names):
+    """删除指定机器人中本次没有重新生成的connector配置和密码验证文件"""
+    for name in sorted(bot_names):
+        bot_conf_dir = os.path.join(ctx.conf_output_dir, name)
+        paths = [os.path.join(bot_conf_dir, '.password_verification')]
+        connectors_dir = os.path.join(bot_conf_dir, 'connectors')
+        if os.path.isdir(connectors_dir):
+            paths += [os.path.join(connectors_dir, item) for item in os.listdir(connectors_dir)]
+
+        for path in paths:
+            if os.path.lexists(path) and ctx.manifest.relpath(path) not in ctx.manifest.produced:
+                remove_path(ctx, path)
+                print(f"已删除: {path}")
+
+
+def check_output_manifest(ctx):
+    """按生成清单校验配置文件夹，返回是否完全一致"""
+    if not os.path.exists(ctx.manifest_file):
+        print(f"错误: 找不到生成清单 {ctx.manifest_file}，请先运行生成")
+        return False
+
+    missing, modified, untracked = ctx.manifest.check([DEFAULT_CONF_OUTPUT_DIR])
+    for rel in missing:
+        print(f"缺失: {rel}")
+    for rel in modified:
+        print(f"已修改: {rel}")
+    for rel in untracked:
+        print(f"不在清单中: {rel}")
+
+    print(f"校验 {len(ctx.manifest.entries)} 个文件：缺失 {len(missing)}，"
+          f"修改 {len(modified)}，清单外 {len(untracked)}")
+    return not (missing or modified or untracked)
+
+
+def full_generation_plan(bots, strategies, v1_strategies):
+    """全量生成计划：所有机器人 × 所有策略（生成时按分配结果过滤）"""
+    return {
+        'compose': True,
+        'directories': bots,
+        'v2': [(bots, strategies)],
+        'v1': [(bots, v1_strategies)] if v1_strategies else [],
+        'connectors': None,
+    }
 
-    if config_folder:
-        # 如果指定了配置文件夹，从该文件夹读取配置文件
-        BOTS_CSV_FILE = os.path.join(config_folder, DEFAULT_BOTS_CSV_FILE)
-        STRATEGY_CSV_FILE = os.path.join(config_folder, DEFAULT_STRATEGY_CSV_FILE)
-        STRATEGY_V1_CSV_FILE = os.path.join(config_folder, DEFAULT_STRATEGY_V1_CSV_FILE)
-        YML_FILE = os.path.join(config_folder, DEFAULT_YML_FILE)
-        HASH_CACHE_FILE = os.path.join(config_folder, DEFAULT_HASH_CACHE_FILE)
+
+def plan_incremental_generation(ctx, state, bots, strategies, v1_strategies, template_hashes):
+    """
+    比较上次生成状态与当前CSV/模板，删除失效的文件，并返回只包含受影响部分的生成计划
+    """
+    bots_by_key = index_rows(bots, attrgetter('name'))
+    v2_by_key = index_rows(strategies, attrgetter('key'))
+    v1_by_key = index_rows(v1_strategies, attrgetter('key'))
+
+    bots_added, bots_removed, bots_changed = diff_rows(state.get('bots', {}), bots_by_key)
+    v2_added, v2_removed, v2_changed = diff_rows(state.get('strategies', {}), v2_by_key)
+    v1_added, v1_removed, v1_changed = diff_rows(state.get('strategies_v1', {}), v1_by_key)
+
+    old_templates = state.get('templates', {})
+    templates_changed = {
+        name for name in set(old_templates) | set(template_hashes)
+        if old_templates.get(name) != template_hashes.get(name)
+    }
+
+    # 输出目录缺失的机器人按新增处理
+    bots_added |= {key for key in bots_by_key
+                   if not os.path.isdir(os.path.join(ctx.conf_output_dir, key))}
+    bots_changed -= bots_added
+
+    print(f"增量更新: 机器人 +{len(bots_added)} -{len(bots_removed)} ~{len(bots_changed)}，"
+          f"v2 策略 +{len(v2_added)} -{len(v2_removed)} ~{len(v2_changed)}，"
+          f"v1 策略 +{len(v1_added)} -{len(v1_removed)} ~{len(v1_changed)}，"
+          f"模板变化 {len(templates_changed)} 个")
+
+    # 删除已移除机器人的配置目录
+    for name in sorted(bots_removed):
+        remove_path(ctx, os.path.join(ctx.conf_output_dir, name))
+        print(f"已删除机器人配置: {name}")
+
+    # 删除已移除策略的文件（仍有其他行生成同名文件时保留）
+    remaining_bots = [key for key in bots_by_key if key not in bots_added]
+    for prefix, removed, rows_by_key, sub_dirs in (
+            ('v2', v2_removed, v2_by_key, ('controllers', 'scripts')),
+            ('v1', v1_removed, v1_by_key, ('strategies',))):
+        live_fnames = {strategy_fname(prefix, key) for key in rows_by_key}
+        for fname in sorted({strategy_fname(prefix, key) for key in removed} - live_fnames):
+            for name in remaining_bots:
+                for sub_dir in sub_dirs:
+                    remove_path(ctx, os.path.join(ctx.conf_output_dir, name, sub_dir, fname))
+            print(f"已删除 {prefix} 策略文件: {fname}")
+
+    # 凭证或connector模板变化的机器人需要重新生成connector配置
+    connector_templates = {name[:-len('_connector.yml')] for name in templates_changed
+                           if name.endswith('_connector.yml')}
+    connector_targets = set(bots_added) | bots_changed | {
+        key for key, bot in bots_by_key.items() if bot.connector in connector_templates
+    }
+
+    new_bots = [bot for bot in bots if bot.name in bots_added]
+    # 修改过的机器人（例如 script_config 变化）的分配关系可能改变，与新机器人一样重新分发全部策略，
+    # 内容未变化的文件由清单跳过写入
+    reassigned_bots = [bot for bot in bots if bot.name in bots_added | bots_changed]
+    existing_bots = [bot for bot in bots if bot.name and bot.name not in bots_added | bots_changed]
+
+    def strategy_jobs(templates, rows_by_key, added, changed):
+        # 模板变化时所有策略都要重新渲染，否则只渲染新增/修改的策略，新增和修改过的机器人获得分配给它的全部策略
+        rows = list(rows_by_key.values())
+        if templates & templates_changed:
+            return [(bots, rows)] if rows else []
+        dirty = [row for key, row in rows_by_key.items() if key in added | changed]
+        clean = [row for key, row in rows_by_key.items() if key not in added | changed]
+        jobs = []
+        if dirty and existing_bots:
+            jobs.append((existing_bots, dirty))
+        if reassigned_bots and rows:
+            jobs.append((reassigned_bots, dirty + clean))
+        return jobs
+
+    return {
+        'compose': bool(bots_added or bots_removed or bots_changed),
+        'directories': new_bots,
+        'v2': strategy_jobs(set(V2_TEMPLATE_FILES), v2_by_key, v2_added, v2_changed),
+        'v1': strategy_jobs(set(V1_TEMPLATE_FILES), v1_by_key, v1_added, v1_changed),
+        'connectors': connector_targets,
+    }
+
+
+class StageTimings:
+    """记录各编号阶段的墙钟时间、CPU时间以及写入文件数、字节数、PBKDF2派生次数和模板渲染次数"""
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.stages = []
+
+    def _counters(self):
+        times = os.times()
+        manifest = self.ctx.manifest
+        return {
+            'wall': time.perf_counter(),
+            # 包含已结束的加密工作进程的CPU时间
+            'cpu': time.process_time() + times.children_user + times.children_system,
+            'files_written': manifest.written,
+            'bytes_written': manifest.bytes_written,
+            'pbkdf2_derivations': self.ctx.pbkdf2_derivations,
+            'template_renders': CompiledTemplate.renders,
+        }
+
+    @contextlib.contextmanager
+    def stage(self, stage_id, name):
+        """统计 with 块内的耗时和计数器增量"""
+        before = self._counters()
+        try:
+            yield
+        finally:
+            after = self._counters()
+            record = {'stage': stage_id, 'name': name}
+            record.update({key: after[key] - before[key] for key in before})
+            record['wall'] = round(record['wall'], 6)
+            record['cpu'] = round(record['cpu'], 6)
+            self.stages.append(record)
+
+    def report(self):
+        """返回JSON可序列化的报告"""
+        return {
+            'config_folder': self.ctx.config_folder or '.',
+            'stages': self.stages,
+            'total': {
+                key: round(sum(stage[key] for stage in self.stages), 6) if key in ('wall', 'cpu')
+                else sum(stage[key] for stage in self.stages)
+                for key in ('wall', 'cpu', 'files_written', 'bytes_written', 'pbkdf2_derivations', 'template_renders')
+            },
+        }
+
+    def write_report(self, destination):
+        """输出报告，destination 为 '-' 时打印到标准输出，否则写入文件"""
+        content = json.dumps(self.report(), indent=2, ensure_ascii=False)
+        if destination == '-':
+            print(content)
+        else:
+            with open(destination, 'w', encoding='utf-8') as f:
+                f.write(content + '\n')
+            print(f"阶段耗时报告已保存到 {destination}")
+
+
+class PrepareContext:
+    """单次运行（单个配置文件夹）的路径和生成状态，替代原来的模块级全局变量"""
+
+    def __init__(self, config_folder=None):
+        self.config_folder = config_folder
+        # 未指定配置文件夹时使用当前目录
+        base_dir = config_folder or ''
+
+        self.bots_csv_file = os.path.join(base_dir, DEFAULT_BOTS_CSV_FILE)
+        self.strategy_csv_file = os.path.join(base_dir, DEFAULT_STRATEGY_CSV_FILE)
+        self.strategy_v1_csv_file = os.path.join(base_dir, DEFAULT_STRATEGY_V1_CSV_FILE)
+        self.yml_file = os.path.join(base_dir, DEFAULT_YML_FILE)
+        self.services_index_file = os.path.join(base_dir, SERVICES_INDEX_FILE)
+        self.hash_cache_file = os.path.join(base_dir, DEFAULT_HASH_CACHE_FILE)
+        self.credential_cache_file = os.path.join(base_dir, DEFAULT_CREDENTIAL_CACHE_FILE)
+        self.state_file = os.path.join(base_dir, DEFAULT_STATE_FILE)
+        self.manifest_file = os.path.join(base_dir, DEFAULT_MANIFEST_FILE)
 
         # 输出目录仍然在配置文件夹下
-        CONF_OUTPUT_DIR = os.path.join(config_folder, DEFAULT_CONF_OUTPUT_DIR)
-        LOGS_OUTPUT_DIR = os.path.join(config_folder, DEFAULT_LOGS_OUTPUT_DIR)
-        DATA_OUTPUT_DIR = os.path.join(config_folder, DEFAULT_DATA_OUTPUT_DIR)
+        self.conf_output_dir = os.path.join(base_dir, DEFAULT_CONF_OUTPUT_DIR)
+        self.logs_output_dir = os.path.join(base_dir, DEFAULT_LOGS_OUTPUT_DIR)
+        self.data_output_dir = os.path.join(base_dir, DEFAULT_DATA_OUTPUT_DIR)
+        self.content_store_dir = os.path.join(base_dir, DEFAULT_CONTENT_STORE_DIR)
 
         # 模板目录仍在根目录
-        TEMPLATES_DIR = DEFAULT_TEMPLATES_DIR
-    else:
-        # 使用默认路径（当前目录）
-        BOTS_CSV_FILE = DEFAULT_BOTS_CSV_FILE
-        STRATEGY_CSV_FILE = DEFAULT_STRATEGY_CSV_FILE
-        STRATEGY_V1_CSV_FILE = DEFAULT_STRATEGY_V1_CSV_FILE
-        YML_FILE = DEFAULT_YML_FILE
-        TEMPLATES_DIR = DEFAULT_TEMPLATES_DIR
-        HASH_CACHE_FILE = DEFAULT_HASH_CACHE_FILE
-        CONF_OUTPUT_DIR = DEFAULT_CONF_OUTPUT_DIR
-        LOGS_OUTPUT_DIR = DEFAULT_LOGS_OUTPUT_DIR
-        DATA_OUTPUT_DIR = DEFAULT_DATA_OUTPUT_DIR
+        self.templates_dir = DEFAULT_TEMPLATES_DIR
+
+        self.manifest = OutputManifest.load(config_folder or '.', self.manifest_file)
+        # 上次运行的哈希缓存和生成状态，watch 模式下跨周期保留在内存中
+        self.hash_cache = None
+        self.generation_state = None
+
+        # 本次运行的PBKDF2密钥派生次数和各阶段耗时（--timings）
+        self.pbkdf2_derivations = 0
+        self.timings = StageTimings(self)
+        # 生成文件的写入线程池，由 run_prepare 按 --io-threads 创建
+        self.writer = ParallelWriter()
+        # 策略行 -> 机器人的分配结果（None 表示分发到所有机器人）
+        self.assignments = None
+
+
+def setup_paths(config_folder=None):
+    """根据配置文件夹创建本次运行的上下文"""
+    return PrepareContext(config_folder)
 
 
 # ========== 主执行逻辑 ==========
-def main():
-    # 解析命令行参数
-    config_folder = None
-    if len(sys.argv) > 1:
-        config_folder = sys.argv[1]
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="HummingBot 配置生成器")
+    parser.add_argument('config_folder', nargs='?', default=None,
+                        help="配置文件夹名（默认使用当前目录）")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="凭证加密使用的进程数（默认等于CPU核数）")
+    parser.add_argument('--check', action='store_true',
+                        help="按生成清单校验配置文件夹中的文件，不重新生成")
+    parser.add_argument('--full', action='store_true',
+                        help="忽略上次生成状态，清理后全量重新生成")
+    parser.add_argument('--all', action='store_true',
+                        help="批量处理当前目录下所有包含 bots.csv 的配置文件夹")
+    parser.add_argument('--folders', default=None,
+                        help="批量处理指定的配置文件夹，逗号分隔，例如 ads_31,ads_32")
+    parser.add_argument('--parallel', type=int, default=None,
+                        help="批量模式下同时处理的配置文件夹数（默认等于CPU核数）")
+    parser.add_argument('--watch', action='store_true',
+                        help="常驻监听CSV和模板文件，变化后自动增量重新生成")
+    parser.add_argument('--debounce', type=float, default=0.5,
+                        help="watch 模式下合并连续变化的等待时间（秒，默认 0.5）")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="inotify 不可用时的轮询间隔（秒，默认 1.0）")
+    parser.add_argument('--assign-all', action='store_true',
+                        help="把每个策略分发到所有机器人（旧行为），默认只分发到引用它或在 bots 列中列出的机器人")
+    parser.add_argument('--shard-compose', action='store_true',
+                        help="按 bots.csv 的 group 列把服务拆分到 docker-compose.<group>.yml（没有分组的留在 override 文件）")
+    parser.add_argument('--strict', action='store_true',
+                        help="CSV缺少模板变量时中止（在创建目录和加密之前检查）")
+    parser.add_argument('--io-threads', type=int, default=DEFAULT_WRITER_THREADS,
+                        help=f"写入生成文件的线程数（默认 {DEFAULT_WRITER_THREADS}，1 表示同步写入）")
+    parser.add_argument('--timings', nargs='?', const='-', default=None, metavar='FILE',
+                        help="输出各阶段耗时的JSON报告（不指定文件时打印到标准输出）")
+    parser.add_argument('--profile', nargs='?', const='prepare.pstats', default=None, metavar='FILE',
+                        help="使用 cProfile 运行并保存 .pstats 文件（默认 prepare.pstats）")
+    parser.add_argument('--bundle', nargs='?', const=DEFAULT_BUNDLE_CODEC, default=None,
+                        choices=sorted(BUNDLE_CODECS),
+                        help=f"另外生成去重压缩的部署包（默认 {DEFAULT_BUNDLE_CODEC}，服务器上用 unpack-bundle.sh 解包）")
+    parser.add_argument('--kdf-work-factor', type=int, default=None,
+                        help="PBKDF2迭代次数（仅用于测试和基准测试，降低后密钥文件强度降低）")
+    parser.add_argument('--verify-cache', action='store_true',
+                        help="复用缓存凭证前使用密码重新校验（每个机器人一次密钥派生）")
+    return parser.parse_args(argv)
+
+
+def run_prepare(config_folder, args, ctx=None):
+    """
+    为单个配置文件夹生成配置，返回本次运行的上下文
+    传入上次的 ctx 时复用其中的清单和状态（watch 模式）
+    """
+    if config_folder:
         if not os.path.isdir(config_folder):
             print(f"错误: 配置文件夹 '{config_folder}' 不存在")
             sys.exit(1)
@@ -658,134 +1429,370 @@ def main():
         print("使用当前目录作为配置文件夹")
 
     # 设置文件路径
-    setup_paths(config_folder)
+    if ctx is None:
+        ctx = setup_paths(config_folder)
+    ctx.manifest.reset_counters()
+    ctx.pbkdf2_derivations = 0
+    ctx.timings = StageTimings(ctx)
+    ctx.writer = ParallelWriter(args.io_threads)
+    ctx.manifest.writer = ctx.writer
 
     print("HummingBot 配置生成器 v2.0")
     print("=" * 50)
 
     # 检查必要文件是否存在
-    if not os.path.exists(BOTS_CSV_FILE):
-        print(f"错误: 找不到 {BOTS_CSV_FILE} 文件")
+    if not os.path.exists(ctx.bots_csv_file):
+        print(f"错误: 找不到 {ctx.bots_csv_file} 文件")
         sys.exit(1)
 
-    if not os.path.exists(STRATEGY_CSV_FILE):
-        print(f"错误: 找不到 {STRATEGY_CSV_FILE} 文件")
+    if not os.path.exists(ctx.strategy_csv_file):
+        print(f"错误: 找不到 {ctx.strategy_csv_file} 文件")
         sys.exit(1)
 
+    # 只按清单校验已生成的文件，不做任何渲染
+    if args.check:
+        sys.exit(0 if check_output_manifest(ctx) else 1)
+
     # 检查文件是否发生变化
-    files_changed, current_hashes = check_files_changed()
+    with ctx.timings.stage('0', '变化检测'):
+        files_changed, current_hashes = check_files_changed(ctx, {'assign_all': args.assign_all,
+                                                                 'shard_compose': args.shard_compose})
 
-    if not files_changed:
-        print("CSV 文件未发生变化，跳过重新生成")
-        return
+    # 旧版本的策略文件是 .conf_store 的硬链接，需要全量生成一次替换为独立文件
+    legacy_store = os.path.isdir(ctx.content_store_dir)
 
-    # 如果文件有变化，清理旧配置
-    if files_changed:
-        clean_generated_files()
-
-        # 在生成新的配置文件之前，删除整个输出目录（例如 conf 文件夹），
-        # 以确保生成的是干净的状态。
-        # 安全检查：仅当输出目录的 basename 与 DEFAULT_CONF_OUTPUT_DIR 相同时才删除，避免误删。
-        try:
-            normalized_base = os.path.basename(os.path.normpath(CONF_OUTPUT_DIR))
-            if normalized_base == DEFAULT_CONF_OUTPUT_DIR and os.path.exists(CONF_OUTPUT_DIR) and os.path.isdir(CONF_OUTPUT_DIR):
-                shutil.rmtree(CONF_OUTPUT_DIR)
-                print(f"已删除输出目录: {CONF_OUTPUT_DIR}")
-        except Exception as e:
-            print(f"删除输出目录 {CONF_OUTPUT_DIR} 时出错: {e}")
+    if not files_changed and not args.full and not legacy_store:
+        print("CSV 和模板文件未发生变化，跳过重新生成")
+        # 宿主机脚本可能变化，部署包仍然需要检查
+        if args.bundle:
+            with ctx.timings.stage('8', '生成部署包'):
+                generate_deploy_bundle(ctx, args.bundle)
+        return ctx
 
     # ---------- 1. 读取 bots.csv ----------
-    print("读取 bots.csv...")
-    bots = []
-    with open(BOTS_CSV_FILE, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        bots = [row for row in reader]
-
-        # 过滤空行和无效数据
-        bots = [bot for bot in bots if bot and any(bot.values())]
-
-        # 检查数据是否为空
-        if not bots:
-            print(f"错误: {BOTS_CSV_FILE} 文件为空")
-            sys.exit(1)
-
-        # 验证必要字段
-        validate_csv_data(bots, BOTS_CSV_FILE, ['name'])
-
-    print(f"读取到 {len(bots)} 个机器人配置")
+    with ctx.timings.stage('1', '读取 bots.csv'):
+        print("读取 bots.csv...")
+        bots = read_csv_rows(ctx.bots_csv_file, BotRecord, ['name'])
+        print(f"读取到 {len(bots)} 个机器人配置")
 
     # ---------- 2. 读取 strategy.csv ----------
-    print("读取 strategy.csv...")
-    strategies = []
-    with open(STRATEGY_CSV_FILE, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        strategies = [row for row in reader]
-
-        # 过滤空行和无效数据
-        strategies = [strategy for strategy in strategies if strategy and any(strategy.values())]
-
-        # 检查数据是否为空
-        if not strategies:
-            print(f"错误: {STRATEGY_CSV_FILE} 文件为空")
-            sys.exit(1)
-
-        # 验证必要字段
-        validate_csv_data(strategies, STRATEGY_CSV_FILE, ['market', 'version'])
-
-    print(f"读取到 {len(strategies)} 个策略配置")
+    with ctx.timings.stage('2', '读取 strategy.csv'):
+        print("读取 strategy.csv...")
+        strategies = read_csv_rows(ctx.strategy_csv_file, StrategyRecord, ['market', 'version'])
+        print(f"读取到 {len(strategies)} 个策略配置")
 
     # ---------- 2.5. 读取 strategies-v1.csv ----------
-    v1_strategies = []
-    if os.path.exists(STRATEGY_V1_CSV_FILE):
-        print("读取 strategies-v1.csv...")
-        with open(STRATEGY_V1_CSV_FILE, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            v1_strategies = [row for row in reader]
-
-            # 过滤空行和无效数据
-            v1_strategies = [strategy for strategy in v1_strategies if strategy and any(strategy.values())]
-
+    with ctx.timings.stage('2.5', '读取 strategies-v1.csv'):
+        v1_strategies = []
+        if os.path.exists(ctx.strategy_v1_csv_file):
+            print("读取 strategies-v1.csv...")
+            v1_strategies = read_csv_rows(ctx.strategy_v1_csv_file, StrategyRecord, ['version', 'market'],
+                                          allow_empty=True)
             if v1_strategies:
-                # 验证必要字段
-                validate_csv_data(v1_strategies, STRATEGY_V1_CSV_FILE, ['version', 'market'])
                 print(f"读取到 {len(v1_strategies)} 个 v1 策略配置")
             else:
                 print("strategies-v1.csv 文件为空，跳过 v1 策略生成")
-    else:
-        print("未找到 strategies-v1.csv 文件，跳过 v1 策略生成")
+        else:
+            print("未找到 strategies-v1.csv 文件，跳过 v1 策略生成")
+
+    # 在创建目录和加密之前检查模板变量，--strict 时有缺失直接中止
+    with ctx.timings.stage('2.7', '检查模板变量'):
+        check_fname_collisions(ctx, strategies, v1_strategies)
+        missing = check_placeholder_coverage(ctx, bots, strategies, v1_strategies)
+        if missing:
+            print_placeholder_matrix(missing)
+            if args.strict:
+                print("错误: 存在缺失的模板变量（--strict），未生成任何文件")
+                sys.exit(1)
+
+    # 有上次生成状态时只重新生成变化的部分，否则清理旧配置后全量生成
+    with ctx.timings.stage('plan', '生成计划'):
+        ctx.assignments = assign_strategies(bots, strategies, v1_strategies, args.assign_all)
+
+        state = None if args.full else load_generation_state(ctx)
+        # 分配方式变化（包括旧版本生成的、相当于 --assign-all 的状态）时按全量生成处理
+        if state is not None and state.get('assign_all', True) != args.assign_all:
+            print("策略分配方式已变化，全量重新生成")
+            state = None
+        if state is not None and legacy_store:
+            print("策略文件由硬链接改为独立文件，全量重新生成")
+            state = None
+        full_rebuild = state is None or not os.path.isdir(ctx.conf_output_dir)
+        # --full 时不信任清单，跳过写入前重新校验磁盘上的文件内容
+        ctx.manifest.verify_content = args.full
+        if not full_rebuild:
+            plan = plan_incremental_generation(ctx, state, bots, strategies, v1_strategies,
+                                               current_hashes['templates'])
+            # compose 拆分方式变化（或旧版本的状态还没有服务索引）时重新生成 compose 文件
+            if state.get('shard_compose') != args.shard_compose:
+                plan['compose'] = True
+        elif ctx.manifest.entries:
+            # 有生成清单时不删除输出目录：全量生成时内容未变化的文件保持不动，结束后再清理多余文件
+            print("全量重新生成（内容未变化的文件不会重写）...")
+            plan = full_generation_plan(bots, strategies, v1_strategies)
+        else:
+            clean_generated_files(ctx)
+
+            # 在生成新的配置文件之前，删除整个输出目录（例如 conf 文件夹），
+            # 以确保生成的是干净的状态。
+            # 安全检查：仅当输出目录的 basename 与 DEFAULT_CONF_OUTPUT_DIR 相同时才删除，避免误删。
+            try:
+                normalized_base = os.path.basename(os.path.normpath(ctx.conf_output_dir))
+                if normalized_base == DEFAULT_CONF_OUTPUT_DIR and os.path.exists(ctx.conf_output_dir) and os.path.isdir(ctx.conf_output_dir):
+                    shutil.rmtree(ctx.conf_output_dir)
+                    print(f"已删除输出目录: {ctx.conf_output_dir}")
+            except Exception as e:
+                print(f"删除输出目录 {ctx.conf_output_dir} 时出错: {e}")
+
+            plan = full_generation_plan(bots, strategies, v1_strategies)
 
     # ---------- 3. 生成 docker-compose.override.yml ----------
-    print("生成 docker-compose.override.yml...")
-    generate_docker_compose(bots)
+    with ctx.timings.stage('3', '生成 docker-compose.override.yml'):
+        if plan['compose']:
+            print("生成 docker-compose.override.yml...")
+            generate_docker_compose(ctx, bots, args.shard_compose)
 
     # ---------- 4. 创建目录结构 ----------
-    print("创建目录结构...")
-    create_directories(bots)
-
-    # strategies 目录不再需要，因为文件保存到各机器人的 controllers 目录
-    # os.makedirs('strategies', exist_ok=True)
+    with ctx.timings.stage('4', '创建目录结构'):
+        if plan['directories']:
+            print("创建目录结构...")
+            create_directories(ctx, plan['directories'])
 
     # ---------- 5. 生成 v2 策略文件 ----------
-    print("生成 v2 策略文件...")
-    generate_v2_strategy_files(bots, strategies)
+    with ctx.timings.stage('5', '生成 v2 策略文件'):
+        for target_bots, target_strategies in plan['v2']:
+            print("生成 v2 策略文件...")
+            generate_v2_strategy_files(ctx, target_bots, target_strategies)
 
     # ---------- 5.5. 生成 v1 策略文件 ----------
-    if v1_strategies:
-        print("生成 v1 策略文件...")
-        generate_v1_strategy_files(bots, v1_strategies)
+    with ctx.timings.stage('5.5', '生成 v1 策略文件'):
+        for target_bots, target_strategies in plan['v1']:
+            print("生成 v1 策略文件...")
+            generate_v1_strategy_files(ctx, target_bots, target_strategies)
 
     # ---------- 6. 生成connector配置文件 ----------
-    if HUMMINGBOT_AVAILABLE:
-        print("使用HummingBot标准加密生成connector配置文件...")
-        generate_connector_configs(bots)
-    else:
-        print("跳过connector配置生成（请安装依赖：pip install -r requirements-crypto.txt）")
+    with ctx.timings.stage('6', '生成connector配置文件'):
+        if plan['connectors'] is None or plan['connectors']:
+            if not any(bot.has_credentials for bot in bots):
+                # 没有机器人需要加密时不导入加密模块
+                print("跳过connector配置生成（没有机器人提供API凭证）")
+            elif hummingbot_available():
+                print("使用HummingBot标准加密生成connector配置文件...")
+                generate_connector_configs(ctx, bots, args.jobs, args.verify_cache, plan['connectors'],
+                                           args.kdf_work_factor)
+            else:
+                print("跳过connector配置生成（请安装依赖：pip install -r requirements-crypto.txt）")
+
+    # 等待后台写入完成，写入失败的文件统一报告
+    with ctx.timings.stage('write', '等待文件写入完成'):
+        flush_writes(ctx)
+        ctx.writer.close()
+
+    # ---------- 7. 清理旧文件并保存哈希缓存 ----------
+    with ctx.timings.stage('7', '清理旧文件并保存缓存'):
+        # connector 或凭证变化后，旧的connector文件需要删除
+        if plan['connectors']:
+            remove_stale_connector_files(ctx, plan['connectors'])
+
+        # 分配关系变化后，机器人不再使用的策略文件需要删除
+        remove_unassigned_strategy_files(ctx, bots, strategies, v1_strategies)
+
+        # 全量生成时删除本次没有生成的旧文件，保证输出目录与CSV一致
+        if full_rebuild:
+            remove_unproduced_outputs(ctx, bots)
+
+        save_hash_cache(ctx, current_hashes)
+        save_generation_state(ctx, bots, strategies, v1_strategies, current_hashes['templates'], args.assign_all,
+                              args.shard_compose)
+        ctx.manifest.save()
+        print(f"写入 {ctx.manifest.written} 个文件，内容未变化跳过 {ctx.manifest.suppressed} 个")
 
-    # ---------- 7. 保存哈希缓存 ----------
-    save_hash_cache(current_hashes)
+        # 策略文件都已写成独立文件后，删除旧版本的内容存储
+        remove_content_store(ctx)
+
+    # ---------- 8. 生成部署包 ----------
+    if args.bundle:
+        with ctx.timings.stage('8', '生成部署包'):
+            generate_deploy_bundle(ctx, args.bundle)
 
     print("=" * 50)
     print("完成：所有配置文件和目录结构均已生成")
+    return ctx
+
+
+# ========== watch 模式 ==========
+
+def run_watch(config_folder, args):
+    """
+    常驻监听CSV和模板文件，变化后在同一进程内增量重新生成
+    编译后的模板、加密模块、哈希缓存和生成状态都保留在内存中
+    """
+    from watch_utils import create_watcher, name_filter, wait_for_changes
+
+    base_dir = config_folder or '.'
+    watches = {
+        base_dir: name_filter([DEFAULT_BOTS_CSV_FILE, DEFAULT_STRATEGY_CSV_FILE, DEFAULT_STRATEGY_V1_CSV_FILE]),
+    }
+    if os.path.isdir(DEFAULT_TEMPLATES_DIR):
+        watches[DEFAULT_TEMPLATES_DIR] = name_filter(suffix='.yml')
+
+    ctx = None
+
+    def run_cycle(reason):
+        nonlocal ctx
+        started = time.perf_counter()
+        try:
+            ctx = run_prepare(config_folder, args, ctx)
+            status = f"写入 {ctx.manifest.written} 个文件，跳过 {ctx.manifest.suppressed} 个"
+            if args.timings:
+                ctx.timings.write_report(args.timings)
+        except SystemExit as e:
+            status = f"失败（退出码 {e.code}）"
+        except Exception as e:
+            status = f"失败: {e}"
+        elapsed = time.perf_counter() - started
+        print(f"[{time.strftime('%H:%M:%S')}] {reason}，耗时 {elapsed * 1000:.0f} ms，{status}", flush=True)
+
+    run_cycle("初始生成")
+
+    watcher = create_watcher(watches, args.poll_interval)
+    print(f"监听 {', '.join(sorted(watches))} 中的文件变化（{watcher.name}，防抖 {args.debounce}s），按 Ctrl+C 退出",
+          flush=True)
+    try:
+        while True:
+            changed = wait_for_changes(watcher, args.debounce)
+            names = sorted(os.path.relpath(path) for path in changed)
+            run_cycle(f"检测到变化: {', '.join(names)}")
+    except KeyboardInterrupt:
+        print("\n已停止监听")
+    finally:
+        watcher.close()
+
+
+# ========== 多配置文件夹批量模式 ==========
+
+def find_config_folders(root='.'):
+    """查找包含 bots.csv 的配置文件夹"""
+    return sorted(
+        name for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name, DEFAULT_BOTS_CSV_FILE))
+    )
+
+
+def prepare_folder_worker(config_folder, args):
+    """在工作进程中处理单个配置文件夹，捕获输出并返回结果摘要"""
+    output = io.StringIO()
+    started = time.perf_counter()
+    result = {'folder': config_folder, 'ok': False, 'written': 0, 'suppressed': 0, 'error': ''}
+
+    with contextlib.redirect_stdout(output):
+        try:
+            ctx = run_prepare(config_folder, args)
+            result['ok'] = True
+            result['written'] = ctx.manifest.written
+            result['suppressed'] = ctx.manifest.suppressed
+            result['timings'] = ctx.timings.report()
+        except SystemExit as e:
+            # 校验失败等情况会调用 sys.exit
+            result['ok'] = not e.code
+            if e.code:
+                result['error'] = f"退出码 {e.code}"
+        except Exception as e:
+            result['error'] = str(e)
+
+    result['seconds'] = time.perf_counter() - started
+    result['output'] = output.getvalue()
+    return result
+
+
+def run_batch(config_folders, args):
+    """并行处理多个配置文件夹，输出每个文件夹的摘要，有失败时返回 False"""
+    parallel = max(1, min(args.parallel or os.cpu_count() or 1, len(config_folders)))
+    if args.jobs is None:
+        # 文件夹之间已经并行，每个文件夹内的加密进程数按CPU核数平分
+        args.jobs = max(1, (os.cpu_count() or 1) // parallel)
+
+    print(f"批量处理 {len(config_folders)} 个配置文件夹（并行 {parallel} 个）")
+
+    results = {}
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=parallel) as executor:
+        futures = {executor.submit(prepare_folder_worker, folder, args): folder for folder in config_folders}
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'folder': folder, 'ok': False, 'written': 0, 'suppressed': 0,
+                          'error': str(e), 'seconds': 0.0, 'output': ''}
+            results[folder] = result
+
+            print(f"===== {folder} =====")
+            print(result['output'], end='')
+
+    # 按文件夹顺序输出摘要，保证输出稳定
+    print("=" * 50)
+    print(f"{'配置文件夹':<16} {'状态':<8}{'耗时(s)':>10}{'写入':>8}{'跳过':>8}")
+    for folder in config_folders:
+        result = results[folder]
+        status = "成功" if result['ok'] else "失败"
+        print(f"{folder:<16} {status:<8}{result['seconds']:>10.2f}{result['written']:>8}{result['suppressed']:>8}"
+              + (f"  {result['error']}" if result['error'] else ""))
+
+    if args.timings:
+        reports = [results[folder]['timings'] for folder in config_folders if 'timings' in results[folder]]
+        content = json.dumps(reports, indent=2, ensure_ascii=False)
+        if args.timings == '-':
+            print(content)
+        else:
+            with open(args.timings, 'w', encoding='utf-8') as f:
+                f.write(content + '\n')
+            print(f"阶段耗时报告已保存到 {args.timings}")
+
+    failed = [folder for folder in config_folders if not results[folder]['ok']]
+    print(f"完成 {len(config_folders) - len(failed)}/{len(config_folders)} 个配置文件夹")
+    return not failed
+
+
+def main():
+    # 解析命令行参数
+    args = parse_args()
+
+    if args.all or args.folders:
+        if args.config_folder:
+            print("错误: --all/--folders 不能与配置文件夹参数同时使用")
+            sys.exit(1)
+
+        config_folders = find_config_folders() if args.all else [
+            folder.strip() for folder in args.folders.split(',') if folder.strip()]
+        if not config_folders:
+            print("错误: 没有找到需要处理的配置文件夹")
+            sys.exit(1)
+
+        sys.exit(0 if run_batch(config_folders, args) else 1)
+
+    if args.watch:
+        if args.check:
+            print("错误: --watch 不能与 --check 同时使用")
+            sys.exit(1)
+        run_watch(args.config_folder, args)
+        return
+
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            ctx = profiler.runcall(run_prepare, args.config_folder, args)
+        finally:
+            profiler.dump_stats(args.profile)
+            print(f"性能分析结果已保存到 {args.profile}（查看: python -m pstats {args.profile}）")
+    else:
+        ctx = run_prepare(args.config_folder, args)
+
+    if args.timings:
+        ctx.timings.write_report(args.timings)
 
 
 if __name__ == "__main__":
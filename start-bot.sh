@@ -2,7 +2,9 @@
 set -e
 
 # 配置变量
-START_INTERVAL_MINUTES=3  # 机器人启动间隔（分钟）
+LAUNCH_MODE=adaptive      # adaptive: 由 launch_scheduler.py 在容器稳定后启动下一批；fixed: 固定间隔启动
+LAUNCH_OPTIONS=""         # 传给 launch_scheduler.py 的参数，例如 "--max-starting 4 --settle 60"
+START_INTERVAL_MINUTES=3  # 固定间隔模式下的机器人启动间隔（分钟）
 RANDOMIZE_ORDER=true      # 是否随机化启动顺序
 BOTS_PER_BATCH=1         # 每次启动的机器人数量（批次大小），可修改为1,2,3...
 
@@ -10,17 +12,38 @@ BOTS_PER_BATCH=1         # 每次启动的机器人数量（批次大小），
 show_help() {
     echo "HummingBot 机器人启动脚本"
     echo ""
-    echo "用法: $0"
+    echo "用法: $0 [--fixed]"
     echo ""
     echo "功能:"
     echo "  - 读取 ~/ex-bot/docker-compose.override.yml 中的 services"
-    echo "  - 每隔 $START_INTERVAL_MINUTES 分钟启动一个机器人"
+    echo "  - 默认由 ~/launch_scheduler.py 自适应启动：上一批容器稳定、主机负载和内存允许时启动下一批，"
+    echo "    共用代理或 API key 的机器人错开启动（调度器在 tmux 的 launcher 窗口中运行）"
+    echo "  - --fixed: 每隔 $START_INTERVAL_MINUTES 分钟启动一个机器人（旧行为，服务器没有 python3 时自动使用）"
+    echo "    （延迟启动任务保存在 ~/ex-bot/launch_jobs.db，由 ~/launch_jobs.py 的调度进程执行；没有 python3 时使用 at）"
+    echo "    （同时在 crontab 中加入 @reboot 条目，服务器重启后调度进程自动继续执行剩余的任务）"
     echo "  - 使用 tmux 管理机器人会话"
     echo "  - 随机化启动顺序 (可通过 RANDOMIZE_ORDER 变量控制)"
     echo ""
     echo "注意: 确保 ~/ex-bot/docker-compose.override.yml 文件存在"
 }
 
+case "$1" in
+    -h|--help)
+        show_help
+        exit 0
+        ;;
+    --fixed)
+        LAUNCH_MODE=fixed
+        ;;
+    "")
+        ;;
+    *)
+        echo "未知参数: $1"
+        show_help
+        exit 1
+        ;;
+esac
+
 # 检查是否在正确的目录
 if [ ! -f ~/ex-bot/docker-compose.override.yml ]; then
     echo "错误: 找不到 ~/ex-bot/docker-compose.override.yml 文件"
@@ -33,36 +56,42 @@ echo "读取 ~/ex-bot/docker-compose.override.yml 中的 services..."
 # 切换到ex-bot目录
 cd ~/ex-bot
 
-# 从docker-compose.override.yml读取services
+# 读取机器人名称：优先使用 prepare.py 生成的服务索引 services.tsv（第一行为列名），没有时解析 docker-compose.override.yml
 BOT_NAMES=()
-in_services=false
-while IFS= read -r line; do
-    # 检测services段落开始
-    if [[ "$line" =~ ^[[:space:]]*services:[[:space:]]*$ ]]; then
-        in_services=true
-        continue
-    fi
+if [ -f services.tsv ]; then
+    while IFS=$'\t' read -r service_name _; do
+        [ -n "$service_name" ] && BOT_NAMES+=("$service_name")
+    done < <(tail -n +2 services.tsv)
+else
+    in_services=false
+    while IFS= read -r line; do
+        # 检测services段落开始
+        if [[ "$line" =~ ^[[:space:]]*services:[[:space:]]*$ ]]; then
+            in_services=true
+            continue
+        fi
 
-    # 如果不在services段落中，跳过
-    if [ "$in_services" = false ]; then
-        continue
-    fi
+        # 如果不在services段落中，跳过
+        if [ "$in_services" = false ]; then
+            continue
+        fi
 
-    # 检测到新的顶级段落，退出services
-    if [[ "$line" =~ ^[a-zA-Z] ]] && [[ ! "$line" =~ ^[[:space:]] ]]; then
-        in_services=false
-        continue
-    fi
+        # 检测到新的顶级段落，退出services
+        if [[ "$line" =~ ^[a-zA-Z] ]] && [[ ! "$line" =~ ^[[:space:]] ]]; then
+            in_services=false
+            continue
+        fi
 
-    # 在services段落中，匹配服务名
-    if [[ "$line" =~ ^[[:space:]]+([a-zA-Z0-9_-]+):[[:space:]]*$ ]]; then
-        service_name="${BASH_REMATCH[1]}"
-        # 跳过配置项（如 build, logging, environment, volumes 等）
-        if [[ "$service_name" != "build" && "$service_name" != "logging" && "$service_name" != "environment" && "$service_name" != "volumes" && "$service_name" != "options" && "$service_name" != "container_name" ]]; then
-            BOT_NAMES+=("$service_name")
+        # 在services段落中，匹配服务名
+        if [[ "$line" =~ ^[[:space:]]+([a-zA-Z0-9_-]+):[[:space:]]*$ ]]; then
+            service_name="${BASH_REMATCH[1]}"
+            # 跳过配置项（如 build, logging, environment, volumes 等）
+            if [[ "$service_name" != "build" && "$service_name" != "logging" && "$service_name" != "environment" && "$service_name" != "volumes" && "$service_name" != "options" && "$service_name" != "container_name" ]]; then
+                BOT_NAMES+=("$service_name")
+            fi
         fi
-    fi
-done < docker-compose.override.yml
+    done < docker-compose.override.yml
+fi
 
 # 检查是否读取到机器人名称
 if [ ${#BOT_NAMES[@]} -eq 0 ]; then
@@ -135,6 +164,44 @@ if ! tmux has-session -t "$SESSION" 2>/dev/null; then
     tmux new-session -d -s "$SESSION"
 fi
 
+# 自适应启动：把（已随机化的）机器人列表交给启动调度器，在 launcher 窗口中运行直到全部稳定或失败
+if [ "$LAUNCH_MODE" = adaptive ]; then
+    if ! command -v python3 >/dev/null 2>&1 || [ ! -f ~/launch_scheduler.py ] || [ ! -f services.tsv ]; then
+        echo "警告: 缺少 python3、~/launch_scheduler.py 或 services.tsv，使用固定间隔启动"
+        LAUNCH_MODE=fixed
+    fi
+fi
+
+if [ "$LAUNCH_MODE" = adaptive ]; then
+    if tmux list-windows -t "$SESSION" -F "#{window_name}" | grep -Fxq "launcher"; then
+        echo "错误: 启动调度器已在运行（tmux 窗口 launcher），请等待完成或关闭该窗口后重试"
+        exit 1
+    fi
+    tmux new-window -d -t "$SESSION:" -n launcher \
+        "python3 ~/launch_scheduler.py --session '$SESSION' --no-shuffle $LAUNCH_OPTIONS ${BOT_NAMES[*]} 2>&1 | tee ~/ex-bot/launch.log; echo '按回车关闭窗口'; read"
+    echo "="
+    echo "已启动自适应启动调度器: ${#BOT_NAMES[@]} 个机器人"
+    echo "使用 'tmux select-window -t launcher' 查看启动进度（日志: ~/ex-bot/launch.log）"
+    echo "使用 'python3 ~/launch_scheduler.py --dry-run' 查看当前的主机指标和启动决策"
+    echo "="
+    exit 0
+fi
+
+# 机器人所在的 compose 文件（services.tsv 的第二列）不是默认文件时（prepare.py --shard-compose），
+# 返回带 -f 参数的 docker compose 命令
+compose_cmd() {
+    local bot_name="$1"
+    local compose_file=""
+    if [ -f ~/ex-bot/services.tsv ]; then
+        compose_file=$(awk -F'\t' -v name="$bot_name" 'NR > 1 && $1 == name { print $2; exit }' ~/ex-bot/services.tsv)
+    fi
+    if [ -n "$compose_file" ] && [ "$compose_file" != "docker-compose.override.yml" ]; then
+        echo "docker compose -f $compose_file"
+    else
+        echo "docker compose"
+    fi
+}
+
 # 启动每个机器人的函数
 start_bot() {
     local bot_name="$1"
@@ -152,7 +219,7 @@ start_bot() {
 
     # 在对应窗口里执行启动命令
     tmux send-keys -t "$SESSION:$bot_name" \
-        "cd ~/ex-bot && docker compose up $bot_name -d && docker attach $bot_name" C-m
+        "cd ~/ex-bot && $(compose_cmd "$bot_name") up $bot_name -d && docker attach $bot_name" C-m
 
     echo "机器人 $bot_name 启动命令已发送"
 }
@@ -165,7 +232,28 @@ if [ "$BOTS_PER_BATCH" -lt 1 ]; then
 fi
 
 total_batches=$(( (total_bots + BOTS_PER_BATCH - 1) / BOTS_PER_BATCH ))
+
+# 有 python3 时把启动计划写入任务登记 ~/ex-bot/launch_jobs.db，由单个调度进程（tmux 窗口 jobs）按时启动，
+# 不再为每个机器人生成 /tmp 脚本和 at 任务；同时在 crontab 中加入 @reboot 条目，服务器重启后调度进程自动继续
+USE_JOB_REGISTRY=false
+if command -v python3 >/dev/null 2>&1 && [ -f ~/launch_jobs.py ] && [ -f ~/launch_scheduler.py ]; then
+    python3 ~/launch_jobs.py add --session "$SESSION" --interval "$START_INTERVAL_MINUTES" \
+        --batch "$BOTS_PER_BATCH" "${BOT_NAMES[@]}"
+    python3 ~/launch_jobs.py install-boot \
+        || echo "⚠️  无法写入 crontab，服务器重启后需要手动运行: python3 ~/launch_jobs.py run"
+    if ! python3 ~/launch_jobs.py is-running; then
+        tmux new-window -d -t "$SESSION:" -n jobs \
+            "python3 ~/launch_jobs.py run 2>&1 | tee -a ~/ex-bot/launch_jobs.log"
+        echo "已在 tmux 窗口 jobs 中启动调度进程（日志: ~/ex-bot/launch_jobs.log）"
+    fi
+    USE_JOB_REGISTRY=true
+fi
+
+# 没有任务登记时按原来的方式：第一批立即启动，之后的批次写成临时脚本交给 at
 for ((batch=0; batch<total_batches; batch++)); do
+    if [ "$USE_JOB_REGISTRY" = true ]; then
+        break
+    fi
     delay_minutes=$(( batch * START_INTERVAL_MINUTES ))
     start_index=$(( batch * BOTS_PER_BATCH ))
     end_index=$(( start_index + BOTS_PER_BATCH - 1 ))
@@ -183,6 +271,7 @@ for ((batch=0; batch<total_batches; batch++)); do
         else
             echo "设置 $bot_name 在 $delay_minutes 分钟后启动"
             temp_script="/tmp/start_${bot_name}_$$.sh"
+            compose="$(compose_cmd "$bot_name")"
             cat > "$temp_script" << EOF
 #!/bin/bash
 SESSION=\$(tmux display-message -p '#S' 2>/dev/null || echo "default")
@@ -199,7 +288,7 @@ fi
 
 # 在对应窗口里执行启动命令
 tmux send-keys -t "\$SESSION:\$BOT_NAME" \
-    "cd ~/ex-bot && docker compose up \$BOT_NAME -d && docker attach \$BOT_NAME" C-m
+    "cd ~/ex-bot && $compose up \$BOT_NAME -d && docker attach \$BOT_NAME" C-m
 
 echo "机器人 \$BOT_NAME 启动完成"
 # 清理临时脚本
@@ -240,4 +329,8 @@ done
 echo "="
 echo "使用 'tmux attach' 连接到session查看机器人状态"
 echo "使用 'tmux list-windows' 查看所有窗口"
-echo "使用 'atq' 查看待执行的启动任务"
+if [ "$USE_JOB_REGISTRY" = true ]; then
+    echo "使用 './stop-pending.sh --list' 查看待执行的启动任务"
+else
+    echo "使用 'atq' 查看待执行的启动任务"
+fi
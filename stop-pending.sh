@@ -19,8 +19,34 @@ show_help() {
     echo "  $0 --all                     # 停止所有待执行任务"
 }
 
+# start-bot.sh --fixed 在有 python3 时把延迟启动任务写入 ~/ex-bot/launch_jobs.db（~/launch_jobs.py），
+# 此时直接查询和取消登记中的任务；否则按原来的方式处理 at 队列和 /tmp 中的临时脚本
+use_job_registry() {
+    command -v python3 >/dev/null 2>&1 && [ -f ~/launch_jobs.py ] && [ -f ~/launch_scheduler.py ] \
+        && [ -f ~/ex-bot/launch_jobs.db ]
+}
+
+# 升级前用 at 排队的任务（at 队列或 /tmp 中的临时脚本）仍然存在时返回 0，使用任务登记时也需要处理它们
+has_legacy_tasks() {
+    if command -v atq >/dev/null 2>&1 && [ -n "$(atq 2>/dev/null)" ]; then
+        return 0
+    fi
+    [ -n "$(find /tmp -name "start_*_*.sh" 2>/dev/null)" ]
+}
+
 # 列出所有待执行的启动任务
 list_pending_tasks() {
+    if use_job_registry; then
+        python3 ~/launch_jobs.py list
+        has_legacy_tasks || return 0
+        echo ""
+        echo "升级前使用 at 的启动任务:"
+    fi
+    list_at_tasks
+}
+
+# 列出 at 队列中的任务和临时启动脚本
+list_at_tasks() {
     echo "待执行的启动任务:"
     echo "=================="
 
@@ -58,6 +84,17 @@ stop_bot_tasks() {
         return 1
     fi
 
+    if use_job_registry; then
+        python3 ~/launch_jobs.py cancel --bot "$bot_name"
+        has_legacy_tasks || return 0
+    fi
+    stop_bot_at_tasks "$bot_name"
+}
+
+# 停止 at 队列中指定机器人的任务并删除它的临时脚本
+stop_bot_at_tasks() {
+    local bot_name="$1"
+
     echo "停止机器人 $bot_name 的启动任务..."
 
     # 停止at队列中的相关任务
@@ -92,6 +129,15 @@ stop_bot_tasks() {
 
 # 停止所有待执行的启动任务
 stop_all_tasks() {
+    if use_job_registry; then
+        python3 ~/launch_jobs.py cancel --all
+        has_legacy_tasks || return 0
+    fi
+    stop_all_at_tasks
+}
+
+# 停止 at 队列中的所有启动任务并删除所有临时脚本
+stop_all_at_tasks() {
     echo "停止所有待执行的启动任务..."
 
     # 停止at队列中的所有任务
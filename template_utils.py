@@ -0,0 +1,121 @@
+"""
+模板编译与渲染模块
+模板文件只解析一次，拆分为字面量片段和 ${var} 占位符片段
+渲染时只需按片段拼接，不再对整个模板做正则替换
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# 与原 render_template 相同的占位符语法
+PLACEHOLDER_PATTERN = re.compile(r'\$\{([^}]+)\}')
+
+# 值中出现这些分隔符时会被转换为YAML数组
+ARRAY_SEPARATORS = (',', ';', '|')
+
+
+def convert_to_yaml_array(value_str):
+    """将CSV中的数组字符串转换为YAML数组格式"""
+    # 清理三重引号格式
+    cleaned_value = value_str.strip()
+    if cleaned_value.startswith('"""') and cleaned_value.endswith('"""'):
+        cleaned_value = cleaned_value[3:-3]
+    elif cleaned_value.startswith('"') and cleaned_value.endswith('"'):
+        cleaned_value = cleaned_value[1:-1]
+
+    # 确定分隔符
+    if ',' in cleaned_value:
+        separator = ','
+    elif ';' in cleaned_value:
+        separator = ';'
+    elif '|' in cleaned_value:
+        separator = '|'
+    else:
+        return cleaned_value
+
+    # 分割并清理数据
+    items = [item.strip() for item in cleaned_value.split(separator)]
+
+    # 转换为YAML数组格式
+    yaml_array = '\n'.join(f'- {item}' for item in items if item)
+    return yaml_array
+
+
+def is_array_value(value_str):
+    """判断变量值是否需要转换为YAML数组（三重引号或包含分隔符）"""
+    return value_str.startswith('"""') or any(separator in value_str for separator in ARRAY_SEPARATORS)
+
+
+@lru_cache(maxsize=4096)
+def format_value(value_str):
+    """按模板规则格式化变量值，数组判断和转换结果按值缓存"""
+    if is_array_value(value_str):
+        return convert_to_yaml_array(value_str)
+    return value_str
+
+
+class CompiledTemplate:
+    """
+    已编译的模板
+    literals 比 names 多一个元素：literals[0] + value(names[0]) + literals[1] + ...
+    """
+
+    __slots__ = ('source', 'literals', 'names', 'raw_placeholders', 'placeholders')
+
+    # 进程内累计渲染次数（类属性，用于 --timings 统计）
+    renders = 0
+
+    def __init__(self, content: str, source: str = None):
+        parts = PLACEHOLDER_PATTERN.split(content)
+        self.source = source
+        self.literals = tuple(parts[0::2])
+        self.names = tuple(parts[1::2])
+        # 变量不存在时原样保留占位符
+        self.raw_placeholders = tuple(f"${{{name}}}" for name in self.names)
+        self.placeholders = frozenset(self.names)
+
+    def render(self, variables: Dict[str, str]) -> str:
+        """使用变量渲染模板，规则与原 render_template 完全一致"""
+        CompiledTemplate.renders += 1
+        literals = self.literals
+        chunks = [literals[0]]
+        for index, name in enumerate(self.names):
+            raw = self.raw_placeholders[index]
+            value = variables.get(name, raw)
+            # 如果变量不存在，保留原占位符
+            chunks.append(raw if value == raw else format_value(str(value)))
+            chunks.append(literals[index + 1])
+        return ''.join(chunks)
+
+
+# 模板文件缓存：路径 -> ((mtime_ns, size), CompiledTemplate)
+_FILE_CACHE: Dict[str, Tuple[Tuple[int, int], CompiledTemplate]] = {}
+
+
+@lru_cache(maxsize=256)
+def compile_template(content: str) -> CompiledTemplate:
+    """编译模板字符串（按内容缓存）"""
+    return CompiledTemplate(content)
+
+
+def load_compiled_template(template_path: str) -> CompiledTemplate:
+    """加载并编译模板文件，按路径和 (mtime, size) 缓存，文件修改后自动重新编译"""
+    stat = os.stat(template_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _FILE_CACHE.get(template_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template = CompiledTemplate(f.read(), source=template_path)
+
+    _FILE_CACHE[template_path] = (signature, template)
+    return template
+
+
+def render_template(template_content, variables):
+    """使用变量渲染模板内容，支持数组格式转换"""
+    return compile_template(template_content).render(variables)
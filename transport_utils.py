@@ -0,0 +1,224 @@
+"""
+部署传输层
+deploy.py 只通过这里的接口与目标机器交互：读取远端文件、把 tar 流交给远端的应用脚本
+- SSHTransport：通过 ControlMaster 复用同一个 SSH 连接，一次部署只握手一次
+- LocalTransport：把本地目录当作远端的 home 目录，运行同一个应用脚本，用于测试和演练
+- FakeTransport：在 LocalTransport 的基础上模拟网络延迟和连接失败，用于测试批量部署的并发、超时和重试
+每个传输对象对应一次部署尝试，timeout 为这次尝试的总时长上限（秒）
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Dict, Optional, Sequence
+
+# 在目标机器上应用部署包：$1 为部署根目录（远端 home），$2 为部署清单的相对路径
+# 先把 tar 流完整解包到同一文件系统的暂存目录，解包失败（例如数据不完整）时不改动任何文件；
+# 之后创建清单中的目录（包括空目录），再逐个 rename 到目标位置，最后写入清单。
+# 只有单个文件的替换是原子的，整个部署不是：应用过程中连接中断时可能只替换了部分文件，
+# 这时清单还是旧的，下一次部署会重新上传这些文件
+# 删除文件后只删除清单中已不存在的空目录，conf/<机器人>/connectors 等目录即使为空也保留
+APPLY_SCRIPT = r'''
+set -e
+cd "$1"
+staging=$(mktemp -d .deploy-staging.XXXXXX)
+trap 'rm -rf "$staging"' EXIT
+tar -xzf - -C "$staging"
+while IFS= read -r dir; do
+    [ -n "$dir" ] || continue
+    mkdir -p "$dir"
+done < "$staging/dirs"
+if [ -d "$staging/files" ]; then
+    # 包内内容相同的文件是硬链接，先在暂存目录中复制成独立的文件，服务器上的每个文件都有自己的 inode
+    while IFS= read -r path; do
+        [ -n "$path" ] || continue
+        cp -p "$staging/files/$path" "$staging/files/$path.split"
+        mv -f "$staging/files/$path.split" "$staging/files/$path"
+    done < "$staging/linked"
+    (cd "$staging/files" && find . ! -type d) | while IFS= read -r path; do
+        mkdir -p "$(dirname "$path")"
+        mv -f "$staging/files/$path" "$path"
+    done
+fi
+while IFS= read -r path; do
+    [ -n "$path" ] || continue
+    rm -f "$path"
+    dir=$(dirname "$path")
+    while [ "$dir" != "." ] && ! grep -Fxq "$dir" "$staging/dirs" && rmdir "$dir" 2>/dev/null; do
+        dir=$(dirname "$dir")
+    done
+done < "$staging/deleted"
+while IFS= read -r dir; do
+    [ -n "$dir" ] || continue
+    rmdir "$dir" 2>/dev/null || true
+done < "$staging/deleted_dirs"
+mkdir -p "$(dirname "$2")"
+mv -f "$staging/manifest.json" "$2"
+'''
+
+
+class TransportError(Exception):
+    """连接或远端命令失败（包括超时）"""
+
+
+class Deadline:
+    """一次部署尝试的截止时间，timeout 为 None 时不限制"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self._expires = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，已超时时抛出 TransportError"""
+        if self._expires is None:
+            return None
+        remaining = self._expires - time.monotonic()
+        if remaining <= 0:
+            raise self.error()
+        return remaining
+
+    def error(self) -> TransportError:
+        return TransportError(f"超过 {self.timeout:g}s 超时")
+
+
+def run_command(command: Sequence[str], deadline: Deadline, payload: bytes = None):
+    """运行命令并捕获输出，超时时终止命令并抛出 TransportError"""
+    try:
+        return subprocess.run(command, input=payload, capture_output=True, timeout=deadline.remaining())
+    except subprocess.TimeoutExpired:
+        raise deadline.error() from None
+
+
+class LocalTransport:
+    """本地目录传输：root 相当于远端的 home 目录"""
+
+    name = 'local'
+
+    def __init__(self, root: str, timeout: Optional[float] = None):
+        self.root = root
+        self.bytes_sent = 0
+        self.deadline = Deadline(timeout)
+
+    def read_file(self, rel: str) -> Optional[bytes]:
+        """读取部署根目录下的文件，不存在时返回 None"""
+        try:
+            with open(os.path.join(self.root, rel), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def apply(self, payload: bytes, manifest_rel: str):
+        """在部署根目录运行应用脚本"""
+        os.makedirs(self.root, exist_ok=True)
+        result = run_command(['sh', '-c', APPLY_SCRIPT, 'apply', self.root, manifest_rel], self.deadline, payload)
+        if result.returncode != 0:
+            raise TransportError(result.stderr.decode('utf-8', 'replace').strip() or f"退出码 {result.returncode}")
+        self.bytes_sent += len(payload)
+
+    def close(self):
+        pass
+
+
+class SSHTransport:
+    """
+    SSH 传输：先建立一个后台主连接，之后的命令都通过 ControlPath 复用它，close() 时关闭主连接
+    host 为 ~/.ssh/config 中的主机名
+    """
+
+    name = 'ssh'
+
+    def __init__(self, host: str, ssh_options: Sequence[str] = (), timeout: Optional[float] = None):
+        self.host = host
+        self.bytes_sent = 0
+        self.deadline = Deadline(timeout)
+        self._control_dir = tempfile.mkdtemp(prefix='deploy-ssh-')
+        self._connected = False
+        self._base = [
+            'ssh',
+            '-o', 'BatchMode=yes',
+            '-o', 'ConnectTimeout=10',
+            '-o', f'ControlPath={os.path.join(self._control_dir, "%C")}',
+            *ssh_options,
+        ]
+
+    def _connect(self):
+        # 主连接在认证后转入后台（-f），标准输出和错误不能是管道，否则等待输出结束时会一直阻塞
+        with tempfile.TemporaryFile() as stderr:
+            try:
+                returncode = subprocess.call(
+                    self._base + ['-o', 'ControlMaster=yes', '-o', 'ControlPersist=yes', '-f', '-N', self.host],
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr,
+                    timeout=self.deadline.remaining(),
+                )
+            except subprocess.TimeoutExpired:
+                raise TransportError(f"{self.host}: {self.deadline.error()}") from None
+            if returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', 'replace').strip()
+                raise TransportError(f"{self.host}: {message or f'无法连接（退出码 {returncode}）'}")
+        self._connected = True
+
+    def _run(self, command: str, payload: bytes = None) -> bytes:
+        if not self._connected:
+            self._connect()
+        try:
+            result = run_command(self._base + ['-o', 'ControlMaster=no', self.host, command], self.deadline, payload)
+        except TransportError as e:
+            raise TransportError(f"{self.host}: {e}") from None
+        if result.returncode != 0:
+            message = result.stderr.decode('utf-8', 'replace').strip()
+            raise TransportError(f"{self.host}: {message or f'退出码 {result.returncode}'}")
+        return result.stdout
+
+    def read_file(self, rel: str) -> Optional[bytes]:
+        """读取远端 home 目录下的文件，不存在时返回 None（连接失败时抛出 TransportError）"""
+        data = self._run(f"cat {shlex.quote(rel)} 2>/dev/null || true")
+        return data or None
+
+    def apply(self, payload: bytes, manifest_rel: str):
+        """把部署包通过标准输入交给远端的应用脚本"""
+        self._run(f"sh -c {shlex.quote(APPLY_SCRIPT)} apply . {shlex.quote(manifest_rel)}", payload)
+        self.bytes_sent += len(payload)
+
+    def close(self):
+        if self._connected:
+            subprocess.run(self._base + ['-O', 'exit', self.host], capture_output=True)
+            self._connected = False
+        shutil.rmtree(self._control_dir, ignore_errors=True)
+
+
+class FakeTransport(LocalTransport):
+    """
+    模拟网络的本地传输
+    latency: 每次读取或应用前等待的秒数；failures: 主机名 -> 剩余的失败次数（多次尝试之间共享，每次尝试消耗一次）
+    """
+
+    name = 'fake'
+
+    def __init__(self, root: str, host: str, latency: float = 0.0, failures: Dict[str, int] = None,
+                 timeout: Optional[float] = None):
+        super().__init__(root, timeout)
+        self.host = host
+        self.latency = latency
+        self.failures = failures if failures is not None else {}
+
+    def _simulate(self):
+        remaining = self.deadline.remaining()
+        if remaining is not None and self.latency > remaining:
+            time.sleep(remaining)
+            raise TransportError(f"{self.host}: {self.deadline.error()}")
+        time.sleep(self.latency)
+        if self.failures.get(self.host, 0) > 0:
+            self.failures[self.host] -= 1
+            raise TransportError(f"{self.host}: 模拟的连接失败")
+
+    def read_file(self, rel: str) -> Optional[bytes]:
+        self._simulate()
+        return super().read_file(rel)
+
+    def apply(self, payload: bytes, manifest_rel: str):
+        self._simulate()
+        super().apply(payload, manifest_rel)
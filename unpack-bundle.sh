@@ -0,0 +1,140 @@
+#!/bin/bash
+set -e
+
+# 显示帮助信息
+show_help() {
+    echo "部署包解包脚本（部署包由 python prepare.py <配置文件夹> --bundle 生成）"
+    echo ""
+    echo "用法: $0 [选项] <部署包>"
+    echo ""
+    echo "选项:"
+    echo "  -r, --root <目录>  解包到指定目录（默认 home 目录，部署包中的路径相对于它）"
+    echo "  -l, --link         内容相同的文件解包为硬链接（共用 inode，机器人原地修改配置会影响其他机器人）"
+    echo "  -c, --copy         内容相同的文件分别复制（默认）"
+    echo "  -h, --help         显示此帮助信息"
+    echo ""
+    echo "示例:"
+    echo "  $0 ~/bundle.tar.xz                 # 解包到 ~/ex-bot/ 和 ~/*.sh"
+    echo "  $0 --link ~/bundle.tar.xz          # 使用硬链接"
+}
+
+error() {
+    echo "错误: $1" >&2
+    exit 1
+}
+
+ROOT="$HOME"
+COPY=true
+BUNDLE=""
+
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -r|--root)
+            [ -n "$2" ] || error "--root 需要指定目录"
+            ROOT="$2"
+            shift 2
+            ;;
+        -c|--copy)
+            COPY=true
+            shift
+            ;;
+        -l|--link)
+            COPY=false
+            shift
+            ;;
+        -h|--help)
+            show_help
+            exit 0
+            ;;
+        -*)
+            error "未知选项: $1"
+            ;;
+        *)
+            BUNDLE="$1"
+            shift
+            ;;
+    esac
+done
+
+if [ -z "$BUNDLE" ]; then
+    show_help
+    exit 1
+fi
+[ -f "$BUNDLE" ] || error "部署包不存在: $BUNDLE"
+
+BUNDLE=$(cd "$(dirname "$BUNDLE")" && pwd)/$(basename "$BUNDLE")
+mkdir -p "$ROOT"
+cd "$ROOT"
+
+# 先完整解包到同一文件系统的暂存目录并校验，失败时不改动任何文件
+staging=$(mktemp -d .bundle-staging.XXXXXX)
+trap 'rm -rf "$staging"' EXIT
+
+tar -xf "$BUNDLE" -C "$staging" || error "无法解包: $BUNDLE"
+grep -q '"format": "ex-bot-bundle"' "$staging/bundle.json" 2>/dev/null || error "不是部署包: $BUNDLE"
+grep -q '"version": 1,' "$staging/bundle.json" || error "不支持的部署包版本: $BUNDLE"
+(cd "$staging" && sha256sum -c --quiet SHA256SUMS) || error "部署包校验失败: $BUNDLE"
+
+# 先创建目录（包括空目录），再放置文件
+while IFS= read -r dir; do
+    case "$dir" in
+        ""|/*|../*|*/../*|*/..) error "部署包中的路径不安全: $dir" ;;
+    esac
+    mkdir -p "$dir"
+done < "$staging/dirs.txt"
+
+TAB=$(printf '\t')
+files=0
+while IFS="$TAB" read -r sha mode path; do
+    case "$path" in
+        ""|/*|../*|*/../*|*/..) error "部署包中的路径不安全: $path" ;;
+    esac
+    [ -f "$staging/objects/$sha" ] || error "部署包缺少对象: $sha ($path)"
+    mkdir -p "$(dirname "$path")"
+    # 先在目标目录旁创建再 rename，单个文件的替换是原子的
+    if [ "$COPY" = true ]; then
+        cp "$staging/objects/$sha" "$path.bundle-tmp"
+        chmod "$mode" "$path.bundle-tmp"
+    else
+        # 内容相同的文件都链接到同一个对象
+        ln -f "$staging/objects/$sha" "$path.bundle-tmp"
+    fi
+    mv -f "$path.bundle-tmp" "$path"
+    files=$((files + 1))
+done < "$staging/index.tsv"
+
+# 删除上一次解包有、这次没有的文件（只删除部署包索引中记录过的文件）
+removed=0
+if [ -f ex-bot/.bundle_index.tsv ]; then
+    cut -f3 ex-bot/.bundle_index.tsv | sort > "$staging/old_paths"
+    cut -f3 "$staging/index.tsv" | sort > "$staging/new_paths"
+    while IFS= read -r path; do
+        case "$path" in
+            ""|/*|../*|*/../*|*/..) continue ;;
+        esac
+        rm -f "$path"
+        # 部署包中仍有的目录（例如空的 conf/<机器人>/connectors）保留
+        dir=$(dirname "$path")
+        while [ "$dir" != "." ] && ! grep -Fxq "$dir" "$staging/dirs.txt" && rmdir "$dir" 2>/dev/null; do
+            dir=$(dirname "$dir")
+        done
+        removed=$((removed + 1))
+    done < <(comm -23 "$staging/old_paths" "$staging/new_paths")
+fi
+
+# 删除上一次解包创建、这次已不存在的空目录（从最深的目录开始）
+if [ -f ex-bot/.bundle_dirs.txt ]; then
+    sort ex-bot/.bundle_dirs.txt > "$staging/old_dirs"
+    sort "$staging/dirs.txt" > "$staging/new_dirs"
+    comm -23 "$staging/old_dirs" "$staging/new_dirs" | sort -r | while IFS= read -r dir; do
+        rmdir "$dir" 2>/dev/null || true
+    done
+fi
+
+mkdir -p ex-bot
+mv -f "$staging/index.tsv" ex-bot/.bundle_index.tsv
+mv -f "$staging/dirs.txt" ex-bot/.bundle_dirs.txt
+# 与 deploy.py 的部署清单保持一致，之后可以继续增量部署
+mv -f "$staging/deploy_manifest.json" ex-bot/.deploy_manifest.json
+
+echo "解包完成: $files 个文件（$(grep -c . "$staging/SHA256SUMS") 个不同内容），删除 $removed 个旧文件 -> $ROOT"
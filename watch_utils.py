@@ -0,0 +1,171 @@
+"""
+文件变化监听模块
+Linux 下通过 ctypes 调用 inotify 监听目录，不可用时回退为按 (mtime, size) 轮询
+监听的是目录而不是文件本身，编辑器“写临时文件再改名”的保存方式也能被捕获
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class PollingWatcher:
+    """
+    轮询监听：定期比较目录下匹配文件的 (mtime_ns, size)
+    watches: 目录 -> 文件名过滤函数
+    """
+
+    name = 'polling'
+
+    def __init__(self, watches: Dict[str, Callable[[str], bool]], interval: float = 1.0):
+        self.watches = watches
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory, accept in self.watches.items():
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                if not accept(name):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """等待文件变化，返回变化的路径集合（超时返回空集合）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {
+                path for path in set(snapshot) | set(self._snapshot)
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    inotify 监听（仅 Linux），通过 ctypes 调用 libc，不依赖第三方包
+    """
+
+    name = 'inotify'
+
+    def __init__(self, watches: Dict[str, Callable[[str], bool]]):
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("当前系统不支持 inotify")
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+        self._dirs: Dict[int, Tuple[str, Callable[[str], bool]]] = {}
+        try:
+            for directory, accept in watches.items():
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"无法监听目录 {directory}")
+                self._dirs[wd] = (directory, accept)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _read_events(self) -> Set[str]:
+        changed = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += name_len
+
+            watch = self._dirs.get(wd)
+            if watch and name and watch[1](name):
+                changed.add(os.path.join(watch[0], name))
+        return changed
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """等待文件变化，返回变化的路径集合（超时返回空集合）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable:
+                changed = self._read_events()
+                if changed:
+                    return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher(watches: Dict[str, Callable[[str], bool]], poll_interval: float = 1.0):
+    """优先使用 inotify，不可用时回退为轮询"""
+    try:
+        return InotifyWatcher(watches)
+    except (OSError, AttributeError):
+        return PollingWatcher(watches, poll_interval)
+
+
+def wait_for_changes(watcher, debounce: float) -> Set[str]:
+    """
+    阻塞等待下一批变化，收到第一个变化后继续收集，直到安静 debounce 秒
+    用于合并编辑器保存时连续产生的多个事件
+    """
+    changed = watcher.wait()
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+def name_filter(names: Iterable[str] = (), suffix: str = None) -> Callable[[str], bool]:
+    """按文件名集合或后缀过滤"""
+    names = frozenset(names)
+    return lambda name: name in names or (suffix is not None and name.endswith(suffix))
@@ -0,0 +1,99 @@
+"""
+并行文件写入模块
+生成的配置文件数量多、单个文件很小，逐个同步写入时耗时主要花在 I/O 延迟上（网络文件系统、慢速磁盘尤其明显）
+各生成函数把写入任务提交到有界线程池，写入错误统一收集，在所有任务完成后按路径排序报告
+"""
+
+import os
+import threading
+from typing import Callable, Iterable, List, Tuple
+
+DEFAULT_WRITER_THREADS = 8
+
+# 每个线程池任务包含的写入操作数，单个文件很小时逐个提交的调度开销会超过写入本身
+DEFAULT_BATCH_SIZE = 64
+
+
+class ParallelWriter:
+    """
+    有界线程池写入器
+    写入操作按 batch_size 个一组提交，同时排队的任务数不超过 max_pending，避免大量待写内容堆积在内存中；
+    max_workers <= 1 时在当前线程中同步执行
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WRITER_THREADS, max_pending: int = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.max_workers = max(1, max_workers or 1)
+        self.batch_size = max(1, batch_size)
+        self._slots = threading.BoundedSemaphore(max_pending or self.max_workers * 2)
+        self._executor = None
+        self._batch = []  # 尚未提交的 (路径, 函数, 参数)
+        self._pending = []  # 已提交任务的 future，结果为失败的 (路径, 异常) 列表
+        self._errors: List[Tuple[str, BaseException]] = []
+
+    def _get_executor(self):
+        if self._executor is None:
+            # 只在需要并行写入时导入
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='writer')
+        return self._executor
+
+    @staticmethod
+    def _run_batch(batch) -> List[Tuple[str, BaseException]]:
+        errors = []
+        for path, func, args in batch:
+            try:
+                func(*args)
+            except Exception as e:
+                errors.append((path, e))
+        return errors
+
+    def submit(self, path: str, func: Callable, *args):
+        """提交一个写入操作 func(*args)，path 用于错误报告"""
+        if self.max_workers <= 1:
+            self._errors.extend(self._run_batch([(path, func, args)]))
+            return
+
+        self._batch.append((path, func, args))
+        if len(self._batch) >= self.batch_size:
+            self._dispatch()
+
+    def _dispatch(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(self._run_batch, batch)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append(future)
+
+    def make_dirs(self, directories: Iterable[str]):
+        """批量创建目录（去重后并行 makedirs，只需要传入最深一级的目录）"""
+        for directory in sorted(set(directories)):
+            self.submit(directory, os.makedirs, directory, 0o777, True)
+        # 后续写入依赖这些目录，先等待完成（错误保留到最终报告）
+        self._collect()
+
+    def _collect(self):
+        self._dispatch()
+        for future in self._pending:
+            self._errors.extend(future.result())
+        self._pending = []
+
+    def wait(self) -> List[Tuple[str, BaseException]]:
+        """等待所有任务完成，返回按路径排序的 (路径, 异常) 列表并清空"""
+        self._collect()
+        errors = sorted(self._errors, key=lambda item: item[0])
+        self._errors = []
+        return errors
+
+    def close(self):
+        """等待剩余任务并关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None